@@ -1,15 +1,15 @@
 # backend/api/camera.py
-import io
-
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 
 from backend.config import API_BASE_URL, CAPTURED_DIR, DIGICAM_ORIGINAL_DIR
 from backend.models.camera import CaptureResponse
-from backend.services.digicam_control import (
-    get_preview_image,
-    capture_and_save_photo,
-)
+from backend.services.beauty_jobs import warm_job
+from backend.services.capture_ingest import CAPTURE_INDEX
+from backend.services.digicam_control import capture_and_save_photo
+from backend.services.face_tracker import FACE_TRACKER
+from backend.services.liveview import LIVEVIEW
+from backend.services.worker_pool import BEAUTY_POOL
 
 router = APIRouter(
     prefix="/api/camera",
@@ -17,38 +17,81 @@ router = APIRouter(
 )
 
 
+MJPEG_BOUNDARY = "frame"
+
+
+def _latest_frame_response(what: str) -> Response:
+    frame = LIVEVIEW.latest()
+    if frame is None:
+        detail = LIVEVIEW.last_error or "no frame from camera"
+        raise HTTPException(status_code=502, detail=f"Failed to get {what}: {detail}")
+    return Response(
+        content=frame.data,
+        media_type=frame.content_type,
+        headers={"Cache-Control": "no-store", "X-Frame-Seq": str(frame.seq)},
+    )
+
+
 @router.get("/liveview")
 def liveview():
     """
-    Endpoint untuk live view (polling).
-    Frontend akan memanggil ini berkala dan menampilkan sebagai <img>.
+    Frame liveview terbaru (satu gambar, untuk polling lama).
+    Frame diambil oleh grabber bersama, jadi banyak layar tidak menambah beban kamera.
     """
-    try:
-        image_bytes, content_type = get_preview_image()
-    except Exception as exc:
-        raise HTTPException(status_code=502, detail=f"Failed to get live view: {exc}") from exc
+    return _latest_frame_response("live view")
+
+
+@router.get("/liveview/stream")
+async def liveview_stream():
+    """
+    Liveview sebagai MJPEG (multipart/x-mixed-replace) untuk langsung dipakai di <img src>.
+    Klien yang lambat otomatis loncat ke frame terbaru (frame lama di-drop).
+    """
+    async def body():
+        async for frame in LIVEVIEW.frames():
+            yield (
+                f"--{MJPEG_BOUNDARY}\r\n"
+                f"Content-Type: {frame.content_type}\r\n"
+                f"Content-Length: {len(frame.data)}\r\n\r\n"
+            ).encode() + frame.data + b"\r\n"
 
     return StreamingResponse(
-        io.BytesIO(image_bytes),
-        media_type=content_type,
+        body(),
+        media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        headers={"Cache-Control": "no-store"},
     )
 
 
+@router.websocket("/liveview/ws")
+async def liveview_ws(websocket: WebSocket):
+    """Liveview lewat WebSocket: satu pesan biner per frame (JPEG), frame lama di-drop."""
+    await websocket.accept()
+    try:
+        async for frame in LIVEVIEW.frames():
+            await websocket.send_bytes(frame.data)
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # klien menutup koneksi
+
+
+@router.get("/liveview/stats")
+def liveview_stats():
+    """Status grabber liveview: jumlah penonton, frame diambil, error terakhir."""
+    return LIVEVIEW.stats()
+
+
+@router.get("/tracking")
+def tracking_status():
+    """Status face tracking liveview: frame diproses/di-drop dan posisi wajah stabil terakhir."""
+    return FACE_TRACKER.stats()
+
+
 @router.get("/preview")
 def preview():
     """
     Endpoint untuk melihat snapshot liveview (kalau mau dipakai).
     Untuk sekarang sama dengan liveview.
     """
-    try:
-        image_bytes, content_type = get_preview_image()
-    except Exception as exc:
-        raise HTTPException(status_code=502, detail=f"Failed to get preview: {exc}") from exc
-
-    return StreamingResponse(
-        io.BytesIO(image_bytes),
-        media_type=content_type,
-    )
+    return _latest_frame_response("preview")
 
 
 @router.post("/capture", response_model=CaptureResponse)
@@ -57,15 +100,41 @@ def capture():
     Trigger kamera jepret via digiCamControl, lalu:
     - Cari file terbaru di folder asli digiCamControl
     - Copy ke backend/static/captured/
-    - Kembalikan URL ke file static tersebut
+    - Ingest: decode sekali, terapkan orientasi EXIF, buat working copy + preview + thumbnail
+    - Decode + analisis wajah duluan di worker beauty (cache) supaya /api/beauty?captured=... langsung jalan,
+      pakai posisi wajah terakhir dari liveview sebagai hint (kalau tracking aktif)
+    - Kembalikan URL ke file static tersebut (plus preview/thumbnail)
     """
+    # Ambil hint sebelum jepret: selama capture liveview berhenti
+    face_hint = FACE_TRACKER.current_hint()
     try:
         filename = capture_and_save_photo(DIGICAM_ORIGINAL_DIR, CAPTURED_DIR)
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"Failed to capture and save photo: {exc}") from exc
 
+    FACE_TRACKER.capture(filename, face_hint)
+    record = CAPTURE_INDEX.ingest(CAPTURED_DIR / filename, face_hint)
+
+    # Affinity = nama file, sama dengan yang dipakai /api/beauty untuk captured
+    if record is not None:
+        BEAUTY_POOL.submit_background(warm_job, str(record.path("work")), record.face_hint, affinity=filename)
+    else:
+        BEAUTY_POOL.submit_background(warm_job, str(CAPTURED_DIR / filename), face_hint, affinity=filename)
+
     # Bangun URL absolute ke static file
     # Contoh: http://localhost:8000/static/captured/20251202-134500_XXX.jpg
-    photo_url = f"{API_BASE_URL.rstrip('/')}/static/captured/{filename}"
+    base_url = f"{API_BASE_URL.rstrip('/')}/static/captured"
+    return CaptureResponse(
+        photo_url=f"{base_url}/{filename}",
+        preview_url=f"{base_url}/{record.preview}" if record else None,
+        thumbnail_url=f"{base_url}/{record.thumbnail}" if record else None,
+    )
+
 
-    return CaptureResponse(photo_url=photo_url)
+@router.get("/captures/{filename}")
+def capture_info(filename: str):
+    """Rendition yang sudah dibuat untuk satu capture (working copy, preview, thumbnail)."""
+    record = CAPTURE_INDEX.get(filename)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Capture belum di-ingest: {filename}")
+    return record
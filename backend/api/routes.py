@@ -1,20 +1,28 @@
-import base64
+import hashlib
 import json
 import io
-from pathlib import Path
 
-import requests
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile, Request
+from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile, Request
 from fastapi.responses import Response, JSONResponse
 from pydantic import BaseModel
 from PIL import Image
 
-from backend.config import AFTER_DIR, RESULT_DIR, API_BASE_URL, STATIC_DIR
-from backend.models.presets import VALID_PRESETS, as_dict_map, merge_config, update_preset
-from backend.services.beautify import beautify_image
-from backend.services.storage import save_image_lossless, save_image_jpeg
+from backend.config import CAPTURED_DIR, RESULT_DIR, API_BASE_URL, QR_BOX_SIZE, BEAUTY_BATCH_MAX, BEAUTY_JOB_TIMEOUT
+from backend.models.presets import PRESET_CONFIGS, VALID_PRESETS, PresetConfig, as_dict_map, merge_config, update_preset
+from backend.services.beauty_jobs import Source, batch_job, beauty_job, preview_job
+from backend.services.capture_ingest import CAPTURE_INDEX
+from backend.services.compositor import Layer, Rel, compose
+from backend.services.encoder import ENCODED_FILES, SHARE, encode_jpeg
+from backend.services.face_tracker import FACE_TRACKER, RelBox
+from backend.services.image_sources import ImageSourceError, load_image_source, static_path_for_url
+from backend.services.job_service import BEAUTY_JOBS, TERMINAL_STATUSES, TooManyJobs
+from backend.services.processed_store import PROCESSED_FILES
+from backend.services.qr_cache import QR_CACHE, QrError
+from backend.services.storage import resolve_static_file
+from backend.services.templates import LOGIC_OVERLAYS, OVERLAY_CACHE, TEMPLATES, TemplateError
+from backend.services.upload_queue import UPLOAD_QUEUE
+from backend.services.worker_pool import BEAUTY_POOL, JobTimeout, PoolBusy, WorkerLost
 
-import qrcode
 from fastapi import Request, status
 from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 
@@ -24,6 +32,9 @@ from backend.services import auth_service, drive_service
 
 router = APIRouter(prefix="/api")
 
+# Jumlah upload terakhir yang ditampilkan di halaman status
+HOME_HISTORY_LIMIT = 50
+
 
 class PresetUpdateRequest(BaseModel):
     target_L: float | None = None
@@ -40,6 +51,95 @@ class PresetUpdateRequest(BaseModel):
     edge_enhance_mix: float | None = None
 
 
+def _check_image(contents: bytes) -> None:
+    """Cheap header check so bad uploads fail with 400 before reaching a worker."""
+    try:
+        Image.open(io.BytesIO(contents)).verify()
+    except Exception:
+        raise HTTPException(status_code=400, detail="File gambar tidak valid")
+
+
+async def _read_source(image, captured: str | None) -> tuple[Source, str]:
+    """
+    Return (source, source_key) from either an uploaded file or a reference
+    to a capture already in CAPTURED_DIR (file name or its static URL).
+    Captures are read by the worker straight from disk, no re-upload, using
+    the ingested working copy when there is one.
+    """
+    if captured:
+        try:
+            path = resolve_static_file(captured, CAPTURED_DIR)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=404, detail=str(exc))
+        record = CAPTURE_INDEX.get(path.name)
+        if record is not None:
+            return str(record.path("work")), path.name
+        return str(path), path.name
+
+    if not image:
+        raise HTTPException(status_code=400, detail="Field 'image' (file) atau 'captured' wajib diisi.")
+    contents = await image.read()
+    _check_image(contents)
+    return contents, hashlib.blake2b(contents, digest_size=16).hexdigest()
+
+
+async def _run_job(fn, *args, source_key: str, timeout: float | None = None) -> dict:
+    """Run a job function on the worker pool, mapping pool errors to HTTP errors."""
+    try:
+        return await BEAUTY_POOL.submit(fn, *args, affinity=source_key, timeout=timeout)
+    except PoolBusy as exc:
+        raise HTTPException(
+            status_code=429,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    except WorkerLost as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    except JobTimeout as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
+    except (OSError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"File gambar tidak valid: {exc}")
+
+
+def _face_hint(source: Source, source_key: str) -> RelBox | None:
+    """
+    Capture dari booth: posisi wajah dari liveview (kalau ada) dipakai sebagai hint deteksi.
+    Working copy hasil ingest sudah diputar sesuai EXIF, jadi pakai hint yang ikut diputar.
+    """
+    record = CAPTURE_INDEX.get(source_key) if isinstance(source, str) else None
+    if record is not None and source == str(record.path("work")):
+        return record.face_hint
+    return FACE_TRACKER.hint_for(source_key)
+
+
+async def _run_beauty(source: Source, source_key: str, preset: str, config: PresetConfig, save_after: bool) -> dict:
+    face_hint = _face_hint(source, source_key)
+    return await _run_job(beauty_job, source, preset, config, save_after, None, face_hint, source_key=source_key)
+
+
+def _parse_tile(raw) -> tuple[float, float, float, float] | None:
+    """Form field "x,y,w,h" relative to the image (0..1), or None."""
+    if not raw:
+        return None
+    try:
+        x, y, w, h = (float(v) for v in str(raw).split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Tile harus 'x,y,w,h' (0..1)")
+    if not (0 <= x < 1 and 0 <= y < 1 and w > 0 and h > 0):
+        raise HTTPException(status_code=400, detail="Tile harus 'x,y,w,h' (0..1)")
+    return x, y, w, h
+
+
+@router.get("/beauty/pool")
+async def beauty_pool_stats():
+    """Worker pool load: in-flight jobs, rejections, timeouts."""
+    return BEAUTY_POOL.stats()
+
+
 @router.get("/presets")
 async def list_presets():
     """Return all current preset values."""
@@ -49,17 +149,23 @@ async def list_presets():
 @router.post("/presets/preview")
 async def preset_preview(request: Request):
     """
-    Accept multipart form (image, preset, config) and return a JPEG preview.
+    Accept multipart form (image or captured, preset, config) and return a JPEG preview.
     Using manual form parsing to avoid UTF-8 decode issues when binary is malformed.
+
+    By default the preview is rendered on a PREVIEW_LONG_EDGE proxy (fast
+    enough for slider feedback). Optional fields:
+    - tile: "x,y,w,h" relative box rendered at full resolution (zoom)
+    - resolution: "full" renders the whole image at full resolution
     """
     form = await request.form()
 
     image = form.get("image")
+    captured = form.get("captured")
     preset_key = str(form.get("preset") or "").lower()
     config_raw = form.get("config") or ""
+    tile = _parse_tile(form.get("tile"))
+    full_res = str(form.get("resolution") or "proxy").lower() == "full"
 
-    if not image:
-        raise HTTPException(status_code=400, detail="Field 'image' wajib diisi (file).")
     if preset_key not in VALID_PRESETS:
         raise HTTPException(status_code=400, detail="Preset tidak dikenal")
 
@@ -67,21 +173,30 @@ async def preset_preview(request: Request):
         overrides = json.loads(config_raw) if config_raw else {}
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Config harus JSON yang valid")
-
+    if not isinstance(overrides, dict):
+        raise HTTPException(status_code=400, detail="Config harus objek JSON")
     try:
-        contents = await image.read()
-        img = Image.open(io.BytesIO(contents)).convert("RGB")
-    except Exception:
-        raise HTTPException(status_code=400, detail="File gambar tidak valid")
-
-    merged_cfg = merge_config(preset_key, overrides)
-    out_img = beautify_image(img, preset_key, config_override=merged_cfg)
-
-    buffer = io.BytesIO()
-    out_img.save(buffer, format="JPEG", quality=95)
-    buffer.seek(0)
-
-    return Response(content=buffer.read(), media_type="image/jpeg")
+        merged_cfg = merge_config(preset_key, overrides)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Nilai config harus angka")
+
+    source, source_key = await _read_source(image, str(captured) if captured else None)
+
+    if full_res and tile is None:
+        result = await _run_beauty(source, source_key, preset_key, merged_cfg, save_after=False)
+        return Response(content=result["jpeg"], media_type="image/jpeg")
+
+    face_hint = _face_hint(source, source_key)
+    result = await _run_job(preview_job, source, preset_key, merged_cfg, tile, face_hint, source_key=source_key)
+    width, height = result["source_size"]
+    headers = {
+        "X-Preview-Scale": f"{result['scale']:.4f}",
+        "X-Source-Size": f"{width}x{height}",
+        "Access-Control-Expose-Headers": "X-Preview-Scale, X-Source-Size, X-Tile-Box",
+    }
+    if result["region"] is not None:
+        headers["X-Tile-Box"] = ",".join(map(str, result["region"]))
+    return Response(content=result["jpeg"], media_type="image/jpeg", headers=headers)
 
 
 @router.post("/presets/{preset}")
@@ -96,34 +211,202 @@ async def save_preset(preset: str, payload: PresetUpdateRequest):
 
 @router.post("/beauty")
 async def beauty_endpoint(
-    image: UploadFile = File(...),
+    image: UploadFile | None = File(None),
+    captured: str | None = Form(None),
+    preset: str = Form(...),
+):
+    preset = preset.lower()
+    if preset not in VALID_PRESETS:
+        raise HTTPException(status_code=400, detail="Preset tidak dikenal")
+
+    source, source_key = await _read_source(image, captured)
+
+    # Config diambil di proses utama supaya perubahan preset langsung dipakai worker
+    result = await _run_beauty(source, source_key, preset, PRESET_CONFIGS[preset], save_after=True)
+    after_url = f"{API_BASE_URL.rstrip('/')}/static/after/{result['after_filename']}"
+
+    return Response(
+        content=result["jpeg"],
+        media_type="image/jpeg",
+        headers={
+          "X-After-Url": after_url,
+          "Access-Control-Expose-Headers": "X-After-Url",
+        },
+    )
+
+
+def _batch_variants(presets_raw: str | None, variants_raw: str | None) -> list[tuple[str, str, PresetConfig]]:
+    """
+    (name, preset, config) per variant. `variants` is a JSON list of
+    {"preset": .., "config": {overrides}, "name": ..}; otherwise `presets`
+    is a comma-separated list (default: every preset, current values).
+    """
+    if variants_raw:
+        try:
+            specs = json.loads(variants_raw)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Variants harus JSON yang valid")
+        if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+            raise HTTPException(status_code=400, detail="Variants harus list objek {preset, config, name}")
+    else:
+        names = [p.strip().lower() for p in (presets_raw or "").split(",") if p.strip()]
+        specs = [{"preset": name} for name in (names or PRESET_CONFIGS)]
+
+    if not specs:
+        raise HTTPException(status_code=400, detail="Minimal satu varian")
+    if len(specs) > BEAUTY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Maksimal {BEAUTY_BATCH_MAX} varian per batch")
+
+    variants, seen = [], set()
+    for i, spec in enumerate(specs):
+        preset = str(spec.get("preset") or "").lower()
+        if preset not in VALID_PRESETS:
+            raise HTTPException(status_code=400, detail=f"Preset tidak dikenal: {preset}")
+        overrides = spec.get("config") or {}
+        if not isinstance(overrides, dict):
+            raise HTTPException(status_code=400, detail="Config varian harus objek JSON")
+        name = str(spec.get("name") or (preset if not overrides else f"{preset}-{i + 1}"))
+        if name in seen:
+            name = f"{name}-{i + 1}"
+        seen.add(name)
+        try:
+            config = merge_config(preset, overrides)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Nilai config varian harus angka")
+        variants.append((name, preset, config))
+    return variants
+
+
+@router.post("/beauty/batch")
+async def beauty_batch_endpoint(
+    image: UploadFile | None = File(None),
+    captured: str | None = Form(None),
+    presets: str | None = Form(None),
+    variants: str | None = Form(None),
+    save_after: bool = Form(True),
+):
+    """
+    Render several presets (or override sets) of one photo in one call.
+    Face analysis and the shared intermediates are computed once; returns
+    the URL of every variant plus a contact sheet of all of them.
+    """
+    batch = _batch_variants(presets, variants)
+    source, source_key = await _read_source(image, captured)
+
+    result = await _run_job(
+        batch_job,
+        source,
+        [(name, config) for name, _, config in batch],
+        save_after,
+        _face_hint(source, source_key),
+        source_key=source_key,
+        timeout=BEAUTY_JOB_TIMEOUT * len(batch),
+    )
+
+    static = f"{API_BASE_URL.rstrip('/')}/static/after"
+    width, height = result["source_size"]
+    return {
+        "variants": [
+            {
+                "name": name,
+                "preset": preset,
+                "image_url": f"{static}/{item['filename']}",
+                "after_url": f"{static}/{item['after_filename']}" if item["after_filename"] else None,
+            }
+            for (name, preset, _), item in zip(batch, result["variants"])
+        ],
+        "contact_sheet_url": f"{static}/{result['contact_sheet']}",
+        "source_size": f"{width}x{height}",
+        "timing": result["timing"],
+    }
+
+
+# =========================
+# Async beauty jobs (submit, status, SSE progress, result)
+# =========================
+
+@router.post("/beauty/jobs", status_code=202)
+async def submit_beauty_job(
+    image: UploadFile | None = File(None),
+    captured: str | None = Form(None),
     preset: str = Form(...),
 ):
+    """
+    Start a beauty job and return its id immediately. Submitting the same
+    image (or captured file) with the same preset again returns the existing job.
+    """
     preset = preset.lower()
     if preset not in VALID_PRESETS:
         raise HTTPException(status_code=400, detail="Preset tidak dikenal")
 
+    source, source_key = await _read_source(image, captured)
+
     try:
-        contents = await image.read()
-        img = Image.open(io.BytesIO(contents)).convert("RGB")
-    except Exception:
-        raise HTTPException(status_code=400, detail="File gambar tidak valid")
+        job, created = BEAUTY_JOBS.submit(
+            source, source_key, preset, PRESET_CONFIGS[preset], _face_hint(source, source_key)
+        )
+    except TooManyJobs as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "5"})
+
+    api = API_BASE_URL.rstrip("/")
+    return {
+        **job.to_dict(),
+        "deduplicated": not created,
+        "status_url": f"{api}/api/beauty/jobs/{job.id}",
+        "events_url": f"{api}/api/beauty/jobs/{job.id}/events",
+    }
+
+
+def _get_job_or_404(job_id: str):
+    job = BEAUTY_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan")
+    return job
+
+
+@router.get("/beauty/jobs/{job_id}")
+async def beauty_job_status(job_id: str):
+    return _get_job_or_404(job_id).to_dict()
+
+
+@router.get("/beauty/jobs/{job_id}/events")
+async def beauty_job_events(job_id: str, request: Request):
+    """Server-sent events: one `progress` event per stage, then `done` or `error`."""
+    job = _get_job_or_404(job_id)
+
+    async def stream():
+        version = -1
+        while not await request.is_disconnected():
+            if job.version != version:
+                version = job.version
+                event = job.status if job.status in TERMINAL_STATUSES else "progress"
+                yield f"event: {event}\ndata: {json.dumps(job.to_dict())}\n\n"
+                if job.status in TERMINAL_STATUSES:
+                    return
+            elif not await BEAUTY_JOBS.wait_for_change(job, version, timeout=15):
+                yield ": ping\n\n"
 
-    out_img = beautify_image(img, preset)
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    # Simpan hasil filter ke folder after saja (lossless PNG, kualitas asli)
-    after_filename = save_image_lossless(out_img, AFTER_DIR, prefix="after")
-    after_url = f"{API_BASE_URL.rstrip('/')}/static/after/{after_filename}"
 
-    buffer = io.BytesIO()
-    out_img.save(buffer, format="JPEG", quality=95)
-    buffer.seek(0)
+@router.get("/beauty/jobs/{job_id}/result")
+async def beauty_job_result(job_id: str):
+    """JPEG of a finished job, served from memory."""
+    job = _get_job_or_404(job_id)
+    if job.status == "error":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "done" or job.jpeg is None:
+        raise HTTPException(status_code=409, detail="Job belum selesai")
 
     return Response(
-        content=buffer.read(),
+        content=job.jpeg,
         media_type="image/jpeg",
         headers={
-          "X-After-Url": after_url,
+          "X-After-Url": job.after_url,
           "Access-Control-Expose-Headers": "X-After-Url",
         },
     )
@@ -139,107 +422,148 @@ class SlotRel(BaseModel):
     w: float
     h: float
 
+    def rel(self) -> Rel:
+        return Rel(self.x, self.y, self.w, self.h)
+
 
 class RenderResultRequest(BaseModel):
     before_url: str
     after_url: str
+    # Template tersimpan di server (lihat /api/templates): layout + overlay diambil dari situ
+    template_id: str | None = None
     overlay_enabled: bool = True
     overlay_mode: str = "template"  # "template" | "logic"
-    overlay_src: str | None = None  # data URL atau URL jika template
-    overlay_rel: SlotRel
-    photo1_rel: SlotRel
-    photo2_rel: SlotRel
+    overlay_src: str | None = None  # data URL atau URL jika template (tanpa template_id)
+    overlay_rel: SlotRel | None = None
+    photo1_rel: SlotRel | None = None
+    photo2_rel: SlotRel | None = None
     filter_code: str | None = None
     canvas_width: int = 2400
     canvas_height: int = 3600
 
 
-def _load_image_from_source(src: str) -> Image.Image:
-    if src.startswith("data:"):
+def _load_image_from_source(src: str, mode: str = "RGBA") -> Image.Image:
+    # URL /static milik server ini dibaca langsung dari disk (cache decode),
+    # bukan di-fetch ulang lewat HTTP ke diri sendiri.
+    try:
+        return load_image_source(src, mode)
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except ImageSourceError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+def _request_overlay(req: RenderResultRequest, size: tuple[int, int]) -> Image.Image | None:
+    """Overlay for a request without template_id, pre-scaled and cached like template overlays."""
+    if req.overlay_mode == "template" and req.overlay_src:
+        src = req.overlay_src
+        if src.startswith("data:"):
+            return TEMPLATES.overlay_from_data(src, size, lambda: _load_image_from_source(src))
         try:
-            header, b64data = src.split(",", 1)
-            binary = base64.b64decode(b64data)
-            return Image.open(io.BytesIO(binary)).convert("RGBA")
-        except Exception as exc:  # noqa: BLE001
-            raise HTTPException(status_code=400, detail="Invalid data URL") from exc
-    if src.startswith("http://") or src.startswith("https://"):
-        resp = requests.get(src, timeout=15)
-        if not resp.ok:
-            raise HTTPException(status_code=400, detail=f"Failed to fetch image: {src}")
-        return Image.open(io.BytesIO(resp.content)).convert("RGBA")
-
-    # fallback: treat as local path
-    path = Path(src)
-    if not path.exists():
-        raise HTTPException(status_code=400, detail=f"Image path not found: {src}")
-    return Image.open(path).convert("RGBA")
-
-
-def _place_cover(canvas: Image.Image, img: Image.Image, rel: SlotRel) -> None:
-    cw, ch = canvas.size
-    x = int(rel.x * cw)
-    y = int(rel.y * ch)
-    w = max(1, int(rel.w * cw))
-    h = max(1, int(rel.h * ch))
-
-    scale = max(w / img.width, h / img.height)
-    new_w = int(img.width * scale)
-    new_h = int(img.height * scale)
-    resized = img.resize((new_w, new_h), Image.LANCZOS)
-
-    offset_x = max(0, (new_w - w) // 2)
-    offset_y = max(0, (new_h - h) // 2)
-    cropped = resized.crop((offset_x, offset_y, offset_x + w, offset_y + h))
-
-    canvas.alpha_composite(cropped, dest=(x, y))
+            path = static_path_for_url(src)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        if path is not None:
+            return TEMPLATES.overlay_image(path, size)
+        return _load_image_from_source(src).resize(size, Image.LANCZOS)
+    if req.overlay_mode == "logic" and req.filter_code:
+        path = LOGIC_OVERLAYS.get(req.filter_code)
+        if path and path.exists():
+            return TEMPLATES.overlay_image(path, size)
+    return None
+
+
+def _request_layers(req: RenderResultRequest, before_img: Image.Image, after_img: Image.Image) -> tuple[tuple[int, int], list[Layer]]:
+    if req.template_id:
+        try:
+            template = TEMPLATES.get(req.template_id)
+            photos = {"before": before_img, "after": after_img, "photo1": before_img, "photo2": after_img}
+            return template.canvas, TEMPLATES.layers(template, photos, req.filter_code if req.overlay_enabled else None)
+        except TemplateError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    if req.photo1_rel is None or req.photo2_rel is None:
+        raise HTTPException(status_code=400, detail="Isi template_id, atau photo1_rel dan photo2_rel")
+
+    canvas_size = (req.canvas_width, req.canvas_height)
+    layers = [
+        Layer("cover", before_img, req.photo1_rel.rel().box(canvas_size)),
+        Layer("cover", after_img, req.photo2_rel.rel().box(canvas_size)),
+    ]
+    if req.overlay_enabled and req.overlay_rel is not None:
+        box = req.overlay_rel.rel().box(canvas_size)
+        overlay_img = _request_overlay(req, box[2:])
+        if overlay_img is not None:
+            layers.append(Layer("overlay", overlay_img, box))
+    return canvas_size, layers
 
 
 @router.post("/render-result")
 def render_result(req: RenderResultRequest):
     try:
-        before_img = _load_image_from_source(req.before_url)
-        after_img = _load_image_from_source(req.after_url)
+        # Foto before/after selalu opaque: RGB (tanpa konversi ke RGBA)
+        before_img = _load_image_from_source(req.before_url, "RGB")
+        after_img = _load_image_from_source(req.after_url, "RGB")
     except HTTPException:
         raise
     except Exception as exc:  # noqa: BLE001
         raise HTTPException(status_code=400, detail=f"Gagal memuat gambar: {exc}") from exc
 
-    canvas = Image.new("RGBA", (req.canvas_width, req.canvas_height), (255, 255, 255, 255))
-
-    _place_cover(canvas, before_img, req.photo1_rel)
-    _place_cover(canvas, after_img, req.photo2_rel)
-
-    # overlay logic / template
-    if req.overlay_enabled:
-        overlay_img = None
-        if req.overlay_mode == "template" and req.overlay_src:
-            overlay_img = _load_image_from_source(req.overlay_src)
-        elif req.overlay_mode == "logic" and req.filter_code:
-            overlay_map = {
-                "MENCERAHKAN_KULIT": STATIC_DIR / "overlays" / "overlay_mencerahkan.png",
-                "MENGURANGI_KERIPUT": STATIC_DIR / "overlays" / "overlay_keriput.png",
-                "MELEMBABKAN_KULIT": STATIC_DIR / "overlays" / "overlay_melembabkan.png",
-            }
-            path = overlay_map.get(req.filter_code)
-            if path and path.exists():
-                overlay_img = Image.open(path).convert("RGBA")
-
-        if overlay_img:
-            cw, ch = canvas.size
-            x = int(req.overlay_rel.x * cw)
-            y = int(req.overlay_rel.y * ch)
-            w = max(1, int(req.overlay_rel.w * cw))
-            h = max(1, int(req.overlay_rel.h * ch))
-            overlay_resized = overlay_img.resize((w, h), Image.LANCZOS)
-            canvas.alpha_composite(overlay_resized, dest=(x, y))
-
-    # Simpan versi share-friendly (JPEG) di folder result
-    filename = save_image_jpeg(canvas, RESULT_DIR, prefix="result", quality=92)
+    # Semua slot + overlay (template atau logic) digambar dalam satu pass
+    canvas_size, layers = _request_layers(req, before_img, after_img)
+    canvas = compose(canvas_size, layers)
+
+    # Simpan versi share-friendly (JPEG progressive) di folder result.
+    # Encode sekali; byte yang sama dipakai untuk file & untuk GET /static/result.
+    filename = ENCODED_FILES.save(encode_jpeg(canvas, SHARE), RESULT_DIR, prefix="result")
     result_url = f"{API_BASE_URL.rstrip('/')}/static/result/{filename}"
 
     return JSONResponse({"result_url": result_url, "file_name": filename})
 
 
+# =========================
+# Templates (layout + overlay tersimpan di server)
+# =========================
+
+def _template_dict(template) -> dict:
+    return {"id": template.id, **template.raw}
+
+
+@router.get("/templates")
+def list_templates():
+    return {"templates": [_template_dict(t) for t in TEMPLATES.list()], "overlay_cache": OVERLAY_CACHE.stats()}
+
+
+@router.get("/templates/{template_id}")
+def get_template(template_id: str):
+    try:
+        return _template_dict(TEMPLATES.get(template_id))
+    except TemplateError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@router.put("/templates/{template_id}")
+async def save_template(
+    template_id: str,
+    layout: str = Form(...),
+    overlay: UploadFile | None = File(None),
+):
+    """
+    Simpan template (layout JSON, format sama dengan file di TEMPLATES_DIR) plus
+    gambar overlay opsional. Setelah itu /api/render-result cukup kirim template_id.
+    """
+    try:
+        data = json.loads(layout)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Layout harus JSON yang valid")
+    overlay_bytes = await overlay.read() if overlay is not None else None
+    try:
+        template = TEMPLATES.save(template_id, data, overlay_bytes)
+    except TemplateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return _template_dict(template)
+
+
 @router.get("/drive/latest")
 async def latest_drive_file():
     """Get latest uploaded Drive file (from watcher uploads)."""
@@ -257,39 +581,67 @@ async def latest_drive_file():
         "processed_time": latest.processed_time,
     }
 
-@router.get("/qr/{file_id}", tags=["QR Code"], response_class=StreamingResponse)
-async def qr_code_generator(file_id: str):
-    """Generate a QR code for a Drive share link."""
+@router.get("/drive/history")
+def drive_history(limit: int = Query(50, ge=1, le=200), before: float | None = None, name: str | None = None):
+    """
+    Riwayat upload Drive, terbaru dulu. Kirim `next_cursor` sebagai `before`
+    untuk halaman berikutnya; `name` mencari upload terakhir dari satu file lokal.
+    """
+    if name is not None:
+        found = PROCESSED_FILES.by_name(name)
+        items, cursor = ([found] if found else []), None
+    else:
+        items, cursor = PROCESSED_FILES.page(limit, before)
+    return {
+        "total": PROCESSED_FILES.count(),
+        "items": [item.to_dict() for item in items],
+        "next_cursor": cursor,
+    }
+
+
+@router.get("/drive/queue")
+def drive_upload_queue():
+    """Antrian upload Drive: jumlah menunggu/gagal, upload per menit, MB/detik."""
+    return UPLOAD_QUEUE.stats()
+
+
+@router.post("/drive/queue/retry")
+def drive_upload_retry():
+    """Masukkan lagi semua upload yang gagal ke antrian."""
+    return {"requeued": UPLOAD_QUEUE.retry_failed()}
+
+
+@router.get("/qr/{file_id}", tags=["QR Code"])
+def qr_code_generator(request: Request, file_id: str, format: str = "png", size: int = QR_BOX_SIZE):
+    """
+    QR code for a Drive share link, as PNG or SVG (`format`) with `size` px
+    per module. Images are rendered once (at upload) and served from cache.
+    """
     file_data = drive_service.get_processed_file(file_id)
     if not file_data:
         return RedirectResponse(url="/", status_code=status.HTTP_404_NOT_FOUND)
 
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(file_data.share_link)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
+    try:
+        qr = QR_CACHE.get(file_id, file_data.share_link, format, size)
+    except QrError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    return StreamingResponse(buffer, media_type="image/png")
+    # Link file Drive tidak pernah berubah untuk ID yang sama
+    headers = {"ETag": qr.etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == qr.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=qr.data, media_type=qr.media_type, headers=headers)
 
 
 @router.get("/", response_class=HTMLResponse, tags=["Sinkronisasi Status"])
-async def home():
-    """Landing page: shows sync status or prompts authorization."""
+def home():
+    """Landing page: shows sync status or prompts authorization (plain def: SQLite/Drive calls block)."""
     if auth_service.is_authorized():
         latest_file_html = ""
         latest = drive_service.get_latest_processed_file()
 
         if latest:
-            qr_link = f"/qr/{latest.id}"
+            qr_link = f"/api/qr/{latest.id}"
             preview_link = latest.share_link
 
             latest_file_html = f"""
@@ -310,15 +662,19 @@ async def home():
             </div>
             """
         else:
-            latest_file_html = "<p class='mt-4 text-red-500'>Belum ada file yang diunggah sejak server dimulai.</p>"
+            latest_file_html = "<p class='mt-4 text-red-500'>Belum ada file yang diunggah.</p>"
 
-        history = drive_service.get_processed_files_history()
-        file_list_html = ""
+        # Hanya halaman pertama; riwayat lengkap lewat /api/drive/history
+        history, _ = drive_service.get_processed_files_history(HOME_HISTORY_LIMIT)
+        total = PROCESSED_FILES.count()
         if history:
-            file_list_html = "<ul class='space-y-2'>"
-            for file_id, data in history.items():
-                file_list_html += f"<li class='flex justify-between items-center text-sm'><span class='font-medium text-gray-700'>**{data.name}**</span><a href='{data.share_link}' target='_blank' class='text-xs text-blue-500 hover:text-blue-700 underline'>Link Drive</a></li>"
-            file_list_html += "</ul>"
+            rows = "".join(
+                f"<li class='flex justify-between items-center text-sm'><span class='font-medium text-gray-700'>**{data.name}**</span><a href='{data.share_link}' target='_blank' class='text-xs text-blue-500 hover:text-blue-700 underline'>Link Drive</a></li>"
+                for data in history
+            )
+            file_list_html = f"<ul class='space-y-2'>{rows}</ul>"
+            if total > len(history):
+                file_list_html += f"<p class='mt-3 text-xs text-gray-500'>{len(history)} dari {total} file. <a href='/api/drive/history' class='text-blue-500 underline'>Lihat semua</a></p>"
         else:
             file_list_html = "<p class='text-sm text-gray-500'>Riwayat kosong.</p>"
 
@@ -346,7 +702,7 @@ async def home():
 
                     <hr class="my-10 border-gray-300">
 
-                    <h3 class="text-xl font-semibold mb-4 text-gray-800">Riwayat Sinkronisasi (Sejak Server Dimulai):</h3>
+                    <h3 class="text-xl font-semibold mb-4 text-gray-800">Riwayat Sinkronisasi ({total} file):</h3>
                     <div class="bg-white p-4 rounded-lg shadow-md max-h-60 overflow-y-auto border border-gray-100">
                         {file_list_html}
                     </div>
@@ -379,9 +735,11 @@ async def home():
 
 
 @router.get("/oauth2callback", tags=["Sinkronisasi Status"])
-async def oauth2callback(request: Request):
+def oauth2callback(request: Request):
     """Handle OAuth callback and persist refresh token."""
     auth_service.handle_callback(str(request.url))
+    # Upload yang menyerah karena Drive belum diotorisasi dicoba lagi
+    UPLOAD_QUEUE.retry_failed()
     return RedirectResponse(url="/", status_code=status.HTTP_302_FOUND)
 
 
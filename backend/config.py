@@ -17,6 +17,9 @@ AFTER_DIR = STATIC_DIR / "after"
 # Folder untuk menyimpan final result (jika ada post-processing lanjutan)
 RESULT_DIR = STATIC_DIR / "result"
 
+# Template layout cetak (JSON) + aset overlay-nya: backend/templates
+TEMPLATES_DIR = Path(os.getenv("TEMPLATES_DIR", str(BASE_DIR / "templates")))
+
 # Folder asli tempat digiCamControl menyimpan foto dari kamera
 # Default diset ke path yang kamu berikan, tapi bisa dioverride pakai env DIGICAM_ORIGINAL_DIR
 DIGICAM_ORIGINAL_DIR = Path(
@@ -38,8 +41,168 @@ DIGICAM_BASE_URL = os.getenv("DIGICAM_BASE_URL", "http://127.0.0.1:5513")
 DIGICAM_PREVIEW_PATH = os.getenv("DIGICAM_PREVIEW_PATH", "/liveview.jpg")
 DIGICAM_CAPTURE_CMD = os.getenv("DIGICAM_CAPTURE_CMD", "/?CMD=Capture")
 
+# Liveview diambil SATU thread grabber (koneksi keep-alive) lalu dibagikan ke semua
+# layar lewat MJPEG / WebSocket, jadi beban kamera tetap walau penontonnya banyak.
+# LIVEVIEW_FPS = frame per detik yang diambil dari digiCamControl,
+# LIVEVIEW_IDLE_TIMEOUT = grabber berhenti kalau tidak ada penonton selama ini (detik).
+LIVEVIEW_FPS = float(os.getenv("LIVEVIEW_FPS", "10"))
+LIVEVIEW_IDLE_TIMEOUT = float(os.getenv("LIVEVIEW_IDLE_TIMEOUT", "10"))
+
+# Deteksi file hasil jepret lewat event watchdog di DIGICAM_ORIGINAL_DIR (bukan polling folder).
+# CAPTURE_TIMEOUT = batas tunggu file baru (detik),
+# CAPTURE_STABLE_MS = file dianggap selesai ditulis kalau ukurannya tidak berubah selama ini,
+# CAPTURE_TRANSFER = move (default, rename; beda drive -> salin lalu hapus) | copy |
+#   link (hardlink, fallback copy; hati-hati: file di folder digiCamControl dan di CAPTURED_DIR
+#   berbagi inode, jadi kalau salah satu diubah di tempat, yang lain ikut berubah)
+CAPTURE_TIMEOUT = float(os.getenv("CAPTURE_TIMEOUT", "5"))
+CAPTURE_STABLE_MS = int(os.getenv("CAPTURE_STABLE_MS", "100"))
+CAPTURE_TRANSFER = os.getenv("CAPTURE_TRANSFER", "move").lower()
+
+# Ingest setelah jepret: JPEG di-decode SEKALI (draft), orientasi EXIF diterapkan, lalu dibuat
+# rendition di CAPTURED_DIR/renditions: working copy untuk proses beauty/render
+# (sisi terpanjang CAPTURE_WORK_LONG_EDGE, 0 = resolusi asli), preview layar dan thumbnail.
+# Default resolusi asli: foto after harus seukuran frame kamera. Isi mis. 3000 hanya kalau
+# hasil yang lebih kecil memang boleh (proses lebih cepat).
+CAPTURE_WORK_LONG_EDGE = int(os.getenv("CAPTURE_WORK_LONG_EDGE", "0"))
+CAPTURE_PREVIEW_LONG_EDGE = int(os.getenv("CAPTURE_PREVIEW_LONG_EDGE", "1280"))
+CAPTURE_THUMB_LONG_EDGE = int(os.getenv("CAPTURE_THUMB_LONG_EDGE", "320"))
+CAPTURE_WORK_JPEG_QUALITY = int(os.getenv("CAPTURE_WORK_JPEG_QUALITY", "95"))
+
 PREDICTOR_PATH = BASE_DIR / "shape_predictor_68_face_landmarks.dat"
 
+# Detektor wajah (landmark 68 titik tetap pakai dlib predictor di atas):
+#   "dlib" = HOG dlib (default), "haar" / "lbp" = cascade OpenCV, "dnn" = SSD res10 (CPU)
+# FACE_DETECT_MAX_SIDE = sisi terpanjang gambar saat deteksi (makin kecil makin cepat),
+# DLIB_UPSAMPLE = level upsample HOG (1 = bisa wajah kecil, 0 = ~4x lebih cepat).
+# FACE_DETECT_FALLBACK=1: kalau detektor pilihan tidak menemukan wajah, coba dlib.
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "dlib").lower()
+FACE_DETECT_MAX_SIDE = float(os.getenv("FACE_DETECT_MAX_SIDE", "1600"))
+DLIB_UPSAMPLE = int(os.getenv("DLIB_UPSAMPLE", "1"))
+FACE_DETECT_FALLBACK = os.getenv("FACE_DETECT_FALLBACK", "1") == "1"
+# Cascade LBP tidak ikut paket opencv-python, jadi path file harus diisi sendiri
+# (mis. lbpcascade_frontalface_improved.xml dari repo opencv). Haar default dari cv2.data.
+FACE_HAAR_CASCADE = os.getenv("FACE_HAAR_CASCADE", "")
+FACE_LBP_CASCADE = os.getenv("FACE_LBP_CASCADE", str(BASE_DIR / "lbpcascade_frontalface_improved.xml"))
+# Model DNN (file lokal, tidak diunduh saat runtime)
+FACE_DNN_MODEL = os.getenv("FACE_DNN_MODEL", str(BASE_DIR / "res10_300x300_ssd_iter_140000.caffemodel"))
+FACE_DNN_PROTOTXT = os.getenv("FACE_DNN_PROTOTXT", str(BASE_DIR / "deploy.prototxt"))
+FACE_DNN_CONFIDENCE = float(os.getenv("FACE_DNN_CONFIDENCE", "0.6"))
+
+# Foto grup: semua wajah yang lebarnya >= FACE_MIN_REL x wajah terbesar dan >= FACE_MIN_PX px
+# (di frame asli) ikut dirapikan, maksimal FACE_MAX_FACES (1 = hanya wajah terbesar).
+# FACE_THREADS = thread per foto untuk membuat mask / memproses area wajah secara paralel.
+FACE_MAX_FACES = int(os.getenv("FACE_MAX_FACES", "8"))
+FACE_MIN_REL = float(os.getenv("FACE_MIN_REL", "0.35"))
+FACE_MIN_PX = int(os.getenv("FACE_MIN_PX", "80"))
+FACE_THREADS = int(os.getenv("FACE_THREADS", "4"))
+
+# Batas memori cache analisis wajah (landmark, mask, LAB) dalam MB, total untuk
+# semua proses worker (tiap worker mendapat ANALYSIS_CACHE_MB / BEAUTY_WORKERS).
+# Preview berulang untuk foto yang sama tidak perlu deteksi wajah ulang. 0 = nonaktif.
+ANALYSIS_CACHE_MB = int(os.getenv("ANALYSIS_CACHE_MB", "1024"))
+
+# Mode ROI: proses hanya area wajah (+ margin blur), lalu di-feather ke foto asli.
+# Jauh lebih cepat & hemat memori untuk frame DSLR besar; area di luar wajah tidak diubah.
+BEAUTY_ROI_MODE = os.getenv("BEAUTY_ROI_MODE", "0") == "1"
+
+# Worker pool untuk proses beauty (CPU berat) di luar event loop.
+# BEAUTY_WORKERS = jumlah proses (0 = jalan di thread dalam proses API, untuk dev),
+# BEAUTY_QUEUE_SIZE = job yang boleh antre sebelum ditolak 429,
+# BEAUTY_JOB_TIMEOUT = batas waktu per job (detik).
+BEAUTY_WORKERS = int(os.getenv("BEAUTY_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+BEAUTY_QUEUE_SIZE = int(os.getenv("BEAUTY_QUEUE_SIZE", "4"))
+BEAUTY_JOB_TIMEOUT = float(os.getenv("BEAUTY_JOB_TIMEOUT", "60"))
+
+# Jatah thread CPU per proses worker (default: jumlah core / BEAUTY_WORKERS), supaya
+# proses x thread tidak melebihi jumlah core. Thread area wajah (FACE_THREADS) x thread
+# strip dibatasi ke jatah ini, begitu juga thread internal OpenCV.
+THREAD_BUDGET = int(os.getenv("THREAD_BUDGET", str(max(1, (os.cpu_count() or 1) // max(1, BEAUTY_WORKERS)))))
+
+# Filter & blend frame penuh (blur, bilateral, konversi warna, saturasi) dijalankan per strip
+# baris secara paralel. STRIP_THREADS = thread strip per proses worker (default: THREAD_BUDGET),
+# STRIP_ROWS = tinggi strip dalam piksel (kecil = muat di cache CPU, besar = overhead halo kecil).
+STRIP_THREADS = int(os.getenv("STRIP_THREADS", str(THREAD_BUDGET)))
+STRIP_ROWS = int(os.getenv("STRIP_ROWS", "128"))
+
+# Job async /api/beauty/jobs: berapa job selesai yang disimpan (beserta JPEG di memori)
+# dan berapa job boleh aktif bersamaan sebelum ditolak 429.
+BEAUTY_JOB_HISTORY = int(os.getenv("BEAUTY_JOB_HISTORY", "50"))
+BEAUTY_JOB_MAX_ACTIVE = int(os.getenv("BEAUTY_JOB_MAX_ACTIVE", "16"))
+
+# /api/beauty/batch: maksimal varian (preset/override) per foto dalam satu panggilan,
+# dan ukuran sisi terpanjang tiap sel contact sheet (px).
+BEAUTY_BATCH_MAX = int(os.getenv("BEAUTY_BATCH_MAX", "6"))
+CONTACT_SHEET_CELL = int(os.getenv("CONTACT_SHEET_CELL", "800"))
+
+# Cache gambar hasil decode dalam MB, untuk foto capture yang diproses langsung
+# dari CAPTURED_DIR tanpa upload ulang. Total untuk semua proses worker
+# (tiap worker mendapat DECODED_CACHE_MB / BEAUTY_WORKERS).
+DECODED_CACHE_MB = int(os.getenv("DECODED_CACHE_MB", "512"))
+
+# Format penyimpanan foto after (lossless):
+#   "png"  = PNG kompresi cepat (level AFTER_PNG_LEVEL, 0-9)
+#   "webp" = WebP lossless (AFTER_WEBP_METHOD 0-6, makin kecil makin cepat)
+#   "npy"  = array mentah .npy (paling cepat, untuk dipakai ulang internal, tidak bisa dibuka browser)
+# AFTER_ASYNC_WRITE=1 menulis file di background setelah response dikirim.
+AFTER_FORMAT = os.getenv("AFTER_FORMAT", "png").lower()
+AFTER_PNG_LEVEL = int(os.getenv("AFTER_PNG_LEVEL", "1"))
+AFTER_WEBP_METHOD = int(os.getenv("AFTER_WEBP_METHOD", "0"))
+AFTER_ASYNC_WRITE = os.getenv("AFTER_ASYNC_WRITE", "1") == "1"
+# Maksimal file after yang antre ditulis di background per proses (tiap antrean memegang foto
+# resolusi penuh di memori). Kalau penuh, file ditulis langsung sehingga job ikut menunggu.
+AFTER_MAX_PENDING = int(os.getenv("AFTER_MAX_PENDING", "2"))
+# Berapa lama render-result menunggu file after yang masih ditulis (detik)
+AFTER_WRITE_WAIT = float(os.getenv("AFTER_WRITE_WAIT", "10"))
+
+# Tracking wajah di frame liveview (background, resolusi rendah). Posisi wajah
+# terakhir yang stabil dipakai sebagai petunjuk ROI saat foto capture dideteksi.
+# FACE_TRACK_MAX_SIDE = sisi terpanjang frame saat deteksi, FACE_TRACK_FPS = batas deteksi/detik,
+# FACE_TRACK_MAX_AGE = umur maksimal petunjuk (detik) saat capture.
+FACE_TRACKING = os.getenv("FACE_TRACKING", "0") == "1"
+FACE_TRACK_MAX_SIDE = int(os.getenv("FACE_TRACK_MAX_SIDE", "320"))
+FACE_TRACK_FPS = float(os.getenv("FACE_TRACK_FPS", "4"))
+FACE_TRACK_MAX_AGE = float(os.getenv("FACE_TRACK_MAX_AGE", "3"))
+
+# Preview tuning (/api/presets/preview): diproses di proxy dengan sisi
+# terpanjang PREVIEW_LONG_EDGE px. Tile zoom full-res dibatasi PREVIEW_TILE_MAX px per sisi.
+PREVIEW_LONG_EDGE = int(os.getenv("PREVIEW_LONG_EDGE", "1024"))
+PREVIEW_TILE_MAX = int(os.getenv("PREVIEW_TILE_MAX", "1024"))
+
+# Encode JPEG: preview layar pakai baseline cepat, file final (share/QR)
+# pakai progressive + optimize. File hasil encode disimpan juga di memori
+# (ENCODED_CACHE_MB) supaya /static/result dilayani tanpa baca disk.
+# Preview sama dengan response lama (q95, 4:2:0 bawaan PIL), hanya tanpa encode ulang.
+PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", "95"))
+RESULT_JPEG_QUALITY = int(os.getenv("RESULT_JPEG_QUALITY", "92"))
+ENCODED_CACHE_MB = int(os.getenv("ENCODED_CACHE_MB", "128"))
+
+# Overlay template yang sudah di-resize ke ukuran slot/canvas disimpan di memori (MB)
+OVERLAY_CACHE_MB = int(os.getenv("OVERLAY_CACHE_MB", "256"))
+
+# Gambar dari URL luar (render-result): batas ukuran unduhan (MB), timeout (detik)
+# dan jumlah koneksi yang disimpan di pool requests.Session.
+REMOTE_IMAGE_MAX_MB = int(os.getenv("REMOTE_IMAGE_MAX_MB", "25"))
+REMOTE_IMAGE_TIMEOUT = float(os.getenv("REMOTE_IMAGE_TIMEOUT", "15"))
+REMOTE_IMAGE_POOL_SIZE = int(os.getenv("REMOTE_IMAGE_POOL_SIZE", "8"))
+
+# Cetak rincian waktu per stage pipeline beauty ke log (1 = aktif)
+PIPELINE_TIMING_LOG = os.getenv("PIPELINE_TIMING_LOG", "1") == "1"
+
+# Presisi penyimpanan mask & layer area wajah: float32 (referensi), float16, atau
+# fixed (mask 8-bit, layer 16-bit). Cek selisih visual dengan backend.services.precision_report.
+BEAUTY_PRECISION = os.getenv("BEAUTY_PRECISION", "float32").lower()
+
+# Buffer float (hasil & sementara) pipeline beauty yang disimpan untuk dipakai ulang
+# antar request. Ukurannya dihitung dari resolusi kamera: SCRATCH_FRAMES buffer float32
+# 3-kanal seukuran satu frame SCRATCH_FRAME_MP megapiksel (12 byte/piksel, 24MP ~290 MB),
+# total untuk semua proses worker (tiap worker mendapat SCRATCH_POOL_MB / BEAUTY_WORKERS).
+# Buffer yang lebih besar dari satu frame tidak disimpan. SCRATCH_POOL_MB (MB) mengganti
+# hitungan ini kalau diisi. 0 = nonaktif.
+SCRATCH_FRAME_MP = float(os.getenv("SCRATCH_FRAME_MP", "24"))
+SCRATCH_FRAMES = int(os.getenv("SCRATCH_FRAMES", "2"))
+SCRATCH_BUFFER_MAX_BYTES = int(SCRATCH_FRAME_MP * 1_000_000) * 12
+SCRATCH_POOL_MB = int(os.getenv("SCRATCH_POOL_MB", str(SCRATCH_FRAMES * SCRATCH_BUFFER_MAX_BYTES // (1024 * 1024))))
+
 # CORS: asal frontend yang diizinkan akses API
 FRONTEND_ORIGINS = os.getenv(
     "FRONTEND_ORIGINS",
@@ -61,3 +224,29 @@ SCOPES = ["https://www.googleapis.com/auth/drive"]
 TARGET_FOLDER_ID = os.getenv("TARGET_FOLDER_ID", "1PKm4EjaKmV6DM57i3Wzg7u2Cwc1zlQDY")
 # default ke folder RESULT_DIR (absolute path) supaya watcher bekerja pasti
 LOCAL_FOLDER_PATH = os.getenv("LOCAL_FOLDER_PATH", str(RESULT_DIR))
+
+# Antrian upload ke Drive (SQLite, tahan restart). UPLOAD_WORKERS thread uploader,
+# gagal dicoba ulang dengan jeda UPLOAD_RETRY_BASE * 2^n detik (maks UPLOAD_RETRY_MAX)
+# sampai UPLOAD_MAX_ATTEMPTS kali. File baru ditunggu UPLOAD_SETTLE_SECONDS sampai selesai ditulis.
+# Saat start, file di LOCAL_FOLDER_PATH yang belum pernah masuk antrian (umur <= UPLOAD_RESCAN_HOURS jam,
+# 0 = semua) ikut diunggah.
+UPLOAD_DB_PATH = Path(os.getenv("UPLOAD_DB_PATH", str(BASE_DIR / "upload_queue.sqlite3")))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "8"))
+UPLOAD_RETRY_BASE = float(os.getenv("UPLOAD_RETRY_BASE", "2"))
+UPLOAD_RETRY_MAX = float(os.getenv("UPLOAD_RETRY_MAX", "300"))
+UPLOAD_SETTLE_SECONDS = float(os.getenv("UPLOAD_SETTLE_SECONDS", "1"))
+UPLOAD_RESCAN_HOURS = float(os.getenv("UPLOAD_RESCAN_HOURS", "24"))
+
+# Riwayat file yang sudah diunggah (Drive ID -> link), disimpan di SQLite supaya QR tetap
+# jalan setelah restart. PROCESSED_HOT_SIZE entri terbaru disimpan juga di memori.
+PROCESSED_DB_PATH = Path(os.getenv("PROCESSED_DB_PATH", str(BASE_DIR / "processed_files.sqlite3")))
+PROCESSED_HOT_SIZE = int(os.getenv("PROCESSED_HOT_SIZE", "256"))
+
+# QR code file Drive: dibuat sekali saat upload (format QR_PRERENDER_FORMATS, ukuran modul
+# QR_BOX_SIZE px), disimpan di memori (QR_CACHE_MB) dan di QR_CACHE_DIR (maks QR_CACHE_DISK_FILES file).
+QR_CACHE_DIR = Path(os.getenv("QR_CACHE_DIR", str(BASE_DIR / "qr_cache")))
+QR_CACHE_MB = int(os.getenv("QR_CACHE_MB", "16"))
+QR_CACHE_DISK_FILES = int(os.getenv("QR_CACHE_DISK_FILES", "5000"))
+QR_BOX_SIZE = int(os.getenv("QR_BOX_SIZE", "10"))
+QR_PRERENDER_FORMATS = [f.strip() for f in os.getenv("QR_PRERENDER_FORMATS", "png").split(",") if f.strip()]
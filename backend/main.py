@@ -1,19 +1,29 @@
 # backend/main.py
 import asyncio
-import json
 from pathlib import Path
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from PIL import Image
 from pydantic import BaseModel
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 
-from backend.config import FRONTEND_ORIGINS, STATIC_DIR
+from backend.config import FRONTEND_ORIGINS, RESULT_DIR, STATIC_DIR
 from backend.api.camera import router as camera_router
 from backend.api.routes import router as beauty_router  # /api endpoints
+from backend.services.after_store import AFTER_STORE
+from backend.services.capture_watcher import CAPTURE_WATCHER
+from backend.services.compositor import compose
+from backend.services.encoder import ENCODED_FILES
+from backend.services.image_cache import load_rgb
+from backend.services.job_service import BEAUTY_JOBS
+from backend.services.liveview import LIVEVIEW
+from backend.services.processed_store import PROCESSED_FILES
+from backend.services.storage import resolve_static_file
+from backend.services.templates import TEMPLATES, TemplateError
+from backend.services.upload_queue import UPLOAD_QUEUE, start_upload_queue
+from backend.services.worker_pool import BEAUTY_POOL
 from backend.services.watcher_service import (
     set_main_async_loop,
     start_local_watcher,
@@ -31,6 +41,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# File result disimpan sekaligus di memori saat di-encode; layani byte itu
+# langsung. Harus didaftarkan sebelum mount /static supaya menang.
+@app.get("/static/result/{filename}", include_in_schema=False)
+def serve_result_file(filename: str):
+    try:
+        path = resolve_static_file(filename, RESULT_DIR)
+    except FileNotFoundError:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    headers = {"Cache-Control": "public, max-age=31536000, immutable"}  # nama file unik per render
+    data = ENCODED_FILES.get(path)
+    if data is None:
+        return FileResponse(path, headers=headers)
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
+
 # Serve /static -> backend/static
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
@@ -64,12 +89,26 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 async def on_startup():
     loop = asyncio.get_event_loop()
     set_main_async_loop(loop)
+    PROCESSED_FILES.load()
+    start_upload_queue()
     start_local_watcher()
+    CAPTURE_WATCHER.start()
+    TEMPLATES.load_all()
+    AFTER_STORE.clean_partial()
+    BEAUTY_POOL.start()
+    BEAUTY_JOBS.start(loop)
+    LIVEVIEW.set_loop(loop)
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
     stop_local_watcher()
+    UPLOAD_QUEUE.stop()
+    CAPTURE_WATCHER.stop()
+    LIVEVIEW.stop()
+    BEAUTY_JOBS.stop()
+    BEAUTY_POOL.shutdown()
+    AFTER_STORE.flush()
 
 
 @app.get("/health")
@@ -79,32 +118,24 @@ def health_check():
 
 class RenderRequest(BaseModel):
     photo_path: str  # path foto dari kamera
-    template_name: str  # misal "template1.json"
+    template_name: str  # id template, misal "template1" (atau "template1.json")
+    photos: dict[str, str] = {}  # foto per nama slot; slot lain diisi photo_path
+    filter_code: str | None = None  # untuk overlay "logic" di template
 
 
 @app.post("/render")
 def render(req: RenderRequest):
-    tpl_path = BASE_DIR / "templates" / req.template_name
-    with open(tpl_path, "r", encoding="utf-8") as f:
-        tpl = json.load(f)
-
-    canvas_w = tpl["canvas"]["width"]
-    canvas_h = tpl["canvas"]["height"]
-    canvas = Image.new("RGBA", (canvas_w, canvas_h), (255, 255, 255, 255))
-
-    photo = Image.open(BASE_DIR / req.photo_path).convert("RGBA")
-
-    # contoh: cuma pakai 1 slot kamera
-    slot = tpl["camera_slots"][0]
-    x = int(slot["x_rel"] * canvas_w)
-    y = int(slot["y_rel"] * canvas_h)
-    w = int(slot["w_rel"] * canvas_w)
-    h = int(slot["h_rel"] * canvas_h)
-
-    photo_resized = photo.resize((w, h), Image.LANCZOS)
-    canvas.alpha_composite(photo_resized, dest=(x, y))
-
-    # TODO: loop overlays di tpl["overlays"] kalau ada
+    try:
+        tpl = TEMPLATES.get(req.template_name)
+        photos = {
+            slot.name: load_rgb(BASE_DIR / req.photos.get(slot.name, req.photo_path))
+            for slot in tpl.slots
+        }
+        canvas = compose(tpl.canvas, TEMPLATES.layers(tpl, photos, req.filter_code))
+    except TemplateError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=f"Foto tidak ditemukan: {exc.filename}") from exc
 
     out_dir = BASE_DIR / "outputs"
     out_dir.mkdir(exist_ok=True)
@@ -1,4 +1,6 @@
 # backend/models/camera.py
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -6,7 +8,10 @@ class CaptureResponse(BaseModel):
     """
     Response standar untuk endpoint /api/camera/capture.
 
-    Kita sengaja cuma kirim satu field:
-    - photo_url: URL absolute yang bisa langsung dipakai <img src="...">
+    - photo_url: URL absolute file asli; dipakai sebagai referensi `captured` ke backend
+    - preview_url / thumbnail_url: rendition kecil untuk ditampilkan di layar
+      (None kalau ingest gagal, pakai photo_url)
     """
     photo_url: str
+    preview_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from backend.config import (
+    AFTER_ASYNC_WRITE,
+    AFTER_DIR,
+    AFTER_FORMAT,
+    AFTER_MAX_PENDING,
+    AFTER_PNG_LEVEL,
+    AFTER_WEBP_METHOD,
+    AFTER_WRITE_WAIT,
+)
+
+# File yang sedang ditulis diberi akhiran ini lalu di-rename, jadi file
+# final tidak pernah terbaca setengah jadi (juga dari proses lain).
+PARTIAL_SUFFIX = ".part"
+
+
+@dataclass(frozen=True)
+class AfterFormat:
+    name: str
+    extension: str
+    write: Callable[[Image.Image, Path], None]
+
+
+def _write_png(img: Image.Image, path: Path) -> None:
+    img.save(path, format="PNG", compress_level=AFTER_PNG_LEVEL)
+
+
+def _write_webp(img: Image.Image, path: Path) -> None:
+    img.save(path, format="WEBP", lossless=True, quality=0, method=AFTER_WEBP_METHOD)
+
+
+def _write_npy(img: Image.Image, path: Path) -> None:
+    # np.save ke file handle supaya nama .part tidak ditambah ".npy" lagi
+    with open(path, "wb") as f:
+        np.save(f, np.asarray(img), allow_pickle=False)
+
+
+FORMATS: Dict[str, AfterFormat] = {
+    "png": AfterFormat("png", ".png", _write_png),
+    "webp": AfterFormat("webp", ".webp", _write_webp),
+    "npy": AfterFormat("npy", ".npy", _write_npy),
+}
+
+
+class AfterStore:
+    """
+    Writes "after" images to AFTER_DIR in the configured lossless format.
+
+    save() returns the final file name straight away; with async writes
+    the encode runs on a background thread and the file appears (via an
+    atomic rename) once done. At most `max_pending` writes wait in the
+    background (each holds a full-res image); beyond that save() writes
+    synchronously, so a slow format slows the jobs down instead of
+    piling up images in memory. Size and write latency per format are
+    kept for stats() and printed per file.
+    """
+
+    def __init__(self, directory: Path, fmt: str, async_write: bool, max_pending: int = AFTER_MAX_PENDING):
+        if fmt not in FORMATS:
+            raise ValueError(f"AFTER_FORMAT tidak dikenal: {fmt} (pilih {', '.join(FORMATS)})")
+        self.directory = directory
+        self.format = FORMATS[fmt]
+        self.async_write = async_write
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="after-write")
+            return self._executor
+
+    def _record(self, fmt: str, nbytes: int, ms: float) -> None:
+        with self._lock:
+            s = self._stats.setdefault(fmt, {"files": 0, "bytes": 0, "write_ms": 0.0})
+            s["files"] += 1
+            s["bytes"] += nbytes
+            s["write_ms"] += ms
+
+    def _write(self, img: Image.Image, filename: str) -> str:
+        path = self.directory / filename
+        partial = path.with_name(path.name + PARTIAL_SUFFIX)
+        started = time.perf_counter()
+        try:
+            self.format.write(img, partial)
+            os.replace(partial, path)
+        except Exception as exc:  # noqa: BLE001
+            partial.unlink(missing_ok=True)
+            print(f"[AFTER] Gagal menulis {filename}: {exc}")
+            raise
+        ms = (time.perf_counter() - started) * 1000.0
+        nbytes = path.stat().st_size
+        self._record(self.format.name, nbytes, ms)
+        print(f"[AFTER] {filename} {nbytes / 1e6:.1f} MB dalam {ms:.0f}ms ({self.format.name})")
+        return filename
+
+    def save(self, img: Image.Image, prefix: str = "after") -> str:
+        """Store img and return its file name (it may still be being written)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        filename = f"{prefix}_{timestamp}{self.format.extension}"
+
+        with self._lock:
+            queue = self.async_write and self._pending < self.max_pending
+            if queue:
+                self._pending += 1
+        if not queue:
+            return self._write(img, filename)
+
+        # Tandai dulu sebagai sedang ditulis supaya pembaca tahu harus menunggu
+        (self.directory / (filename + PARTIAL_SUFFIX)).touch()
+        self._get_executor().submit(self._write_queued, img, filename)
+        return filename
+
+    def _write_queued(self, img: Image.Image, filename: str) -> str:
+        try:
+            return self._write(img, filename)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def clean_partial(self) -> int:
+        """
+        Remove leftover .part files, e.g. from a worker that was recycled
+        mid-write. Call at startup, before any writer is running.
+        """
+        removed = 0
+        for partial in self.directory.glob("*" + PARTIAL_SUFFIX):
+            partial.unlink(missing_ok=True)
+            removed += 1
+        if removed:
+            print(f"[AFTER] {removed} file {PARTIAL_SUFFIX} sisa penulisan sebelumnya dihapus")
+        return removed
+
+    def flush(self) -> None:
+        """Wait for all background writes to finish."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                fmt: {
+                    **s,
+                    "avg_mb": round(s["bytes"] / s["files"] / 1e6, 2),
+                    "avg_write_ms": round(s["write_ms"] / s["files"], 1),
+                }
+                for fmt, s in self._stats.items()
+            }
+
+
+def wait_until_written(path: Path, timeout: float = AFTER_WRITE_WAIT) -> bool:
+    """
+    If `path` is still being written by an AfterStore (in any process),
+    wait for it. Returns True once the file exists. A marker untouched for
+    longer than `timeout` belongs to a writer that died (e.g. a recycled
+    worker) and is treated as a failed write, not waited on.
+    """
+    partial = path.with_name(path.name + PARTIAL_SUFFIX)
+    deadline = time.monotonic() + timeout
+    while not path.exists() and time.monotonic() < deadline:
+        try:
+            if time.time() - partial.stat().st_mtime > timeout:
+                break
+        except FileNotFoundError:
+            break
+        time.sleep(0.05)
+    return path.exists()
+
+
+AFTER_STORE = AfterStore(AFTER_DIR, AFTER_FORMAT, AFTER_ASYNC_WRITE)
+
+
+__all__ = ["AfterStore", "AFTER_STORE", "FORMATS", "wait_until_written"]
+
+
+if __name__ == "__main__":
+    # Bandingkan ukuran & waktu tulis tiap format:
+    #   python -m backend.services.after_store foto.jpg
+    import sys
+    import tempfile
+
+    src = Image.open(sys.argv[1]).convert("RGB")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in FORMATS:
+            store = AfterStore(Path(tmp), name, async_write=False)
+            store.save(src)
+            print(name, store.stats()[name])
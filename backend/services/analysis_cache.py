@@ -0,0 +1,387 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from backend.config import ANALYSIS_CACHE_MB
+from backend.services.converters import bgr8_to_float, pil_to_bgr8
+from backend.services.face_detection import detect_faces, locate_faces
+from backend.services.face_threads import map_faces
+from backend.services.masks import (
+    compute_edge_preserve_mask,
+    create_cheek_highlight_mask,
+    create_skin_mask,
+    create_under_eye_mask,
+    create_wrinkle_mask,
+)
+from backend.services.precision import Precision, get_precision, pack
+from backend.services.roi import Box, blur_margin, face_roi, group_boxes, pad_box
+from backend.services.strips import run_strips
+
+
+@dataclass
+class FaceAnalysis:
+    """
+    Everything beautify_image needs that does not depend on PresetConfig:
+    landmarks, face masks, edge mask and the LAB split of the input.
+
+    One analysis covers `roi` (the whole frame unless ROI mode cropped it)
+    and every face in it: masks are the per-face masks merged. Landmarks
+    and rect are those of the largest face, `faces` holds the landmarks of
+    all of them; all in full-frame coordinates.
+
+    The face masks (skin, under-eye, cheek, wrinkle) are zero outside the
+    face boxes, so they only cover `mask_box` (roi coordinates); the edge
+    mask and LAB cover the whole roi.
+    """
+    landmarks: np.ndarray
+    rect: object
+    roi: Box
+    mask_box: Box
+    skin_mask: np.ndarray
+    under_eye_mask: np.ndarray
+    cheek_mask: np.ndarray
+    wrinkle_mask: np.ndarray
+    edge_preserve_mask: np.ndarray
+    lab: np.ndarray  # uint8 LAB, same values the pipeline used to split
+    mean_L: float
+    faces: list = field(default_factory=list)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (
+            self.landmarks,
+            self.skin_mask,
+            self.under_eye_mask,
+            self.cheek_mask,
+            self.wrinkle_mask,
+            self.edge_preserve_mask,
+            self.lab,
+        )
+        return sum(arr.nbytes for arr in arrays) + sum(pts.nbytes for pts in self.faces)
+
+    def freeze(self) -> None:
+        """Mark cached arrays read-only so a stage cannot corrupt them in place."""
+        for arr in (
+            self.skin_mask,
+            self.under_eye_mask,
+            self.cheek_mask,
+            self.wrinkle_mask,
+            self.edge_preserve_mask,
+            self.lab,
+        ):
+            arr.setflags(write=False)
+
+
+_KEY_BAND_ROWS = 256
+
+
+def image_key(img_pil: Image.Image) -> str:
+    """Content hash of the decoded pixels, used as the analysis cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{img_pil.mode}:{img_pil.width}x{img_pil.height}".encode())
+    # In bands of rows (same bytes as tobytes()), so no full-frame copy is made
+    for y in range(0, img_pil.height, _KEY_BAND_ROWS):
+        digest.update(img_pil.crop((0, y, img_pil.width, min(img_pil.height, y + _KEY_BAND_ROWS))).tobytes())
+    return digest.hexdigest()
+
+
+def _clip(box: Box, roi: Box) -> Box | None:
+    """box intersected with roi, in roi coordinates; None if they do not overlap."""
+    x0, y0 = max(box[0], roi[0]), max(box[1], roi[1])
+    x1, y1 = min(box[2], roi[2]), min(box[3], roi[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0 - roi[0], y0 - roi[1], x1 - roi[0], y1 - roi[1]
+
+
+def analyze_face(
+    img_bgr: np.ndarray,
+    faces: list,
+    roi: Box | None = None,
+    scale: float = 1.0,
+    frame_shape=None,
+    precision: Precision | None = None,
+) -> FaceAnalysis:
+    """
+    Build all masks and split LAB for a BGR uint8 (or float32 [0, 1]) image.
+
+    `faces` is [(landmarks, rect), ...] in full-frame coordinates, largest
+    first. Each face's masks are built only inside its own face box (in
+    parallel on the face threads) and merged into masks covering the union
+    of the face boxes (analysis.mask_box).
+    When img_bgr is a crop of a larger frame, pass its `roi` and the
+    `frame_shape` of the full frame. `scale` is the proxy-to-full
+    resolution ratio for downscaled previews. The masks are stored in the
+    mask dtype of `precision` (default BEAUTY_PRECISION).
+    """
+    precision = precision or get_precision()
+    h, w = img_bgr.shape[:2]
+    if roi is None:
+        roi = (0, 0, w, h)
+    frame_shape = frame_shape or (h, w)
+
+    boxes = [_clip(face_roi(landmarks, frame_shape, scale), roi) for landmarks, _ in faces]
+    inside = [box for box in boxes if box is not None]
+    if inside:
+        mask_box = (
+            min(b[0] for b in inside),
+            min(b[1] for b in inside),
+            max(b[2] for b in inside),
+            max(b[3] for b in inside),
+        )
+    else:
+        mask_box = (0, 0, 0, 0)
+    mx0, my0, mx1, my1 = mask_box
+    skin_mask = np.zeros((my1 - my0, mx1 - mx0), dtype=np.float32)
+    under_eye_mask = np.zeros_like(skin_mask)
+    cheek_mask = np.zeros_like(skin_mask)
+    wrinkle_mask = np.zeros_like(skin_mask)
+
+    def build(item):
+        (landmarks, _), box = item
+        if box is None:
+            return None
+        x0, y0, x1, y1 = box
+        sub = img_bgr[y0:y1, x0:x1]
+        local = landmarks - np.array([roi[0] + x0, roi[1] + y0], dtype=landmarks.dtype)
+        under_eye = create_under_eye_mask(sub, local, scale)
+        return box, (
+            create_skin_mask(sub, local, scale),
+            under_eye,
+            create_cheek_highlight_mask(sub.shape, local, scale),
+            create_wrinkle_mask(sub.shape, local, under_eye, scale),
+        )
+
+    for built in map_faces(build, zip(faces, boxes)):
+        if built is None:
+            continue
+        (x0, y0, x1, y1), masks = built
+        for target, mask in zip((skin_mask, under_eye_mask, cheek_mask, wrinkle_mask), masks):
+            view = target[y0 - my0:y1 - my0, x0 - mx0:x1 - mx0]
+            np.maximum(view, mask, out=view)
+
+    if img_bgr.dtype != np.uint8:
+        img_bgr = (np.clip(img_bgr, 0.0, 1.0) * 255.0).astype(np.uint8)
+    img_lab = np.empty_like(img_bgr)
+    run_strips(lambda s: cv2.cvtColor(img_bgr[s.rows], cv2.COLOR_BGR2LAB, dst=img_lab[s.rows]), h)
+
+    skin_pixels = img_lab[my0:my1, mx0:mx1, 0][(skin_mask * 255).astype(np.uint8) > 0]
+    mean_L = float(np.mean(skin_pixels)) if len(skin_pixels) > 0 else 128.0
+
+    mask_dtype = precision.mask_dtype
+    landmarks, rect = faces[0]
+    return FaceAnalysis(
+        landmarks=landmarks,
+        rect=rect,
+        roi=roi,
+        mask_box=mask_box,
+        skin_mask=pack(skin_mask, mask_dtype),
+        under_eye_mask=pack(under_eye_mask, mask_dtype),
+        cheek_mask=pack(cheek_mask, mask_dtype),
+        wrinkle_mask=pack(wrinkle_mask, mask_dtype),
+        edge_preserve_mask=pack(compute_edge_preserve_mask(img_bgr, scale), mask_dtype),
+        lab=img_lab,
+        mean_L=mean_L,
+        faces=[pts for pts, _ in faces],
+    )
+
+
+_MISSING = object()
+
+
+class AnalysisCache:
+    """
+    LRU cache of the analyses of an image (one per face region) keyed by
+    image content hash, bounded by the total bytes of the cached arrays.
+    Images without a face are cached too (as an empty tuple) so repeated
+    previews skip detection either way.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple[FaceAnalysis, ...]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(entry: "tuple[FaceAnalysis, ...]") -> int:
+        return sum(analysis.nbytes for analysis in entry)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry: "tuple[FaceAnalysis, ...]") -> None:
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, _MISSING)
+            if old is not _MISSING:
+                self._bytes -= self._size(old)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+ANALYSIS_CACHE = AnalysisCache(ANALYSIS_CACHE_MB * 1024 * 1024)
+
+
+# Faces per image (by content hash), shared by ROI and tile requests so
+# each new tile of the same photo does not run face detection again.
+_LANDMARKS: "OrderedDict[str, list]" = OrderedDict()
+_LANDMARKS_MAX = 32
+_landmarks_lock = threading.Lock()
+
+
+def _locate_cached(img_pil: Image.Image, img_hash: str | None, hint=None) -> list:
+    if img_hash is not None:
+        with _landmarks_lock:
+            found = _LANDMARKS.get(img_hash)
+        if found is not None:
+            return found
+    found = locate_faces(img_pil, hint=hint)
+    if img_hash is not None:
+        with _landmarks_lock:
+            _LANDMARKS[img_hash] = found
+            while len(_LANDMARKS) > _LANDMARKS_MAX:
+                _LANDMARKS.popitem(last=False)
+    return found
+
+
+def _analyze(
+    img_pil: Image.Image,
+    roi_mode: bool,
+    progress: Callable[[str], None],
+    scale: float = 1.0,
+    region: Box | None = None,
+    img_hash: str | None = None,
+    hint=None,
+    precision: Precision | None = None,
+) -> list[tuple[FaceAnalysis, np.ndarray]]:
+    progress("detect")
+    frame_shape = (img_pil.height, img_pil.width)
+    if roi_mode or region is not None:
+        faces = _locate_cached(img_pil, img_hash, hint)
+        if not faces:
+            return []
+        if region is not None:
+            # Tile: the requested box plus enough context for every blur
+            groups = [(pad_box(region, blur_margin(frame_shape, scale), frame_shape), faces)]
+        else:
+            # One region per face, merged where their boxes overlap (people
+            # standing close together), so no pixel is retouched twice
+            boxes = [face_roi(landmarks, frame_shape, scale) for landmarks, _ in faces]
+            groups = [(box, [faces[i] for i in idx]) for box, idx in group_boxes(boxes)]
+
+        progress("mask")
+
+        def build(group):
+            roi, members = group
+            img_bgr = pil_to_bgr8(img_pil.crop(roi))
+            return analyze_face(img_bgr, members, roi, scale, frame_shape, precision), img_bgr
+
+        return map_faces(build, groups)
+
+    img_bgr = pil_to_bgr8(img_pil)
+    # The detector keeps its float input; that copy is dropped right after
+    faces = detect_faces(bgr8_to_float(img_bgr), hint=hint)
+    if not faces:
+        return []
+    progress("mask")
+    return [(analyze_face(img_bgr, faces, None, scale, precision=precision), img_bgr)]
+
+
+def _cache_mode(roi_mode: bool, scale: float, region: Box | None, precision: Precision) -> str:
+    mode = "region:" + ",".join(map(str, region)) if region is not None else ("roi" if roi_mode else "full")
+    mode = mode if scale == 1.0 else f"{mode}@{scale:.5f}"
+    return f"{mode}/{precision.name}"
+
+
+def get_face_analyses(
+    img_pil: Image.Image,
+    roi_mode: bool = False,
+    progress: Callable[[str], None] | None = None,
+    scale: float = 1.0,
+    region: Box | None = None,
+    hint=None,
+    precision: Precision | None = None,
+) -> list[tuple[FaceAnalysis, np.ndarray]]:
+    """
+    Return [(analysis, img_bgr), ...] for this image, computing the
+    analyses on a cache miss; empty if no face is found. Each img_bgr is
+    the uint8 BGR of its analysis.roi only; the retouch stages convert to
+    float what they need.
+
+    Full-frame mode and tiles give one analysis with every face in it. ROI
+    mode gives one per group of overlapping faces, so a group photo is
+    retouched region by region. `region` restricts the work to that box
+    (plus blur context) for full-res tiles; `scale` is the proxy ratio of a
+    downscaled preview. `hint` is a relative face box from liveview
+    tracking, searched before the full frame. `progress` is told "detect"
+    and "mask" as those steps start (not called on a cache hit). The masks
+    are stored in `precision` (default BEAUTY_PRECISION); each precision is
+    cached separately.
+    """
+    precision = precision or get_precision()
+    use_cache = ANALYSIS_CACHE.max_bytes > 0
+    img_hash = image_key(img_pil) if use_cache or region is not None else None
+    key = f"{img_hash}:{_cache_mode(roi_mode, scale, region, precision)}" if use_cache else None
+
+    entry = ANALYSIS_CACHE.get(key) if key else _MISSING
+    if entry is _MISSING:
+        found = _analyze(
+            img_pil, roi_mode, progress or (lambda stage: None), scale, region, img_hash, hint, precision
+        )
+        for analysis, _ in found:
+            analysis.freeze()
+        if key:
+            ANALYSIS_CACHE.put(key, tuple(analysis for analysis, _ in found))
+        return found
+
+    full = (0, 0, img_pil.width, img_pil.height)
+    return [
+        (analysis, pil_to_bgr8(img_pil if analysis.roi == full else img_pil.crop(analysis.roi)))
+        for analysis in entry
+    ]
+
+
+__all__ = [
+    "FaceAnalysis",
+    "AnalysisCache",
+    "ANALYSIS_CACHE",
+    "analyze_face",
+    "get_face_analyses",
+    "image_key",
+]
@@ -1,130 +1,629 @@
+from typing import Callable
+
 import cv2
 import numpy as np
 from PIL import Image
 
+from backend.config import BEAUTY_ROI_MODE, PIPELINE_TIMING_LOG
 from backend.models.presets import PRESET_CONFIGS, PresetConfig
-from backend.services.converters import pil_to_cv, cv_to_pil
-from backend.services.face_detection import detect_face_and_landmarks
-from backend.services.filters import apply_unsharp_mask, boost_saturation
-from backend.services.masks import (
-    compute_edge_preserve_mask,
-    create_cheek_highlight_mask,
-    create_skin_mask,
-    create_under_eye_mask,
-    create_wrinkle_mask,
+from backend.services.analysis_cache import get_face_analyses
+from backend.services.converters import bgr8_to_float, cv_to_pil
+from backend.services.face_threads import map_faces
+from backend.services.filters import (
+    GaussianPyramid,
+    blend_masked,
+    boost_saturation,
+    frequency_sigma,
+    unsharp_blend,
 )
+from backend.services.memory_stats import peak_rss_mb, reset_peak_rss
+from backend.services.pipeline import Pipeline, PipelineReport, Stage, StageAbort
+from backend.services.precision import get_precision, pack, unpack
+from backend.services.roi import Box, blur_margin, feather_paste
+from backend.services.scratch import SCRATCH
+from backend.services.strips import map_strips, run_strips, split_rows
 
+# Memory layout of a region run: the face masks, the low-frequency layers
+# and every local effect only cover analysis.mask_box (the face boxes), and
+# are blended into views of `result` with 2-D masks broadcast over the
+# channels. `result` is a float32 buffer leased from SCRATCH and updated in
+# place; only tone, saturation, detail and sharpening touch the whole region,
+# and those run strip by strip on the strip threads (see strips.py).
+# The masks and face-box layers are stored in ctx["precision"] (see
+# precision.py) and unpacked to float32 only for the blend that reads them.
 
-def beautify_image(
-    img_pil: Image.Image,
-    preset: str,
-    config_override: PresetConfig | None = None,
-) -> Image.Image:
+
+# =========================
+# Stages
+# =========================
+
+def _stage_analyze(ctx, config):
+    found = get_face_analyses(
+        ctx["img_pil"],
+        roi_mode=ctx["roi_mode"],
+        progress=ctx["progress"],
+        scale=ctx["scale"],
+        region=ctx["region"],
+        hint=ctx["face_hint"],
+        precision=ctx["precision"],
+    )
+    if not found:
+        print("Tidak ada wajah terdeteksi, mengembalikan gambar asli.")
+        raise StageAbort()
+
+    regions = []
+    for analysis, img_bgr in found:
+        x0, y0, x1, y1 = analysis.mask_box
+        edge_skin_mask = unpack(analysis.skin_mask) * unpack(analysis.edge_preserve_mask[y0:y1, x0:x1])
+        np.clip(edge_skin_mask, 0.0, 1.0, out=edge_skin_mask)
+        regions.append({
+            "analysis": analysis,
+            "img_bgr": img_bgr,
+            "edge_skin_mask": pack(edge_skin_mask, ctx["precision"].mask_dtype),
+            # Config-independent intermediates, reused by every config rendered
+            # from this analysis; run_beautify_batch turns this into a dict
+            "shared": None,
+        })
+    return {"regions": regions}
+
+
+def _shared(ctx, key, compute):
     """
-    Core retouch pipeline:
-    - Face detection and landmarks
-    - Skin and under-eye masking
-    - Frequency separation smoothing
-    - Preset-specific adjustments
+    compute() once per region and key when configs share this region (batch);
+    results are read-only because later configs reuse them.
     """
-    config = config_override or PRESET_CONFIGS.get(preset)
-    if config is None:
-        return img_pil
+    shared = ctx["shared"]
+    if shared is None:
+        return compute()
+    value = shared.get(key)
+    if value is None:
+        value = compute()
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        shared[key] = value
+    return value
 
-    img_bgr = pil_to_cv(img_pil)  # float32 [0,1], BGR
-    h, w = img_bgr.shape[:2]
 
-    landmarks, _ = detect_face_and_landmarks(img_bgr)
-    if landmarks is None:
-        print("Tidak ada wajah terdeteksi, mengembalikan gambar asli.")
-        return img_pil
+def _face(ctx):
+    """Slices of analysis.mask_box, the part of the region the face masks cover."""
+    x0, y0, x1, y1 = ctx["analysis"].mask_box
+    return np.s_[y0:y1, x0:x1]
+
+
+def _linear(ctx) -> bool:
+    """Whether this precision blends with cv2.blendLinear (fixed point)."""
+    return ctx["precision"].blend_linear
 
-    skin_mask = create_skin_mask(img_bgr, landmarks)
-    under_eye_mask = create_under_eye_mask(img_bgr, landmarks)
 
-    img_bgr_8u = (np.clip(img_bgr, 0.0, 1.0) * 255.0).astype(np.uint8)
+def _writable(ctx, arr: np.ndarray) -> np.ndarray:
+    """arr itself if this region's scratch lease owns it, else a leased copy."""
+    scratch = ctx["scratch"]
+    if scratch.owns(arr):
+        return arr
+    buf = scratch.take(arr.shape, arr.dtype)
+    np.copyto(buf, arr)
+    return buf
 
-    img_lab = cv2.cvtColor(img_bgr_8u, cv2.COLOR_BGR2LAB)
-    L, A, B = cv2.split(img_lab)
 
-    L = L.astype(np.float32)
-    A = A.astype(np.float32)
-    B = B.astype(np.float32)
+def _stage_retouch(ctx, config):
+    """Run RETOUCH_PIPELINE on every face region, in parallel on the face threads."""
+    def run(region):
+        with SCRATCH.lease() as scratch:
+            region_ctx = {
+                **region,
+                "frame_shape": ctx["frame_shape"],
+                "scale": ctx["scale"],
+                "precision": ctx["precision"],
+                "scratch": scratch,
+            }
+            report = RETOUCH_PIPELINE.run(region_ctx, config)
+            # To 8 bit before the lease ends, so the float buffers go back to the pool
+            result = region_ctx["result"]
+            out = result if scratch.owns(result) else scratch.take(result.shape)
+            tile = cv_to_pil(result, scratch=out)
+        return region_ctx["analysis"], tile, report
 
-    skin_mask_u8 = (skin_mask * 255).astype(np.uint8)
-    skin_pixels = L[skin_mask_u8 > 0]
-    mean_L = float(np.mean(skin_pixels)) if len(skin_pixels) > 0 else 128.0
+    done = map_faces(run, ctx["regions"])
+    # Regions run side by side, so the slowest one is what the request waited for
+    slowest = max((report for _, _, report in done), key=lambda report: report.total_ms)
+    return {"tiles": [(analysis, tile) for analysis, tile, _ in done], "retouch_report": slowest}
 
-    edge_preserve_mask = compute_edge_preserve_mask(img_bgr)
-    cheek_mask = create_cheek_highlight_mask(img_bgr.shape, landmarks)
-    wrinkle_mask = create_wrinkle_mask(img_bgr.shape, landmarks, under_eye_mask)
 
-    delta_L = np.clip(config.target_L - mean_L, 0, config.max_delta_L)
-    L = L + delta_L * (skin_mask)
-    L = np.clip(L, 0, 255)
+def _stage_tone(ctx, config):
+    """
+    Lift skin lightness in LAB. The LAB->BGR conversion runs in float,
+    without the old uint8 round trip, which moves the output by up to
+    about 0.8 of an 8-bit level (mean about 0.25). Without a lift the LAB
+    round trip is skipped altogether and the input is used as is.
+    """
+    analysis = ctx["analysis"]
+    delta_L = float(np.clip(config.target_L - analysis.mean_L, 0, config.max_delta_L))
+    # Configs that lift the skin by the same amount share the toned image
+    # and everything blurred from it
+    tone_key = round(delta_L, 3)
+    face = _face(ctx)
 
-    L_out = L.astype(np.uint8)
-    A_out = np.clip(A, 0, 255).astype(np.uint8)
-    B_out = np.clip(B, 0, 255).astype(np.uint8)
+    def compute(out=None):
+        if delta_L <= 0:
+            return bgr8_to_float(ctx["img_bgr"], out)
+        lab = np.empty(analysis.lab.shape, dtype=np.float32) if out is None else out
+        skin_mask = unpack(analysis.skin_mask)
+        fy0, fy1 = analysis.mask_box[1], analysis.mask_box[3]
 
-    assert L_out.shape == A_out.shape == B_out.shape, f"Shape LAB tidak sama: {L_out.shape}, {A_out.shape}, {B_out.shape}"
+        def strip(s):
+            # LAB float: L in [0, 100], a/b centred on 0. The cached split is uint8
+            # (0..255 scale), so rescale here instead of clamping back to uint8.
+            rows = lab[s.rows]
+            np.copyto(rows, analysis.lab[s.rows])
+            L = rows[:, :, 0]
+            y0, y1 = max(s.y0, fy0), min(s.y1, fy1)
+            if y0 < y1:
+                # the skin mask is zero outside the face boxes
+                face_L = L[y0 - s.y0:y1 - s.y0, face[1]]
+                face_L += delta_L * skin_mask[y0 - fy0:y1 - fy0]
+                np.clip(face_L, 0, 255, out=face_L)
+            L *= 100.0 / 255.0
+            rows[:, :, 1:] -= 128.0
+            cv2.cvtColor(rows, cv2.COLOR_LAB2BGR, dst=rows)
+            np.clip(rows, 0.0, 1.0, out=rows)
 
-    lab_merged = cv2.merge([L_out, A_out, B_out])
-    img_bgr_tone = cv2.cvtColor(lab_merged, cv2.COLOR_LAB2BGR).astype(np.float32) / 255.0
+        run_strips(strip, lab.shape[0])
+        return lab
 
-    sigma = max(int(max(h, w) * 0.01), 3)
-    lf = cv2.GaussianBlur(img_bgr_tone, (0, 0), sigmaX=sigma, sigmaY=sigma)
-    hf = img_bgr_tone - lf
+    layer_dtype = ctx["precision"].layer_dtype
+    if ctx["shared"] is None:
+        # Single config: the toned image becomes the result buffer and is
+        # edited in place, so the effects keep their own copy of its face box
+        tone = compute(ctx["scratch"].take(analysis.lab.shape))
+        tone_face = pack(tone[face], layer_dtype, copy=True)
+    else:
+        tone = _shared(ctx, ("tone", tone_key), compute)
+        tone_face = _shared(ctx, ("tone_face", tone_key), lambda: pack(tone[face], layer_dtype))
+    return {"tone": tone, "tone_face": tone_face, "result": tone, "tone_key": tone_key}
 
-    base = lf
-    orig = img_bgr_tone
-    smooth = base * config.smooth_strength + orig * (1.0 - config.smooth_strength)
 
-    edge_skin_mask = np.clip(skin_mask * edge_preserve_mask, 0.0, 1.0)
-    skin_mask_3c = np.dstack([skin_mask] * 3)
-    edge_skin_mask_3c = np.dstack([edge_skin_mask] * 3)
-    img_smooth_skin = orig * (1.0 - edge_skin_mask_3c) + smooth * edge_skin_mask_3c
+def _stage_frequency_split(ctx, config):
+    """Low-frequency layers of the toned image (face box only), from one shared blur pyramid."""
+    key = ctx["tone_key"]
+    face = _face(ctx)
+    sigma = frequency_sigma(ctx["frame_shape"])
+    pyramid = _shared(ctx, ("pyramid", key), lambda: GaussianPyramid(ctx["tone"]))
+    layer_dtype = ctx["precision"].layer_dtype
 
+    lf = lf_eye = None
+    if config.smooth_strength > 0 or config.detail_mix > 0:
+        lf = _shared(ctx, ("lf", key), lambda: pack(pyramid.blur(sigma)[face], layer_dtype, copy=True))
     if config.eye_smooth_strength > 0:
-        sigma_eye = sigma * 0.7
-        lf_eye = cv2.GaussianBlur(img_bgr_tone, (0, 0), sigmaX=sigma_eye, sigmaY=sigma_eye)
-        extra_smooth = lf_eye * config.eye_smooth_strength + img_bgr_tone * (1.0 - config.eye_smooth_strength)
+        lf_eye = _shared(ctx, ("lf_eye", key), lambda: pack(pyramid.blur(sigma * 0.7)[face], layer_dtype, copy=True))
+    return {"lf": lf, "lf_eye": lf_eye}
+
+
+def _stage_smooth(ctx, config):
+    strength = config.smooth_strength
+    orig = unpack(ctx["tone_face"])
+    smooth = unpack(ctx["lf"]) * strength
+    smooth += orig * (1.0 - strength)
+
+    result = _writable(ctx, ctx["result"])
+    blend_masked(
+        orig, smooth, ctx["edge_skin_mask"], out=result[_face(ctx)], layer_writable=True, linear=_linear(ctx)
+    )
+    return {"result": result}
+
+
+def _stage_eye_smooth(ctx, config):
+    strength = config.eye_smooth_strength
+    extra_smooth = unpack(ctx["lf_eye"]) * strength
+    extra_smooth += unpack(ctx["tone_face"]) * (1.0 - strength)
+
+    result = _writable(ctx, ctx["result"])
+    face = result[_face(ctx)]
+    blend_masked(
+        face, extra_smooth, ctx["analysis"].under_eye_mask, out=face, layer_writable=True, linear=_linear(ctx)
+    )
+    return {"result": result}
+
+
+def _stage_glow(ctx, config):
+    result = ctx["result"]
+    sigma_glow = frequency_sigma(ctx["frame_shape"]) * 0.8
+    glow_layer = GaussianPyramid(result).blur(sigma_glow)[_face(ctx)]
+
+    result = _writable(ctx, result)
+    face = result[_face(ctx)]
+    blend_masked(
+        face,
+        glow_layer,
+        ctx["analysis"].skin_mask,
+        config.glow_strength,
+        out=face,
+        layer_writable=True,
+        linear=_linear(ctx),
+    )
+    return {"result": result}
+
+
+def _stage_hydration(ctx, config):
+    result = _writable(ctx, ctx["result"])
+    face = result[_face(ctx)]
+    lifted = face + config.hydration_highlight * 0.4
+    np.clip(lifted, 0.0, 1.0, out=lifted)
+    blend_masked(
+        face,
+        lifted,
+        ctx["analysis"].cheek_mask,
+        config.hydration_highlight,
+        out=face,
+        layer_writable=True,
+        linear=_linear(ctx),
+    )
+    return {"result": result}
+
+
+def _stage_wrinkle(ctx, config):
+    result = ctx["result"]
+    x0, y0, x1, y1 = ctx["analysis"].mask_box
+    # Diameter and spatial sigma are full-res pixels; shrink them on a proxy
+    scale = ctx["scale"]
+    d = max(3, int(round(9 * scale)) | 1)
+    if x1 <= x0 or y1 <= y0:
+        return {"result": result}
+
+    # Filter the face box plus the filter's reach, not the whole region,
+    # strip by strip with halos of the filter radius
+    h, w = result.shape[:2]
+    px0, px1 = max(0, x0 - d), min(w, x1 + d)
+    wrinkle_blur = np.empty((y1 - y0, x1 - x0, 3), dtype=np.float32)
+
+    def strip(s):
+        src = (result[s.padded, px0:px1] * 255).astype(np.uint8)
+        filtered = cv2.bilateralFilter(src, d, 30, max(9 * scale, 1.0))
+        rows = wrinkle_blur[s.y0 - y0:s.y1 - y0]
+        np.copyto(rows, filtered[s.inner, x0 - px0:x1 - px0])
+        rows /= 255.0
+
+    map_strips(strip, split_rows(y0, y1, halo=d // 2, limit=(0, h)))
+
+    result = _writable(ctx, result)
+    face = result[y0:y1, x0:x1]
+    blend_masked(
+        face,
+        wrinkle_blur,
+        ctx["analysis"].wrinkle_mask,
+        config.wrinkle_soften,
+        out=face,
+        layer_writable=True,
+        linear=_linear(ctx),
+    )
+    return {"result": result}
 
-        under_eye_3c = np.dstack([under_eye_mask] * 3)
-        img_smooth_skin = img_smooth_skin * (1.0 - under_eye_3c) + extra_smooth * under_eye_3c
 
-    result = img_smooth_skin
+def _stage_saturation(ctx, config):
+    result = _writable(ctx, ctx["result"])
+    return {"result": boost_saturation(result, config.saturation_boost, out=result)}
 
-    if config.glow_strength > 0:
-        blur_glow = cv2.GaussianBlur(result, (0, 0), sigmaX=sigma * 0.8, sigmaY=sigma * 0.8)
-        glow_layer = blur_glow
-        result = result * (1.0 - config.glow_strength * skin_mask_3c) + glow_layer * (config.glow_strength * skin_mask_3c)
 
-    if config.hydration_highlight > 0:
-        cheek_3c = np.dstack([cheek_mask] * 3)
-        lifted = np.clip(result + config.hydration_highlight * 0.4, 0.0, 1.0)
-        result = result * (1.0 - config.hydration_highlight * cheek_3c) + lifted * (config.hydration_highlight * cheek_3c)
+def _stage_detail(ctx, config):
+    result = _writable(ctx, ctx["result"])
+    x0, fy0, x1, fy1 = ctx["analysis"].mask_box
+    tone_face, lf, edge_skin_mask = ctx["tone_face"], ctx["lf"], ctx["edge_skin_mask"]
 
-    if config.wrinkle_soften > 0:
-        wrinkle_3c = np.dstack([wrinkle_mask] * 3)
-        wrinkle_blur = cv2.bilateralFilter((result * 255).astype(np.uint8), 9, 30, 9)
-        wrinkle_blur = wrinkle_blur.astype(np.float32) / 255.0
-        result = result * (1.0 - config.wrinkle_soften * wrinkle_3c) + wrinkle_blur * (config.wrinkle_soften * wrinkle_3c)
+    def strip(s):
+        rows = result[s.rows]
+        y0, y1 = max(s.y0, fy0), min(s.y1, fy1)
+        if y0 < y1:
+            face = np.s_[y0 - fy0:y1 - fy0]
+            hf = np.subtract(unpack(tone_face[face]), unpack(lf[face]))
+            hf *= config.detail_mix
+            hf *= unpack(edge_skin_mask[face])[:, :, None]
+            rows[y0 - s.y0:y1 - s.y0, x0:x1] += hf
+        np.clip(rows, 0.0, 1.0, out=rows)
 
-    if abs(config.saturation_boost - 1.0) > 1e-3:
-        result = boost_saturation(result, config.saturation_boost)
+    run_strips(strip, result.shape[0])
+    return {"result": result}
 
-    if config.detail_mix > 0:
-        detail_mask = np.dstack([edge_preserve_mask * skin_mask] * 3)
-        result = np.clip(result + hf * config.detail_mix * detail_mask, 0.0, 1.0)
 
-    if config.edge_enhance_mix > 0 and config.unsharp_amount > 0:
-        sharp = apply_unsharp_mask(result, amount=config.unsharp_amount, radius=config.unsharp_radius)
-        edge_mask_3c = np.dstack([edge_preserve_mask] * 3)
-        result = result * (1.0 - config.edge_enhance_mix * edge_mask_3c) + sharp * (config.edge_enhance_mix * edge_mask_3c)
+def _stage_sharpen(ctx, config):
+    result = ctx["result"]
+    scratch = ctx["scratch"]
+    scale = ctx["scale"]
+    radius = max(config.unsharp_radius * scale, 0.5) if scale < 1.0 else config.unsharp_radius
+    # Blur, sharpen and blend per strip: the sharpened image never exists
+    # at full size. Strips read their neighbours' rows as halo, so the
+    # blend goes to a second buffer instead of in place.
+    sharpened = unsharp_blend(
+        result,
+        ctx["analysis"].edge_preserve_mask,
+        config.unsharp_amount,
+        radius,
+        config.edge_enhance_mix,
+        out=scratch.take(result.shape),
+        linear=_linear(ctx),
+    )
+    if scratch.owns(result):
+        scratch.release(result)
+    return {"result": sharpened}
+
+
+def _stage_finish(ctx, config):
+    tiles = [(analysis.roi, tile) for analysis, tile in ctx["tiles"]]
+    img_pil = ctx["img_pil"]
+    region = ctx["region"]
+    if region is not None:
+        # Full-res tile: drop the blur context around the requested box
+        (x0, y0, _, _), tile = tiles[0]
+        return {"output": tile.crop((region[0] - x0, region[1] - y0, region[2] - x0, region[3] - y0))}
+    if len(tiles) == 1 and tiles[0][0] == (0, 0, img_pil.width, img_pil.height):
+        return {"output": tiles[0][1]}
+
+    # ROI mode: fade each retouched face region into one copy of the
+    # original (regions never overlap, see get_face_analyses)
+    out = img_pil.copy()
+    margin = blur_margin(ctx["frame_shape"], ctx["scale"])
+    for roi, tile in tiles:
+        feather_paste(out, tile, roi, margin, copy=False)
+    return {"output": out}
+
+
+# Per face region: everything between analysis and the final paste
+RETOUCH_PIPELINE = Pipeline(
+    [
+        # tone
+        Stage(
+            "tone",
+            _stage_tone,
+            ("img_bgr", "analysis", "shared", "precision", "scratch"),
+            ("tone", "tone_face", "result", "tone_key"),
+        ),
+        # frequency split
+        Stage(
+            "frequency_split",
+            _stage_frequency_split,
+            ("tone", "tone_key", "analysis", "frame_shape", "precision", "shared"),
+            ("lf", "lf_eye"),
+            enabled=lambda c: c.smooth_strength > 0 or c.eye_smooth_strength > 0 or c.detail_mix > 0,
+        ),
+        # local effects
+        Stage(
+            "smooth",
+            _stage_smooth,
+            ("tone_face", "lf", "edge_skin_mask", "result", "precision", "scratch"),
+            ("result",),
+            enabled=lambda c: c.smooth_strength > 0,
+        ),
+        Stage(
+            "eye_smooth",
+            _stage_eye_smooth,
+            ("tone_face", "lf_eye", "analysis", "result", "precision", "scratch"),
+            ("result",),
+            enabled=lambda c: c.eye_smooth_strength > 0,
+        ),
+        Stage(
+            "glow",
+            _stage_glow,
+            ("analysis", "result", "frame_shape", "precision", "scratch"),
+            ("result",),
+            enabled=lambda c: c.glow_strength > 0,
+        ),
+        Stage(
+            "hydration",
+            _stage_hydration,
+            ("analysis", "result", "precision", "scratch"),
+            ("result",),
+            enabled=lambda c: c.hydration_highlight > 0,
+        ),
+        Stage(
+            "wrinkle",
+            _stage_wrinkle,
+            ("analysis", "result", "scale", "precision", "scratch"),
+            ("result",),
+            enabled=lambda c: c.wrinkle_soften > 0,
+        ),
+        # finish
+        Stage(
+            "saturation",
+            _stage_saturation,
+            ("result", "scratch"),
+            ("result",),
+            enabled=lambda c: abs(c.saturation_boost - 1.0) > 1e-3,
+        ),
+        Stage(
+            "detail",
+            _stage_detail,
+            ("tone_face", "lf", "edge_skin_mask", "result", "scratch"),
+            ("result",),
+            enabled=lambda c: c.detail_mix > 0,
+        ),
+        Stage(
+            "sharpen",
+            _stage_sharpen,
+            ("analysis", "result", "scale", "precision", "scratch"),
+            ("result",),
+            enabled=lambda c: c.edge_enhance_mix > 0 and c.unsharp_amount > 0,
+        ),
+    ],
+    initial=("img_bgr", "analysis", "edge_skin_mask", "shared", "scratch", "frame_shape", "scale", "precision"),
+)
+
+
+_INITIAL = ("img_pil", "frame_shape", "roi_mode", "progress", "scale", "region", "face_hint", "precision")
+
+_ANALYZE = Stage(
+    "analyze",
+    _stage_analyze,
+    ("img_pil", "roi_mode", "progress", "scale", "region", "face_hint", "precision"),
+    ("regions",),
+)
+_RENDER = [
+    Stage(
+        "retouch",
+        _stage_retouch,
+        ("regions", "frame_shape", "scale", "precision"),
+        ("tiles", "retouch_report"),
+    ),
+    Stage(
+        "finish",
+        _stage_finish,
+        ("img_pil", "tiles", "frame_shape", "scale", "region"),
+        ("output",),
+    ),
+]
+
+BEAUTY_PIPELINE = Pipeline([_ANALYZE, *_RENDER], initial=_INITIAL)
+
+# Batch: the config-independent analysis once, then the render stages per config
+ANALYZE_PIPELINE = Pipeline([_ANALYZE], initial=_INITIAL)
+RENDER_PIPELINE = Pipeline(_RENDER, initial=(*_INITIAL, "regions"))
+
+
+def run_beautify(
+    img_pil: Image.Image,
+    config: PresetConfig,
+    roi_mode: bool | None = None,
+    progress: Callable[[str], None] | None = None,
+    scale: float = 1.0,
+    region: Box | None = None,
+    face_hint=None,
+    precision: str | None = None,
+) -> tuple[Image.Image, PipelineReport]:
+    """
+    Run the staged pipeline and return (output image, timing report).
+    With roi_mode, only the padded face boxes are processed and feathered
+    back into the original; None falls back to BEAUTY_ROI_MODE.
+    `scale` < 1 marks img_pil as a downscaled preview proxy of the real
+    photo, so fixed-pixel kernels shrink to match. With `region`, only that
+    box is rendered and returned (full-res zoom tile). `face_hint` is a
+    relative face box from liveview tracking, searched first. `precision`
+    names the mask/layer storage mode (None: BEAUTY_PRECISION).
+    `progress` receives the coarse job stages "detect", "mask", "smooth".
+    The report carries the process peak RSS of the run.
+    """
+    reset_peak_rss()
+    progress = progress or (lambda stage: None)
+    ctx = {
+        "img_pil": img_pil,
+        "frame_shape": (img_pil.height, img_pil.width),
+        "roi_mode": BEAUTY_ROI_MODE if roi_mode is None else roi_mode,
+        "progress": progress,
+        "scale": scale,
+        "region": region,
+        "face_hint": face_hint,
+        "precision": get_precision(precision),
+    }
+
+    def on_stage(name: str) -> None:
+        if name == "retouch":
+            progress("smooth")
+
+    report = BEAUTY_PIPELINE.run(ctx, config, on_stage=on_stage)
+    if "retouch_report" in ctx:
+        report.nested["retouch"] = ctx["retouch_report"]
+    report.peak_rss_mb = peak_rss_mb()
+    if report.aborted_at is not None:
+        return (img_pil if region is None else img_pil.crop(region)), report
+    return ctx["output"], report
+
+
+def run_beautify_batch(
+    img_pil: Image.Image,
+    configs: list[PresetConfig],
+    roi_mode: bool | None = None,
+    progress: Callable[[str], None] | None = None,
+    face_hint=None,
+    precision: str | None = None,
+) -> tuple[list[Image.Image], PipelineReport, list[PipelineReport]]:
+    """
+    Render several configs of one image. Detection, masks, LAB and edges
+    run once (ANALYZE_PIPELINE); the toned image, its pyramid and the
+    frequency-split blurs are shared between configs with the same skin
+    lift; only the blending and the paste run per config.
+    Returns (outputs in config order, analysis report, per-config reports);
+    each report's peak RSS is the peak of the batch so far.
+    """
+    reset_peak_rss()
+    progress = progress or (lambda stage: None)
+    ctx = {
+        "img_pil": img_pil,
+        "frame_shape": (img_pil.height, img_pil.width),
+        "roi_mode": BEAUTY_ROI_MODE if roi_mode is None else roi_mode,
+        "progress": progress,
+        "scale": 1.0,
+        "region": None,
+        "face_hint": face_hint,
+        "precision": get_precision(precision),
+    }
+    analyze_report = ANALYZE_PIPELINE.run(ctx, configs[0])
+    analyze_report.peak_rss_mb = peak_rss_mb()
+    if analyze_report.aborted_at is not None:
+        return [img_pil] * len(configs), analyze_report, [PipelineReport() for _ in configs]
+    for region in ctx["regions"]:
+        region["shared"] = {}
+
+    progress("smooth")
+    outputs, reports = [], []
+    for config in configs:
+        run_ctx = dict(ctx)  # regions (and their shared intermediates) are reused
+        report = RENDER_PIPELINE.run(run_ctx, config)
+        report.nested["retouch"] = run_ctx["retouch_report"]
+        report.peak_rss_mb = peak_rss_mb()
+        outputs.append(run_ctx["output"])
+        reports.append(report)
+    return outputs, analyze_report, reports
+
+
+def beautify_image(
+    img_pil: Image.Image,
+    preset: str,
+    config_override: PresetConfig | None = None,
+    roi_mode: bool | None = None,
+    progress: Callable[[str], None] | None = None,
+    scale: float = 1.0,
+    region: Box | None = None,
+    face_hint=None,
+    precision: str | None = None,
+) -> Image.Image:
+    """
+    Core retouch pipeline (see BEAUTY_PIPELINE and RETOUCH_PIPELINE):
+    - analyze: detection of every face, landmarks and masks (cached per image)
+    then per face region, regions in parallel:
+    - tone: lift skin lightness in LAB
+    - frequency split: shared blur pyramid of the toned image
+    - local effects: smoothing, under-eye, glow, hydration, wrinkles
+    - finish: saturation, detail restore, edge sharpening
+    and finally the regions are pasted back into the photo.
+    Stages whose preset values are zero are skipped. roi_mode restricts
+    the work to the padded face boxes (default: BEAUTY_ROI_MODE); `scale`
+    and `region` are for previews, `face_hint` for liveview tracking,
+    `precision` for the mask/layer storage mode (see run_beautify).
+    """
+    config = config_override or PRESET_CONFIGS.get(preset)
+    if config is None:
+        return img_pil
 
-    result = np.clip(result, 0.0, 1.0)
-    return cv_to_pil(result)
+    out_img, report = run_beautify(
+        img_pil,
+        config,
+        roi_mode=roi_mode,
+        progress=progress,
+        scale=scale,
+        region=region,
+        face_hint=face_hint,
+        precision=precision,
+    )
+    if PIPELINE_TIMING_LOG:
+        size = f"{img_pil.width}x{img_pil.height}" + (f"@{scale:.2f}" if scale != 1.0 else "")
+        if region is not None:
+            size += f" tile={region}"
+        print(f"[PIPELINE] {preset} {size} {report.summary()}")
+    return out_img
 
 
-__all__ = ["beautify_image"]
+__all__ = [
+    "beautify_image",
+    "run_beautify",
+    "run_beautify_batch",
+    "ANALYZE_PIPELINE",
+    "BEAUTY_PIPELINE",
+    "RENDER_PIPELINE",
+    "RETOUCH_PIPELINE",
+]
@@ -0,0 +1,182 @@
+# Job functions executed inside the beauty worker pool. They only take and
+# return picklable values, so they run the same in a worker process or on
+# the in-process thread fallback.
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from backend.config import (
+    AFTER_DIR,
+    BEAUTY_ROI_MODE,
+    CONTACT_SHEET_CELL,
+    PIPELINE_TIMING_LOG,
+    PREVIEW_LONG_EDGE,
+    PREVIEW_TILE_MAX,
+)
+from backend.models.presets import PresetConfig
+from backend.services import job_progress
+from backend.services.analysis_cache import get_face_analyses
+from backend.services.beautify import beautify_image, run_beautify_batch
+from backend.services.compositor import contact_sheet
+from backend.services.encoder import ENCODED_FILES, PREVIEW, SHARE, encode_jpeg
+from backend.services.face_tracker import RelBox
+from backend.services.image_cache import DECODED_IMAGES, load_rgb
+from backend.services.after_store import AFTER_STORE
+
+# A job source is either the uploaded file bytes or the path of a file the
+# server already has (e.g. a capture in CAPTURED_DIR).
+Source = bytes | str
+
+
+def _load_source(source: Source) -> Image.Image:
+    if isinstance(source, str):
+        return load_rgb(source)
+    return Image.open(io.BytesIO(source)).convert("RGB")
+
+
+def beauty_job(
+    source: Source,
+    preset: str,
+    config: PresetConfig,
+    save_after: bool = True,
+    job_id: str | None = None,
+    face_hint: RelBox | None = None,
+) -> dict:
+    """
+    Decode (or take from the decoded-image cache), retouch and encode one image.
+    Returns {"jpeg": bytes, "after_filename": str | None}. With a job_id,
+    stage progress is published through job_progress. `face_hint` is the
+    liveview face box recorded for a capture.
+    """
+    def progress(stage: str) -> None:
+        job_progress.report(job_id, stage)
+
+    img = _load_source(source)
+    out_img = beautify_image(img, preset, config_override=config, progress=progress, face_hint=face_hint)
+
+    progress("encode")
+    after_filename = None
+    if save_after:
+        # Simpan hasil filter ke folder after (lossless, format AFTER_FORMAT);
+        # file ditulis di background, nama file langsung dikembalikan
+        after_filename = AFTER_STORE.save(out_img, prefix="after")
+
+    # Satu encode baseline cepat untuk layar; file after tetap lossless
+    return {"jpeg": encode_jpeg(out_img, PREVIEW), "after_filename": after_filename}
+
+
+def batch_job(
+    source: Source,
+    variants: list[tuple[str, PresetConfig]],
+    save_after: bool = True,
+    face_hint: RelBox | None = None,
+) -> dict:
+    """
+    Render every (name, config) variant of one image in a single pass (see
+    run_beautify_batch) and save a preview JPEG per variant plus a contact
+    sheet of the original and all variants to AFTER_DIR.
+    Returns {"variants": [{"name", "filename", "after_filename"}],
+    "contact_sheet": filename, "source_size", "timing"}.
+    """
+    img = _load_source(source)
+    outputs, analyze_report, reports = run_beautify_batch(
+        img, [config for _, config in variants], face_hint=face_hint
+    )
+
+    results = []
+    for (name, _), out_img in zip(variants, outputs):
+        results.append({
+            "name": name,
+            "filename": ENCODED_FILES.save(encode_jpeg(out_img, PREVIEW), AFTER_DIR, prefix="batch"),
+            "after_filename": AFTER_STORE.save(out_img, prefix="after") if save_after else None,
+        })
+
+    sheet = contact_sheet(
+        [("original", img)] + [(name, out_img) for (name, _), out_img in zip(variants, outputs)],
+        cell_long_edge=CONTACT_SHEET_CELL,
+    )
+    sheet_filename = ENCODED_FILES.save(encode_jpeg(sheet, SHARE), AFTER_DIR, prefix="sheet")
+
+    if PIPELINE_TIMING_LOG:
+        print(
+            f"[PIPELINE] batch x{len(variants)} {img.width}x{img.height} analyze {analyze_report.summary()}; "
+            + "; ".join(f"{name} {report.summary()}" for (name, _), report in zip(variants, reports))
+        )
+    return {
+        "variants": results,
+        "contact_sheet": sheet_filename,
+        "source_size": img.size,
+        "timing": {
+            "analyze": analyze_report.as_dict(),
+            "variants": {name: report.as_dict() for (name, _), report in zip(variants, reports)},
+        },
+    }
+
+
+def _load_proxy(source: Source, max_side: int) -> tuple[Image.Image, tuple[int, int]]:
+    """
+    Return (proxy, full size). The full frame is never decoded for JPEGs,
+    and proxies are cached so repeated previews of one photo skip decoding.
+    """
+    if isinstance(source, str):
+        with Image.open(source) as src:
+            full_size = src.size
+        return DECODED_IMAGES.load(Path(source), "RGB", max_side), full_size
+    with Image.open(io.BytesIO(source)) as src:
+        full_size = src.size  # header only
+    return DECODED_IMAGES.load_bytes(source, "RGB", max_side), full_size
+
+
+def _tile_box(tile: tuple[float, float, float, float], size: tuple[int, int]) -> tuple[int, int, int, int]:
+    """Relative (x, y, w, h) to a full-res pixel box, at most PREVIEW_TILE_MAX per side."""
+    W, H = size
+    x, y, w, h = tile
+    x0 = min(max(int(x * W), 0), W - 1)
+    y0 = min(max(int(y * H), 0), H - 1)
+    x1 = min(W, x0 + max(1, min(int(round(w * W)), PREVIEW_TILE_MAX)))
+    y1 = min(H, y0 + max(1, min(int(round(h * H)), PREVIEW_TILE_MAX)))
+    return x0, y0, x1, y1
+
+
+def preview_job(
+    source: Source,
+    preset: str,
+    config: PresetConfig,
+    tile: tuple[float, float, float, float] | None = None,
+    face_hint: RelBox | None = None,
+) -> dict:
+    """
+    Fast preview for the tuning UI. Without `tile`, retouch a proxy whose
+    long edge is PREVIEW_LONG_EDGE (kernels scaled to match the full
+    render). With `tile` (relative x, y, w, h), retouch only that box of
+    the full-resolution image for zoomed inspection.
+    Returns {"jpeg", "scale", "source_size", "region"}.
+    """
+    if tile is None:
+        img, full_size = _load_proxy(source, PREVIEW_LONG_EDGE)
+        scale = img.width / full_size[0]
+        out_img = beautify_image(
+            img, preset, config_override=config, roi_mode=False, scale=scale, face_hint=face_hint
+        )
+        region = None
+    else:
+        img = _load_source(source)
+        full_size, scale = img.size, 1.0
+        region = _tile_box(tile, img.size)
+        out_img = beautify_image(img, preset, config_override=config, region=region, face_hint=face_hint)
+
+    return {"jpeg": encode_jpeg(out_img, PREVIEW), "scale": scale, "source_size": full_size, "region": region}
+
+
+def warm_job(path: str, face_hint: RelBox | None = None) -> None:
+    """
+    Decode a capture into this worker's decoded-image cache and run face
+    analysis on it (hint first), so the beauty request that follows finds
+    both cached.
+    """
+    img = load_rgb(path)
+    get_face_analyses(img, roi_mode=BEAUTY_ROI_MODE, hint=face_hint)
+
+
+__all__ = ["batch_job", "beauty_job", "preview_job", "warm_job"]
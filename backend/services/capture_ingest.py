@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image
+
+from backend.config import (
+    CAPTURED_DIR,
+    CAPTURE_PREVIEW_LONG_EDGE,
+    CAPTURE_THUMB_LONG_EDGE,
+    CAPTURE_WORK_LONG_EDGE,
+)
+from backend.services.encoder import PREVIEW, WORK, encode_jpeg
+from backend.services.face_tracker import RelBox
+from backend.services.image_cache import DECODED_IMAGES, decode_image, downscale
+
+RENDITION_DIR = "renditions"
+
+EXIF_ORIENTATION = 0x0112
+
+# EXIF orientation -> transpose that makes the image upright
+_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+@dataclass
+class CaptureRecord:
+    filename: str  # original in CAPTURED_DIR
+    source_size: tuple[int, int]  # as stored, before orientation
+    orientation: int
+    size: tuple[int, int]  # working copy, upright
+    work: str  # paths relative to CAPTURED_DIR
+    preview: str
+    thumbnail: str
+    face_hint: Optional[RelBox] = None  # liveview hint in working-copy coordinates
+    ingest_ms: float = 0.0
+
+    def path(self, rendition: str) -> Path:
+        """rendition: "work", "preview" or "thumbnail"."""
+        return CAPTURED_DIR / getattr(self, rendition)
+
+
+def orient_point(u: float, v: float, orientation: int) -> tuple[float, float]:
+    """Relative point in the stored image -> the same point after the EXIF transpose."""
+    return {
+        2: (1 - u, v),
+        3: (1 - u, 1 - v),
+        4: (u, 1 - v),
+        5: (v, u),
+        6: (1 - v, u),
+        7: (1 - v, 1 - u),
+        8: (v, 1 - u),
+    }.get(orientation, (u, v))
+
+
+def orient_box(box: Optional[RelBox], orientation: int) -> Optional[RelBox]:
+    """Map a relative (x0, y0, x1, y1) box (e.g. the liveview face hint) through the EXIF transpose."""
+    if box is None or orientation not in _TRANSPOSE:
+        return box
+    x0, y0, x1, y1 = box
+    u0, v0 = orient_point(x0, y0, orientation)
+    u1, v1 = orient_point(x1, y1, orientation)
+    return min(u0, u1), min(v0, v1), max(u0, u1), max(v0, v1)
+
+
+def _write_jpeg(img: Image.Image, path: Path, profile) -> None:
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_bytes(encode_jpeg(img, profile))
+    os.replace(tmp, path)
+
+
+def ingest_capture(path: Path, face_hint: Optional[RelBox] = None) -> CaptureRecord:
+    """
+    Decode a fresh capture once and write its renditions next to it:
+    an upright working copy (long edge CAPTURE_WORK_LONG_EDGE), a screen
+    preview and a thumbnail. JPEGs are decoded with draft() straight at
+    the working size. The working copy is also put in the decoded-image
+    cache so the first consumer in this process skips decoding.
+    """
+    started = time.perf_counter()
+    path = Path(path)
+    base = path.parent
+    (base / RENDITION_DIR).mkdir(parents=True, exist_ok=True)
+    stem = path.stem
+
+    with Image.open(path) as src:
+        source_size = src.size
+        orientation = src.getexif().get(EXIF_ORIENTATION, 1)
+        img = decode_image(src, "RGB", CAPTURE_WORK_LONG_EDGE or None)
+    if orientation in _TRANSPOSE:
+        img = img.transpose(_TRANSPOSE[orientation])
+
+    if img.size == source_size and orientation not in _TRANSPOSE and path.suffix.lower() in (".jpg", ".jpeg"):
+        # Already upright and small enough: the original is the working copy (no re-encode)
+        work = path.name
+    else:
+        work = f"{RENDITION_DIR}/{stem}_work.jpg"
+        _write_jpeg(img, base / work, WORK)
+    DECODED_IMAGES.remember(base / work, img, "RGB")
+
+    preview_img = downscale(img, CAPTURE_PREVIEW_LONG_EDGE)
+    preview = f"{RENDITION_DIR}/{stem}_preview.jpg"
+    _write_jpeg(preview_img, base / preview, PREVIEW)
+
+    thumbnail = f"{RENDITION_DIR}/{stem}_thumb.jpg"
+    _write_jpeg(downscale(preview_img, CAPTURE_THUMB_LONG_EDGE), base / thumbnail, PREVIEW)
+
+    return CaptureRecord(
+        filename=path.name,
+        source_size=source_size,
+        orientation=orientation,
+        size=img.size,
+        work=work,
+        preview=preview,
+        thumbnail=thumbnail,
+        face_hint=orient_box(face_hint, orientation),
+        ingest_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+
+class CaptureIndex:
+    """
+    Capture file name -> CaptureRecord. Each record is also written as
+    renditions/<filename>.json, so other processes and later runs find
+    the renditions without re-ingesting.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._records: Dict[str, CaptureRecord] = {}
+        self._lock = threading.Lock()
+
+    def _sidecar(self, filename: str) -> Path:
+        return self.directory / RENDITION_DIR / f"{filename}.json"
+
+    def add(self, record: CaptureRecord) -> None:
+        sidecar = self._sidecar(record.filename)
+        tmp = sidecar.with_name(sidecar.name + ".part")
+        tmp.write_text(json.dumps(asdict(record)), encoding="utf-8")
+        os.replace(tmp, sidecar)
+        with self._lock:
+            self._records[record.filename] = record
+
+    def get(self, filename: str) -> Optional[CaptureRecord]:
+        with self._lock:
+            record = self._records.get(filename)
+        if record is not None:
+            return record
+        try:
+            data = json.loads(self._sidecar(filename).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        data["source_size"] = tuple(data["source_size"])
+        data["size"] = tuple(data["size"])
+        if data.get("face_hint") is not None:
+            data["face_hint"] = tuple(data["face_hint"])
+        record = CaptureRecord(**data)
+        if not record.path("work").is_file():
+            return None
+        with self._lock:
+            self._records[filename] = record
+        return record
+
+    def ingest(self, path: Path, face_hint: Optional[RelBox] = None) -> Optional[CaptureRecord]:
+        """Ingest and register a capture. Failures are logged; consumers then use the original."""
+        try:
+            record = ingest_capture(path, face_hint)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[INGEST] Gagal membuat rendition {Path(path).name}: {exc}")
+            return None
+        self.add(record)
+        print(
+            f"[INGEST] {record.filename}: {record.source_size[0]}x{record.source_size[1]} -> "
+            f"{record.size[0]}x{record.size[1]} (orientasi {record.orientation}) dalam {record.ingest_ms:.0f} ms"
+        )
+        return record
+
+
+CAPTURE_INDEX = CaptureIndex(CAPTURED_DIR)
+
+
+__all__ = [
+    "CaptureIndex",
+    "CaptureRecord",
+    "CAPTURE_INDEX",
+    "ingest_capture",
+    "orient_box",
+]
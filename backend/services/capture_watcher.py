@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from backend.config import CAPTURE_STABLE_MS, DIGICAM_ORIGINAL_DIR
+
+# Files digiCamControl (or Windows) writes while a transfer is in progress
+TEMP_SUFFIXES = (".tmp", ".part", ".crdownload")
+
+
+class CaptureWaiter:
+    """One pending capture: set once a new, fully written file shows up."""
+
+    def __init__(self, since: float):
+        self.since = since
+        self.path: Optional[Path] = None
+        self._done = threading.Event()
+
+    def resolve(self, path: Path) -> None:
+        self.path = path
+        self._done.set()
+
+    def wait(self, timeout: float) -> Optional[Path]:
+        self._done.wait(timeout)
+        return self.path
+
+
+class _Handler(FileSystemEventHandler):
+    def __init__(self, watcher: "CaptureWatcher"):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path)
+
+    def on_moved(self, event):
+        # digiCamControl may write "x.tmp" and rename it to "x.jpg"
+        if not event.is_directory:
+            self.watcher.notice(event.dest_path)
+
+
+class CaptureWatcher:
+    """
+    Watches the digiCamControl folder and hands each new photo to the
+    capture request waiting for it. A file only counts once its size has
+    stayed the same for `stable_ms`, so a half-written JPEG is never
+    picked up. Only files that appear while a request is waiting are
+    checked; the rest of the folder is never listed.
+    """
+
+    def __init__(self, directory: Path, stable_ms: int):
+        self.directory = Path(directory)
+        self.stable = stable_ms / 1000.0
+        self._observer: Optional[Observer] = None
+        self._cond = threading.Condition()
+        self._waiters: List[CaptureWaiter] = []
+        self._pending: Dict[str, float] = {}  # path -> first seen
+        self._checker: Optional[threading.Thread] = None
+
+    # ---------- lifecycle ----------
+
+    @property
+    def running(self) -> bool:
+        return self._observer is not None
+
+    def start(self) -> bool:
+        """Start watching. Returns False (callers fall back to polling) if the folder is missing."""
+        with self._cond:
+            if self._observer is not None:
+                return True
+            if not self.directory.is_dir():
+                print(f"[CAPTURE] Folder digiCamControl tidak ada, watcher tidak aktif: {self.directory}")
+                return False
+            observer = Observer()
+            observer.schedule(_Handler(self), str(self.directory), recursive=False)
+            observer.start()
+            self._observer = observer
+            self._checker = threading.Thread(target=self._check_loop, daemon=True, name="capture-stable")
+            self._checker.start()
+        print(f"[CAPTURE] Memantau file jepretan di: {self.directory}")
+        return True
+
+    def stop(self) -> None:
+        with self._cond:
+            observer, self._observer = self._observer, None
+            self._cond.notify_all()
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+    # ---------- events ----------
+
+    def expect(self) -> CaptureWaiter:
+        """Register interest in the next new file. Call before triggering the camera."""
+        waiter = CaptureWaiter(time.time())
+        with self._cond:
+            self._waiters.append(waiter)
+        return waiter
+
+    def cancel(self, waiter: CaptureWaiter) -> None:
+        with self._cond:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def notice(self, path: str) -> None:
+        name = os.path.basename(path)
+        if name.startswith(".") or name.lower().endswith(TEMP_SUFFIXES):
+            return
+        with self._cond:
+            if not self._waiters:
+                return  # nobody is capturing; ignore unrelated writes
+            self._pending.setdefault(path, time.monotonic())
+            self._cond.notify_all()
+
+    def _check_loop(self) -> None:
+        sizes: Dict[str, tuple[int, float]] = {}  # path -> (size, since)
+        while True:
+            with self._cond:
+                while self._observer is not None and not self._pending:
+                    self._cond.wait()
+                if self._observer is None:
+                    return
+                paths = list(self._pending)
+
+            now = time.monotonic()
+            for path in paths:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    self._drop(path, sizes)  # renamed away or deleted
+                    continue
+                size, since = sizes.get(path, (-1, now))
+                if st.st_size != size or st.st_size == 0:
+                    sizes[path] = (st.st_size, now)
+                elif now - since >= self.stable:
+                    self._drop(path, sizes)
+                    self._resolve(Path(path), st.st_mtime)
+            time.sleep(min(0.02, self.stable / 2))
+
+    def _drop(self, path: str, sizes: dict) -> None:
+        sizes.pop(path, None)
+        with self._cond:
+            self._pending.pop(path, None)
+
+    def _resolve(self, path: Path, mtime: float) -> None:
+        with self._cond:
+            # The oldest waiter that started before this file was written gets it
+            for waiter in self._waiters:
+                if mtime >= waiter.since - 2.0:  # FAT/exFAT mtime has 2 s resolution
+                    self._waiters.remove(waiter)
+                    waiter.resolve(path)
+                    return
+
+
+CAPTURE_WATCHER = CaptureWatcher(DIGICAM_ORIGINAL_DIR, CAPTURE_STABLE_MS)
+
+
+__all__ = ["CaptureWaiter", "CaptureWatcher", "CAPTURE_WATCHER"]
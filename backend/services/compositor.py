@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Iterable, Literal
+
+from PIL import Image, ImageDraw, ImageFont
+
+Box = tuple[int, int, int, int]  # x, y, w, h in canvas pixels
+
+
+@dataclass(frozen=True)
+class Rel:
+    """Rectangle relative to the canvas (0..1)."""
+
+    x: float
+    y: float
+    w: float
+    h: float
+
+    def box(self, canvas_size: tuple[int, int]) -> Box:
+        cw, ch = canvas_size
+        return int(self.x * cw), int(self.y * ch), max(1, int(self.w * cw)), max(1, int(self.h * ch))
+
+
+@dataclass
+class Layer:
+    """
+    One thing to draw. "cover" fills the box with the image (scaled to
+    cover, centre-cropped); "overlay" is an image already sized to the box.
+    """
+
+    kind: Literal["cover", "overlay"]
+    image: Image.Image
+    box: Box
+
+
+# On a downscale of 2x or more PIL first reduce()s by the integer factor
+# (box filter) and LANCZOS only covers the rest, so a 6000 px capture going
+# into a 1900 px slot costs about as much as a 2000 px one.
+REDUCING_GAP = 1.0
+
+
+def cover_box(src_size: tuple[int, int], dst_size: tuple[int, int]) -> tuple[float, float, float, float]:
+    """
+    Centre crop of the source (in source pixels) that fills dst_size when
+    scaled to cover it. Only this region is ever resampled.
+    """
+    iw, ih = src_size
+    w, h = dst_size
+    scale = max(w / iw, h / ih)
+    sw, sh = w / scale, h / scale
+    x0, y0 = (iw - sw) / 2, (ih - sh) / 2
+    return x0, y0, x0 + sw, y0 + sh
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA") and img.getchannel("A").getextrema()[0] < 255
+
+
+def place_cover(canvas: Image.Image, img: Image.Image, box: Box) -> None:
+    x, y, w, h = box
+    resized = img.resize((w, h), Image.LANCZOS, box=cover_box(img.size, (w, h)), reducing_gap=REDUCING_GAP)
+    if _has_alpha(resized):
+        canvas.paste(resized, (x, y), resized)
+    else:
+        canvas.paste(resized if resized.mode == canvas.mode else resized.convert(canvas.mode), (x, y))
+
+
+def compose(canvas_size: tuple[int, int], layers: Iterable[Layer]) -> Image.Image:
+    """
+    Draw the layers in order on a white RGB canvas and return it. The
+    output is a JPEG, so there is no RGBA canvas: opaque photos are pasted
+    and overlays are blended with their own alpha as the paste mask, one
+    pass per layer over its box only.
+    """
+    canvas = Image.new("RGB", canvas_size, (255, 255, 255))
+    for layer in layers:
+        if layer.kind == "cover":
+            place_cover(canvas, layer.image, layer.box)
+        elif layer.image.mode == "RGBA":
+            canvas.paste(layer.image, layer.box[:2], layer.image)
+        else:
+            canvas.paste(layer.image.convert("RGB"), layer.box[:2])
+    return canvas
+
+
+def _label_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1: fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def contact_sheet(
+    items: list[tuple[str, Image.Image]],
+    cell_long_edge: int = 800,
+    columns: int | None = None,
+    gap: int = 16,
+) -> Image.Image:
+    """
+    Images side by side (one row unless `columns` is given), each scaled
+    to a cell of the first image's aspect ratio with its label underneath,
+    on a white canvas.
+    """
+    first = items[0][1]
+    scale = cell_long_edge / max(first.size)
+    cell_w, cell_h = max(1, round(first.width * scale)), max(1, round(first.height * scale))
+    columns = max(1, min(columns or len(items), len(items)))
+    rows = -(-len(items) // columns)
+    label_h = max(24, cell_long_edge // 16)
+
+    width = columns * cell_w + (columns + 1) * gap
+    height = rows * (cell_h + label_h) + (rows + 1) * gap
+    layers = []
+    for i, (_, img) in enumerate(items):
+        x = gap + (i % columns) * (cell_w + gap)
+        y = gap + (i // columns) * (cell_h + label_h + gap)
+        layers.append(Layer("cover", img, (x, y, cell_w, cell_h)))
+    canvas = compose((width, height), layers)
+
+    draw = ImageDraw.Draw(canvas)
+    font = _label_font(int(label_h * 0.6))
+    for i, (label, _) in enumerate(items):
+        left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+        x = gap + (i % columns) * (cell_w + gap) + (cell_w - (right - left)) / 2 - left
+        y = gap + (i // columns) * (cell_h + label_h + gap) + cell_h + (label_h - (bottom - top)) / 2 - top
+        draw.text((x, y), label, fill=(40, 40, 40), font=font)
+    return canvas
+
+
+__all__ = ["Box", "Layer", "Rel", "compose", "contact_sheet", "cover_box", "place_cover"]
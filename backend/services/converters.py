@@ -1,17 +1,70 @@
-from PIL import Image
+import cv2
 import numpy as np
+from PIL import Image
+
+from backend.services.strips import Strip, run_strips
+
+
+def pil_to_bgr8(img: Image.Image) -> np.ndarray:
+    """Convert PIL image to a contiguous OpenCV BGR uint8 array."""
+    rgb = np.asarray(img.convert("RGB"))
+    out = np.empty_like(rgb)
+
+    def strip(s: Strip) -> None:
+        cv2.cvtColor(rgb[s.rows], cv2.COLOR_RGB2BGR, dst=out[s.rows])
+
+    run_strips(strip, rgb.shape[0])
+    return out
+
+
+def bgr8_to_float(arr: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """BGR uint8 to float32 [0, 1] (into `out` if given)."""
+    out = np.empty(arr.shape, dtype=np.float32) if out is None else out
+
+    def strip(s: Strip) -> None:
+        rows = out[s.rows]
+        np.copyto(rows, arr[s.rows])
+        rows /= 255.0
+
+    run_strips(strip, arr.shape[0])
+    return out
 
 
 def pil_to_cv(img: Image.Image) -> np.ndarray:
-    """Convert PIL RGB image to OpenCV BGR float32 in range [0, 1]."""
-    arr = np.array(img.convert("RGB"), dtype=np.float32) / 255.0
-    return arr[:, :, ::-1]  # RGB -> BGR
+    """Convert PIL RGB image to OpenCV BGR float32 in range [0, 1] (C-contiguous)."""
+    return bgr8_to_float(pil_to_bgr8(img))
+
+
+def _to_u8(arr: np.ndarray, scratch: np.ndarray | None) -> np.ndarray:
+    tmp = np.multiply(arr, 255.0, out=scratch)
+    np.clip(tmp, 0, 255, out=tmp)
+    return tmp.astype(np.uint8)
+
+
+def float_to_bgr8(arr: np.ndarray, scratch: np.ndarray | None = None) -> np.ndarray:
+    """
+    OpenCV BGR float32 [0, 1] to uint8 (truncating, like astype). `scratch`
+    is a float32 buffer of the same shape used for the intermediate.
+    """
+    out = np.empty(arr.shape, dtype=np.uint8)
+
+    def strip(s: Strip) -> None:
+        out[s.rows] = _to_u8(arr[s.rows], None if scratch is None else scratch[s.rows])
+
+    run_strips(strip, arr.shape[0])
+    return out
+
+
+def cv_to_pil(arr: np.ndarray, scratch: np.ndarray | None = None) -> Image.Image:
+    """Convert OpenCV BGR float32 [0, 1] to PIL RGB (the 8-bit BGR step only exists per strip)."""
+    rgb = np.empty(arr.shape, dtype=np.uint8)
 
+    def strip(s: Strip) -> None:
+        bgr = _to_u8(arr[s.rows], None if scratch is None else scratch[s.rows])
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb[s.rows])
 
-def cv_to_pil(arr: np.ndarray) -> Image.Image:
-    """Convert OpenCV BGR float32 [0, 1] to PIL RGB."""
-    arr = np.clip(arr * 255.0, 0, 255).astype(np.uint8)
-    return Image.fromarray(arr[:, :, ::-1])  # BGR -> RGB
+    run_strips(strip, arr.shape[0])
+    return Image.fromarray(rgb)
 
 
-__all__ = ["pil_to_cv", "cv_to_pil"]
+__all__ = ["bgr8_to_float", "cv_to_pil", "float_to_bgr8", "pil_to_bgr8", "pil_to_cv"]
@@ -0,0 +1,87 @@
+"""
+Compare face detection backends on a folder of sample captures:
+
+    python -m backend.services.detector_bench backend/static/captured
+    python -m backend.services.detector_bench foto/ --backends dlib,haar,dnn --repeat 5
+
+For each backend prints detection rate, median / p95 latency of
+locate_face (detect + 68 landmarks, same path the pipeline uses) and the
+landmark agreement with the reference backend, as mean point error
+normalised by the outer-eye-corner distance (NME; < 0.05 is visually
+the same face fit).
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from backend.services.face_detection import locate_face
+from backend.services.face_detectors import BACKENDS, get_detector
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def _nme(landmarks: np.ndarray, reference: np.ndarray) -> float:
+    iod = float(np.linalg.norm(reference[45] - reference[36])) or 1.0
+    return float(np.linalg.norm(landmarks - reference, axis=1).mean() / iod)
+
+
+def run(folder: Path, backends: list[str], reference: str, repeat: int) -> None:
+    files = sorted(p for p in folder.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not files:
+        print(f"Tidak ada gambar di {folder}")
+        return
+
+    available = []
+    for name in backends:
+        try:
+            get_detector(name)
+            available.append(name)
+        except (RuntimeError, ValueError) as exc:
+            print(f"[BENCH] {name} dilewati: {exc}")
+
+    results = {name: {"ms": [], "found": 0, "nme": []} for name in available}
+    for path in files:
+        with Image.open(path) as src:
+            img = src.convert("RGB")
+
+        found = {}
+        for name in available:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                landmarks, _rect = locate_face(img, backend=name)
+                results[name]["ms"].append((time.perf_counter() - started) * 1000.0)
+            if landmarks is not None:
+                results[name]["found"] += 1
+                found[name] = landmarks.astype(np.float32)
+
+        ref = found.get(reference)
+        if ref is not None:
+            for name, landmarks in found.items():
+                if name != reference:
+                    results[name]["nme"].append(_nme(landmarks, ref))
+
+    print(f"\n{len(files)} gambar, {repeat}x per backend, referensi landmark: {reference}")
+    print(f"{'backend':<8} {'wajah':>7} {'median ms':>10} {'p95 ms':>8} {'NME':>7}")
+    for name, r in results.items():
+        ms = sorted(r["ms"])
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        nme = f"{statistics.mean(r['nme']):.3f}" if r["nme"] else "-"
+        print(f"{name:<8} {r['found']:>3}/{len(files):<3} {statistics.median(ms):>10.1f} {p95:>8.1f} {nme:>7}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark backend deteksi wajah")
+    parser.add_argument("folder", type=Path)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--reference", default="dlib")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.folder, [b.strip() for b in args.backends.split(",") if b.strip()], args.reference, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # backend/services/digicam_control.py
+import os
 import shutil
 import time
 from datetime import datetime
@@ -8,10 +9,13 @@ from typing import Optional
 import requests
 
 from backend.config import (
+    CAPTURE_TIMEOUT,
+    CAPTURE_TRANSFER,
     DIGICAM_BASE_URL,
     DIGICAM_PREVIEW_PATH,
     DIGICAM_CAPTURE_CMD,
 )
+from backend.services.capture_watcher import CAPTURE_WATCHER
 
 
 def _build_url(path_or_query: str) -> str:
@@ -34,13 +38,14 @@ def trigger_capture() -> None:
     resp.raise_for_status()
 
 
-def get_preview_image() -> tuple[bytes, str]:
+def get_preview_image(session: Optional[requests.Session] = None) -> tuple[bytes, str]:
     """
     Ambil gambar dari digiCamControl (liveview/preview).
+    Kirim `session` supaya koneksi keep-alive dipakai ulang antar frame.
     Return: (bytes_image, content_type)
     """
     url = _build_url(DIGICAM_PREVIEW_PATH)
-    resp = requests.get(url, timeout=10)
+    resp = (session or requests).get(url, timeout=10)
     resp.raise_for_status()
 
     content_type = resp.headers.get("Content-Type", "image/jpeg")
@@ -55,37 +60,47 @@ def _get_latest_file(directory: Path) -> Optional[Path]:
     if not directory.exists():
         return None
 
-    files = [p for p in directory.iterdir() if p.is_file()]
-    if not files:
-        return None
+    latest = None
+    latest_mtime = 0.0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file():
+                mtime = entry.stat().st_mtime
+                if latest is None or mtime > latest_mtime:
+                    latest, latest_mtime = entry.path, mtime
+    return Path(latest) if latest else None
 
-    return max(files, key=lambda p: p.stat().st_mtime)
 
+_link_fallback_logged = False
 
-def capture_and_save_photo(original_dir: Path, output_dir: Path) -> str:
-    """
-    1. Trigger capture di digiCamControl (kamera jepret)
-    2. Tunggu file baru muncul di folder original_dir (folder digiCamControl)
-    3. Copy file baru itu ke output_dir (backend/static/captured)
-    4. Return nama file (bukan path lengkap)
 
-    original_dir: folder tempat digiCamControl menyimpan foto asli
-    output_dir: folder tujuan untuk file final yang diakses web
+def _transfer(src: Path, dest: Path) -> None:
     """
-    if not original_dir.exists():
-        raise RuntimeError(f"Original directory does not exist: {original_dir}")
-
-    # Catat file terbaru sebelum capture
-    before_file = _get_latest_file(original_dir)
-    before_mtime = before_file.stat().st_mtime if before_file else None
-
-    # 1. Jepret
-    trigger_capture()
-
-    # 2. Tunggu file baru muncul
+    Pindahkan file jepretan ke dest sesuai CAPTURE_TRANSFER.
+    move (default): rename (instan di drive yang sama); kalau beda drive -> shutil.move.
+    link: hardlink (instan, tanpa salin data, tapi berbagi inode dengan file asli
+    digiCamControl); kalau gagal apa pun sebabnya -> copy.
+    """
+    global _link_fallback_logged
+    if CAPTURE_TRANSFER == "link":
+        try:
+            os.link(src, dest)
+            return
+        except OSError as exc:
+            # Beda drive, FAT/exFAT/kartu SD, share Windows, dll: errno-nya macam-macam
+            if not _link_fallback_logged:
+                _link_fallback_logged = True
+                print(f"[CAPTURE] Hardlink tidak bisa dipakai ({exc}), file jepretan disalin.")
+    elif CAPTURE_TRANSFER == "move":
+        shutil.move(src, dest)
+        return
+    shutil.copy2(src, dest)
+
+
+def _wait_new_file_polling(original_dir: Path, before_mtime: Optional[float]) -> Optional[Path]:
+    """Cara lama (folder digiCamControl di-scan tiap 0.5 detik), dipakai kalau watcher tidak aktif."""
     latest_file: Optional[Path] = None
-    timeout_seconds = 5.0
-    deadline = time.time() + timeout_seconds
+    deadline = time.time() + CAPTURE_TIMEOUT
 
     while time.time() < deadline:
         time.sleep(0.5)
@@ -103,6 +118,41 @@ def capture_and_save_photo(original_dir: Path, output_dir: Path) -> str:
             latest_file = candidate
             break
 
+    return latest_file
+
+
+def capture_and_save_photo(original_dir: Path, output_dir: Path) -> str:
+    """
+    1. Trigger capture di digiCamControl (kamera jepret)
+    2. Tunggu file baru selesai ditulis di original_dir (event watchdog, ukuran stabil)
+    3. Hardlink/pindah/copy file itu ke output_dir (backend/static/captured)
+    4. Return nama file (bukan path lengkap)
+
+    original_dir: folder tempat digiCamControl menyimpan foto asli
+    output_dir: folder tujuan untuk file final yang diakses web
+    """
+    if not original_dir.exists():
+        raise RuntimeError(f"Original directory does not exist: {original_dir}")
+
+    use_watcher = (
+        Path(original_dir) == CAPTURE_WATCHER.directory and CAPTURE_WATCHER.start()
+    )
+
+    if use_watcher:
+        # Daftar dulu sebelum jepret supaya event file baru tidak terlewat
+        waiter = CAPTURE_WATCHER.expect()
+        try:
+            trigger_capture()
+            latest_file = waiter.wait(CAPTURE_TIMEOUT)
+        finally:
+            CAPTURE_WATCHER.cancel(waiter)
+    else:
+        # Catat file terbaru sebelum capture
+        before_file = _get_latest_file(original_dir)
+        before_mtime = before_file.stat().st_mtime if before_file else None
+        trigger_capture()
+        latest_file = _wait_new_file_polling(original_dir, before_mtime)
+
     if latest_file is None:
         raise RuntimeError("No new file detected in digiCamControl folder after capture")
 
@@ -114,6 +164,6 @@ def capture_and_save_photo(original_dir: Path, output_dir: Path) -> str:
     dest_name = f"{timestamp_prefix}_{latest_file.name}"
     dest_path = output_dir / dest_name
 
-    shutil.copy2(latest_file, dest_path)
+    _transfer(latest_file, dest_path)
 
     return dest_name
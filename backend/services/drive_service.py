@@ -1,32 +1,27 @@
 import os
+import threading
 import time
-from typing import Dict, Optional
+from typing import List, Optional
 
+from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 
 from backend.config import TARGET_FOLDER_ID
 from backend.models.processed_file import ProcessedFile
-from backend.services.auth_service import get_drive_service
+from backend.services import auth_service
+from backend.services.processed_store import PROCESSED_FILES
+from backend.services.qr_cache import QR_CACHE
 
-PROCESSED_FILES: Dict[str, ProcessedFile] = {}
-FILES_IN_PROGRESS: set[str] = set()
-LATEST_PROCESSED_FILE_ID: str | None = None
+_local = threading.local()
 
 
-def mark_in_progress(file_path: str):
-    FILES_IN_PROGRESS.add(file_path)
+class DriveUnavailable(RuntimeError):
+    """Drive is not authorized (yet); the upload is retried later."""
 
 
-def discard_in_progress(file_path: str):
-    FILES_IN_PROGRESS.discard(file_path)
-
-
-def is_in_progress(file_path: str) -> bool:
-    return file_path in FILES_IN_PROGRESS
-
-
-def get_processed_files_history() -> Dict[str, ProcessedFile]:
-    return PROCESSED_FILES
+def get_processed_files_history(limit: int = 50, before: Optional[float] = None) -> tuple[List[ProcessedFile], Optional[float]]:
+    """Newest-first page of uploaded files and the cursor for the next page."""
+    return PROCESSED_FILES.page(limit, before)
 
 
 def get_processed_file(file_id: str) -> Optional[ProcessedFile]:
@@ -34,58 +29,55 @@ def get_processed_file(file_id: str) -> Optional[ProcessedFile]:
 
 
 def get_latest_processed_file() -> Optional[ProcessedFile]:
-    if LATEST_PROCESSED_FILE_ID:
-        return PROCESSED_FILES.get(LATEST_PROCESSED_FILE_ID)
-    return None
-
-
-async def upload_file_to_drive(file_path: str):
-    """Upload a local file to Google Drive and track it in memory."""
-    global LATEST_PROCESSED_FILE_ID
-
-    service = get_drive_service()
-    upload_success = False
-
-    if not service:
-        print(f"ERROR: Drive Service tidak tersedia saat mengunggah {file_path}")
-        discard_in_progress(file_path)
-        return
-
+    return PROCESSED_FILES.latest()
+
+
+def _thread_service():
+    """
+    Drive service for the calling uploader thread. The client (httplib2)
+    is not thread-safe, so each thread builds its own from the shared
+    credentials, and rebuilds it after the user re-authorizes.
+    """
+    if auth_service.get_drive_service() is None:
+        raise DriveUnavailable("Drive Service tidak tersedia (belum diotorisasi)")
+    creds = auth_service.get_credentials()
+    if getattr(_local, "creds", None) is not creds:
+        _local.service = build("drive", "v3", credentials=creds, cache_discovery=False)
+        _local.creds = creds
+    return _local.service
+
+
+def upload_file(file_path: str) -> ProcessedFile:
+    """
+    Upload a local file to Google Drive (blocking; called from the upload
+    queue's threads) and record it in PROCESSED_FILES (with its QR pre-rendered). Raises on failure.
+    """
+    service = _thread_service()
     file_name = os.path.basename(file_path)
     absolute_path = os.path.abspath(file_path)
+    if not os.path.exists(absolute_path):
+        raise FileNotFoundError(absolute_path)
     print(f"-> Mengunggah file: {file_name} dari {absolute_path}")
 
-    try:
-        file_metadata = {"name": file_name, "parents": [TARGET_FOLDER_ID]}
-        media = MediaFileUpload(absolute_path, resumable=True)
-
-        file = (
-            service.files()
-            .create(body=file_metadata, media_body=media, fields="id, webViewLink, webContentLink")
-            .execute()
-        )
-
-        processed = ProcessedFile(
-            id=file["id"],
-            name=file_name,
-            share_link=file.get("webViewLink"),
-            download_link=file.get("webContentLink"),
-            processed_time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-        )
-
-        PROCESSED_FILES[processed.id] = processed
-        LATEST_PROCESSED_FILE_ID = processed.id
-
-        print(f"   [SUCCESS] File {file_name} berhasil diunggah. Drive ID: {processed.id}")
-        upload_success = True
-
-    except Exception as e:
-        if "No such file or directory" in str(e):
-            print(f"   [WARNING] File {file_name} tidak ditemukan (mungkin dihapus/dipindahkan). Melewati.")
-        else:
-            print(f"   [ERROR] Gagal mengunggah file {file_name}: {e}")
-    finally:
-        discard_in_progress(file_path)
-
-        if upload_success:
-            print(f"   [INFO] File lokal {file_name} dibiarkan tersimpan setelah unggah.")
+    file_metadata = {"name": file_name, "parents": [TARGET_FOLDER_ID]}
+    media = MediaFileUpload(absolute_path, resumable=True)
+    file = (
+        service.files()
+        .create(body=file_metadata, media_body=media, fields="id, webViewLink, webContentLink")
+        .execute()
+    )
+
+    processed = ProcessedFile(
+        id=file["id"],
+        name=file_name,
+        share_link=file.get("webViewLink"),
+        download_link=file.get("webContentLink"),
+        processed_time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+    )
+    PROCESSED_FILES.add(processed, absolute_path)
+    if processed.share_link:
+        # QR dibuat di thread uploader, jadi /api/qr pertama tinggal lookup
+        QR_CACHE.prerender(processed.id, processed.share_link)
+
+    print(f"   [SUCCESS] File {file_name} berhasil diunggah. Drive ID: {processed.id}")
+    return processed
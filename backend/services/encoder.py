@@ -0,0 +1,111 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from backend.config import (
+    CAPTURE_WORK_JPEG_QUALITY,
+    ENCODED_CACHE_MB,
+    PREVIEW_JPEG_QUALITY,
+    RESULT_JPEG_QUALITY,
+)
+
+
+@dataclass(frozen=True)
+class JpegProfile:
+    quality: int
+    optimize: bool
+    progressive: bool
+    subsampling: int  # 0 = 4:4:4, 2 = 4:2:0
+
+
+# Response di layar: baseline tanpa optimize (pass Huffman kedua mahal di foto besar)
+PREVIEW = JpegProfile(PREVIEW_JPEG_QUALITY, optimize=False, progressive=False, subsampling=2)
+# File final yang dibagikan: lebih kecil, tampil progresif di HP
+SHARE = JpegProfile(RESULT_JPEG_QUALITY, optimize=True, progressive=True, subsampling=0)
+# Working copy hasil ingest capture: kualitas tinggi 4:4:4, encode/decode cepat
+WORK = JpegProfile(CAPTURE_WORK_JPEG_QUALITY, optimize=False, progressive=False, subsampling=0)
+
+
+def encode_jpeg(img: Image.Image, profile: JpegProfile = PREVIEW) -> bytes:
+    """Encode img once with the given profile. Alpha is dropped (canvas is opaque)."""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    buffer = io.BytesIO()
+    img.save(
+        buffer,
+        format="JPEG",
+        quality=profile.quality,
+        optimize=profile.optimize,
+        progressive=profile.progressive,
+        subsampling=profile.subsampling,
+    )
+    return buffer.getvalue()
+
+
+class EncodedFiles:
+    """
+    Encoded files written to disk and kept in memory (LRU, bounded by bytes),
+    so later /static requests are answered with the exact bytes that were
+    stored instead of reading the file back.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def save(self, data: bytes, directory: Path, prefix: str, extension: str = ".jpg") -> str:
+        """Write data under a timestamped name and return the file name."""
+        directory.mkdir(parents=True, exist_ok=True)
+        filename = f"{prefix}_{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{extension}"
+        path = directory / filename
+        tmp = path.with_name(filename + ".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._put(str(path.resolve()), data)
+        return filename
+
+    def _put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get(self, path: Path) -> Optional[bytes]:
+        """Bytes stored for path, or None if not cached (or deleted on disk)."""
+        key = str(path.resolve())
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        if data is not None and not path.exists():
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._bytes -= len(data)
+            return None
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+ENCODED_FILES = EncodedFiles(ENCODED_CACHE_MB * 1024 * 1024)
+
+
+__all__ = ["JpegProfile", "PREVIEW", "SHARE", "WORK", "encode_jpeg", "EncodedFiles", "ENCODED_FILES"]
@@ -1,11 +1,21 @@
 import cv2
 import dlib
 import numpy as np
+from PIL import Image
 
-from backend.config import PREDICTOR_PATH
+from backend.config import (
+    FACE_DETECT_FALLBACK,
+    FACE_DETECT_MAX_SIDE,
+    FACE_DETECTOR,
+    FACE_MAX_FACES,
+    FACE_MIN_PX,
+    PREDICTOR_PATH,
+)
+from backend.services.converters import pil_to_cv
+from backend.services.face_detectors import get_detector, select_faces
 
-# Load dlib detector and shape predictor once
-detector = dlib.get_frontal_face_detector()
+# Load the configured detector backend and the shape predictor once
+detector = get_detector(FACE_DETECTOR)
 try:
     predictor = dlib.shape_predictor(str(PREDICTOR_PATH))
 except RuntimeError:
@@ -13,49 +23,162 @@ except RuntimeError:
         f"Tidak bisa load shape predictor. Pastikan file ada di: {PREDICTOR_PATH}"
     )
 
+# Detection runs on a copy downscaled to this long edge
+DETECTION_MAX_SIDE = FACE_DETECT_MAX_SIDE
 
-def detect_face_and_landmarks(img_bgr: np.ndarray):
+
+# A liveview hint box is grown by this fraction of its size on every side
+# before searching it, to absorb movement between liveview and capture.
+HINT_PAD = 0.5
+
+
+def hint_box(hint, frame_shape) -> tuple[int, int, int, int]:
+    """Relative hint (x0, y0, x1, y1) to a padded pixel box clipped to the frame."""
+    h, w = frame_shape[:2]
+    x0, y0, x1, y1 = hint
+    pad_x, pad_y = (x1 - x0) * HINT_PAD, (y1 - y0) * HINT_PAD
+    return (
+        max(0, int((x0 - pad_x) * w)),
+        max(0, int((y0 - pad_y) * h)),
+        min(w, int((x1 + pad_x) * w) + 1),
+        min(h, int((y1 + pad_y) * h) + 1),
+    )
+
+
+def _shift(landmarks: np.ndarray, rect, scale: float, dx: int, dy: int):
+    """Map landmarks/rect found on a scaled crop back to frame coordinates."""
+    pts = (landmarks / scale).astype(np.int32) + np.array([dx, dy], dtype=np.int32)
+    rect = dlib.rectangle(
+        int(rect.left() / scale) + dx,
+        int(rect.top() / scale) + dy,
+        int(rect.right() / scale) + dx,
+        int(rect.bottom() / scale) + dy,
+    )
+    return pts, rect
+
+
+def _predict(gray: np.ndarray, rects) -> np.ndarray:
+    """68 landmarks for every rect on one shared grayscale image, as an (N, 68, 2) array."""
+    out = np.empty((len(rects), 68, 2), dtype=np.float32)
+    for n, rect in enumerate(rects):
+        shape = predictor(gray, rect)
+        for i in range(68):
+            part = shape.part(i)
+            out[n, i] = (part.x, part.y)
+    return out
+
+
+def _detect(img_bgr: np.ndarray, backend: str | None, scale: float, max_faces: int = FACE_MAX_FACES, min_side: float = 0):
     """
-    Detect face and 68 landmarks with dlib.
-    Returns (landmarks, rect) or (None, None) if no face is found.
+    Detect on img_bgr resized by `scale`; results are in img_bgr coordinates.
+    Returns [(landmarks, rect), ...] for the faces select_faces keeps
+    (`min_side` in img_bgr px), largest first.
     """
-    h, w = img_bgr.shape[:2]
-    max_side = max(h, w)
-
-    scale = 1.0
-    target = 1600.0
-    if max_side > target:
-        scale = target / max_side
+    if scale < 1.0:
         img_small = cv2.resize(img_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
     else:
         img_small = img_bgr.copy()
 
-    img_small_gray = (img_small * 255).astype(np.uint8)
-    img_small_gray = cv2.cvtColor(img_small_gray, cv2.COLOR_BGR2GRAY)
-
-    faces = detector(img_small_gray, 1)
-    if len(faces) == 0:
-        return None, None
-
-    faces_sorted = sorted(faces, key=lambda r: r.width() * r.height(), reverse=True)
-    face = faces_sorted[0]
-
-    shape = predictor(img_small_gray, face)
-    pts = []
-    for i in range(68):
-        x = int(shape.part(i).x / scale)
-        y = int(shape.part(i).y / scale)
-        pts.append((x, y))
-    pts = np.array(pts, dtype=np.int32)
-
-    rect_full = dlib.rectangle(
-        int(face.left() / scale),
-        int(face.top() / scale),
-        int(face.right() / scale),
-        int(face.bottom() / scale),
-    )
+    img_small_8u = (img_small * 255).astype(np.uint8)
+    img_small_gray = cv2.cvtColor(img_small_8u, cv2.COLOR_BGR2GRAY)
+
+    det = detector if backend is None else get_detector(backend)
+    faces = det.detect(img_small_8u)
+    if len(faces) == 0 and backend is None and FACE_DETECT_FALLBACK and det.name != "dlib":
+        faces = get_detector("dlib").detect(img_small_8u)
+    faces = select_faces(faces, min_side * scale, max_faces)
+    if not faces:
+        return []
+
+    landmarks = (_predict(img_small_gray, faces) / scale).astype(np.int32)
+    return [
+        (
+            pts,
+            dlib.rectangle(
+                int(face.left() / scale),
+                int(face.top() / scale),
+                int(face.right() / scale),
+                int(face.bottom() / scale),
+            ),
+        )
+        for pts, face in zip(landmarks, faces)
+    ]
+
+
+def detect_faces(img_bgr: np.ndarray, backend: str | None = None, hint=None, max_faces: int = FACE_MAX_FACES):
+    """
+    Detect faces with the configured backend (FACE_DETECTOR, or `backend`)
+    and 68 landmarks each with the dlib predictor. Faces much smaller than
+    the largest one are ignored (see select_faces). With a liveview `hint`
+    (relative box around the faces), the padded hint area is searched first
+    and the full frame only if that finds nothing.
+    Returns [(landmarks, rect), ...], largest face first; empty if none.
+    """
+    h, w = img_bgr.shape[:2]
+    scale = min(1.0, DETECTION_MAX_SIDE / max(h, w))
+
+    if hint is not None:
+        x0, y0, x1, y1 = hint_box(hint, (h, w))
+        found = _detect(img_bgr[y0:y1, x0:x1], backend, scale, max_faces, FACE_MIN_PX)
+        if found:
+            return [_shift(landmarks, rect, 1.0, x0, y0) for landmarks, rect in found]
+        print("[DETECT] Wajah tidak ada di area hint liveview, cari di seluruh frame.")
+
+    return _detect(img_bgr, backend, scale, max_faces, FACE_MIN_PX)
+
+
+def detect_face_and_landmarks(img_bgr: np.ndarray, backend: str | None = None, hint=None):
+    """
+    Largest face only (see detect_faces).
+    Returns (landmarks, rect) or (None, None) if no face is found.
+    """
+    found = detect_faces(img_bgr, backend, hint, max_faces=1)
+    return found[0] if found else (None, None)
+
+
+def locate_faces(img_pil: Image.Image, backend: str | None = None, hint=None, max_faces: int = FACE_MAX_FACES):
+    """
+    Same as detect_faces, but downscales the PIL image before converting
+    it, so the full frame is never turned into float32. With a `hint`,
+    only the padded hint area is cropped and scaled at first.
+    Returns [(landmarks, rect), ...] in full-frame coordinates.
+    """
+    w, h = img_pil.size
+    scale = min(1.0, DETECTION_MAX_SIDE / max(w, h))
+
+    def scaled(img: Image.Image) -> Image.Image:
+        if scale == 1.0:
+            return img
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        return img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    min_side = FACE_MIN_PX * scale
+    if hint is not None:
+        box = hint_box(hint, (h, w))
+        found = _detect(pil_to_cv(scaled(img_pil.crop(box))), backend, 1.0, max_faces, min_side)
+        if found:
+            return [_shift(landmarks, rect, scale, box[0], box[1]) for landmarks, rect in found]
+        print("[DETECT] Wajah tidak ada di area hint liveview, cari di seluruh frame.")
+
+    found = _detect(pil_to_cv(scaled(img_pil)), backend, 1.0, max_faces, min_side)
+    if scale == 1.0:
+        return found
+    return [_shift(landmarks, rect, scale, 0, 0) for landmarks, rect in found]
+
 
-    return pts, rect_full
+def locate_face(img_pil: Image.Image, backend: str | None = None, hint=None):
+    """Largest face only (see locate_faces). Returns (landmarks, rect) or (None, None)."""
+    found = locate_faces(img_pil, backend, hint, max_faces=1)
+    return found[0] if found else (None, None)
 
 
-__all__ = ["detect_face_and_landmarks", "detector", "predictor"]
+__all__ = [
+    "detect_face_and_landmarks",
+    "detect_faces",
+    "locate_face",
+    "locate_faces",
+    "hint_box",
+    "detector",
+    "predictor",
+    "DETECTION_MAX_SIDE",
+]
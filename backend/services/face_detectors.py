@@ -0,0 +1,133 @@
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import cv2
+import dlib
+import numpy as np
+
+from backend.config import (
+    DLIB_UPSAMPLE,
+    FACE_DNN_CONFIDENCE,
+    FACE_DNN_MODEL,
+    FACE_DNN_PROTOTXT,
+    FACE_HAAR_CASCADE,
+    FACE_LBP_CASCADE,
+    FACE_MAX_FACES,
+    FACE_MIN_REL,
+)
+
+# Every backend takes a uint8 BGR image and returns dlib.rectangle boxes in
+# that image's pixel coordinates, so the 68-point predictor can run on any
+# of them unchanged.
+
+
+class DlibHogDetector:
+    name = "dlib"
+
+    def __init__(self, upsample: int = DLIB_UPSAMPLE):
+        self.upsample = upsample
+        self._detector = dlib.get_frontal_face_detector()
+        self._lock = threading.Lock()  # shared across threads; dlib makes no thread-safety promise
+
+    def detect(self, img_bgr_8u: np.ndarray) -> List[dlib.rectangle]:
+        gray = cv2.cvtColor(img_bgr_8u, cv2.COLOR_BGR2GRAY)
+        with self._lock:
+            return list(self._detector(gray, self.upsample))
+
+
+class CascadeDetector:
+    """OpenCV Haar or LBP cascade."""
+
+    def __init__(self, name: str, path: str):
+        if not Path(path).is_file():
+            raise RuntimeError(f"File cascade '{name}' tidak ditemukan: {path}")
+        self.name = name
+        self._cascade = cv2.CascadeClassifier(path)
+        if self._cascade.empty():
+            raise RuntimeError(f"File cascade '{name}' tidak bisa dibaca: {path}")
+        self._lock = threading.Lock()  # cv2.CascadeClassifier is not thread-safe
+
+    def detect(self, img_bgr_8u: np.ndarray) -> List[dlib.rectangle]:
+        gray = cv2.equalizeHist(cv2.cvtColor(img_bgr_8u, cv2.COLOR_BGR2GRAY))
+        min_side = max(24, min(gray.shape[:2]) // 12)
+        with self._lock:
+            boxes = self._cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_side, min_side))
+        return [dlib.rectangle(int(x), int(y), int(x + w), int(y + h)) for (x, y, w, h) in boxes]
+
+
+class DnnDetector:
+    """OpenCV DNN SSD (res10 300x300 Caffe model) on CPU, loaded from local files."""
+
+    name = "dnn"
+
+    def __init__(self, model: str = FACE_DNN_MODEL, prototxt: str = FACE_DNN_PROTOTXT, confidence: float = FACE_DNN_CONFIDENCE):
+        for path in (model, prototxt):
+            if not Path(path).is_file():
+                raise RuntimeError(f"File model DNN tidak ditemukan: {path}")
+        self.confidence = confidence
+        self._net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self._lock = threading.Lock()  # cv2.dnn.Net is not thread-safe
+
+    def detect(self, img_bgr_8u: np.ndarray) -> List[dlib.rectangle]:
+        h, w = img_bgr_8u.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(img_bgr_8u, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        with self._lock:
+            self._net.setInput(blob)
+            out = self._net.forward()
+
+        rects = []
+        for det in out[0, 0]:
+            if float(det[2]) < self.confidence:
+                continue
+            x0, y0, x1, y1 = (det[3:7] * np.array([w, h, w, h])).astype(int)
+            x0, y0 = max(0, x0), max(0, y0)
+            x1, y1 = min(w - 1, x1), min(h - 1, y1)
+            if x1 > x0 and y1 > y0:
+                rects.append(dlib.rectangle(int(x0), int(y0), int(x1), int(y1)))
+        return rects
+
+
+def _haar_path() -> str:
+    return FACE_HAAR_CASCADE or str(Path(cv2.data.haarcascades) / "haarcascade_frontalface_default.xml")
+
+
+BACKENDS: Dict[str, Callable[[], object]] = {
+    "dlib": DlibHogDetector,
+    "haar": lambda: CascadeDetector("haar", _haar_path()),
+    "lbp": lambda: CascadeDetector("lbp", FACE_LBP_CASCADE),
+    "dnn": DnnDetector,
+}
+
+_instances: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def get_detector(name: str):
+    """Return the (shared) detector backend called `name`, loading it on first use."""
+    if name not in BACKENDS:
+        raise ValueError(f"FACE_DETECTOR tidak dikenal: {name} (pilih {', '.join(BACKENDS)})")
+    with _lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
+
+
+def select_faces(rects: List[dlib.rectangle], min_side: float = 0, max_faces: int = FACE_MAX_FACES) -> List[dlib.rectangle]:
+    """
+    Faces worth retouching, largest first: the largest face always, plus
+    every face at least FACE_MIN_REL of its width and `min_side` px wide
+    (background people and false positives are usually much smaller),
+    at most `max_faces`.
+    """
+    if not rects:
+        return []
+    ordered = sorted(rects, key=lambda r: r.width() * r.height(), reverse=True)
+    limit = max(min_side, ordered[0].width() * FACE_MIN_REL)
+    keep = [ordered[0]] + [r for r in ordered[1:] if r.width() >= limit]
+    return keep[: max(1, max_faces)]
+
+
+__all__ = ["BACKENDS", "CascadeDetector", "DlibHogDetector", "DnnDetector", "get_detector", "select_faces"]
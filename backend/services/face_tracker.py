@@ -0,0 +1,153 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from backend.config import (
+    FACE_DETECTOR,
+    FACE_TRACK_FPS,
+    FACE_TRACK_MAX_AGE,
+    FACE_TRACK_MAX_SIDE,
+    FACE_TRACKING,
+)
+
+# Face box relative to the frame: (x0, y0, x1, y1) in 0..1, so a box found
+# on a small liveview frame applies to the full-size capture.
+RelBox = tuple[float, float, float, float]
+
+# Consecutive liveview detections that must overlap before a box is "stable"
+STABLE_FRAMES = 2
+STABLE_IOU = 0.5
+
+
+def _iou(a: RelBox, b: RelBox) -> float:
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Runs low-resolution face detection on liveview frames in a background
+    thread and keeps the last stable box around the faces.
+
+    observe() never blocks the liveview request: a frame that arrives while
+    the previous one is still being detected, or faster than FACE_TRACK_FPS,
+    is dropped. capture() snapshots the current hint for a capture file so
+    the beauty worker can search that area of the full frame first.
+    """
+
+    def __init__(self, enabled: bool, max_side: int, fps: float, max_age: float):
+        self.enabled = enabled
+        self.max_side = max_side
+        self.min_interval = 1.0 / fps if fps > 0 else 0.0
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._busy = False
+        self._last_run = 0.0
+        self._candidate: Optional[RelBox] = None
+        self._streak = 0
+        self._stable: Optional[RelBox] = None
+        self._stable_at = 0.0
+        self._captures: "OrderedDict[str, RelBox]" = OrderedDict()
+        self.frames = 0
+        self.dropped = 0
+
+    def observe(self, frame_bytes: bytes) -> None:
+        """Hand a liveview JPEG to the tracker (dropped if the tracker is busy)."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._busy or now - self._last_run < self.min_interval:
+                self.dropped += 1
+                return
+            self._busy = True
+            self._last_run = now
+        threading.Thread(target=self._detect, args=(frame_bytes,), daemon=True, name="face-track").start()
+
+    def _detect(self, frame_bytes: bytes) -> None:
+        try:
+            box = self._find_face(frame_bytes)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[TRACK] Deteksi liveview gagal: {exc}")
+            box = None
+        finally:
+            with self._lock:
+                self._busy = False
+        self._update(box)
+
+    def _find_face(self, frame_bytes: bytes) -> Optional[RelBox]:
+        # Imported lazily: only the detector is needed here, not the predictor
+        from backend.services.face_detectors import get_detector, select_faces
+        from backend.services.image_cache import decode_image
+
+        with Image.open(io.BytesIO(frame_bytes)) as src:
+            small = decode_image(src, "RGB", self.max_side)
+        faces = select_faces(get_detector(FACE_DETECTOR).detect(np.asarray(small)[:, :, ::-1].copy()))
+        if not faces:
+            return None
+        # One box around every face that will be retouched (group shots)
+        w, h = small.size
+        return (
+            min(f.left() for f in faces) / w,
+            min(f.top() for f in faces) / h,
+            max(f.right() for f in faces) / w,
+            max(f.bottom() for f in faces) / h,
+        )
+
+    def _update(self, box: Optional[RelBox]) -> None:
+        with self._lock:
+            self.frames += 1
+            if box is None:
+                self._candidate, self._streak = None, 0
+                return
+            if self._candidate is not None and _iou(box, self._candidate) >= STABLE_IOU:
+                self._streak += 1
+            else:
+                self._streak = 1
+            self._candidate = box
+            if self._streak >= STABLE_FRAMES:
+                self._stable, self._stable_at = box, time.monotonic()
+
+    def current_hint(self) -> Optional[RelBox]:
+        """Last stable face box if it is recent enough, else None."""
+        with self._lock:
+            if self._stable is None or time.monotonic() - self._stable_at > self.max_age:
+                return None
+            return self._stable
+
+    def capture(self, filename: str, hint: Optional[RelBox]) -> None:
+        """Remember the hint that was current when `filename` was captured."""
+        if hint is None:
+            return
+        with self._lock:
+            self._captures[filename] = hint
+            while len(self._captures) > 64:
+                self._captures.popitem(last=False)
+
+    def hint_for(self, filename: str) -> Optional[RelBox]:
+        with self._lock:
+            return self._captures.get(filename)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "frames": self.frames,
+                "dropped": self.dropped,
+                "stable": self._stable,
+                "stable_age": round(time.monotonic() - self._stable_at, 2) if self._stable else None,
+            }
+
+
+FACE_TRACKER = FaceTracker(FACE_TRACKING, FACE_TRACK_MAX_SIDE, FACE_TRACK_FPS, FACE_TRACK_MAX_AGE)
+
+
+__all__ = ["FaceTracker", "FACE_TRACKER", "RelBox"]
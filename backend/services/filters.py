@@ -1,22 +1,183 @@
+import math
+
 import cv2
 import numpy as np
 
+from backend.services.precision import blend_linear, unpack
+from backend.services.strips import Strip, gaussian_radius, run_strips
+
+
+def frequency_sigma(frame_shape) -> int:
+    """Gaussian sigma of the frequency split, relative to the full frame size."""
+    h, w = frame_shape[:2]
+    return max(int(max(h, w) * 0.01), 3)
+
+
+def boost_saturation(img_bgr: np.ndarray, factor: float, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Increase or reduce saturation while keeping luminance stable. Works in
+    `out` (may be img_bgr itself), so no other full-frame copy is made.
+    """
+    out = np.empty_like(img_bgr) if out is None else out
+
+    def strip(s: Strip) -> None:
+        # Float HSV keeps S/V in [0, 1], so no uint8 round-trip is needed.
+        hsv = np.clip(img_bgr[s.rows], 0.0, 1.0, out=out[s.rows])
+        cv2.cvtColor(hsv, cv2.COLOR_BGR2HSV, dst=hsv)
+        sat = hsv[:, :, 1]
+        np.multiply(sat, factor, out=sat)
+        np.clip(sat, 0.0, 1.0, out=sat)
+        cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=hsv)
+
+    run_strips(strip, img_bgr.shape[0])
+    return out
+
+
+def _unsharp(img_bgr: np.ndarray, amount: float, radius: float, out: np.ndarray | None = None) -> np.ndarray:
+    sharp = cv2.GaussianBlur(img_bgr, (0, 0), sigmaX=radius, sigmaY=radius, dst=out)
+    np.subtract(img_bgr, sharp, out=sharp)
+    sharp *= amount
+    sharp += img_bgr
+    return np.clip(sharp, 0.0, 1.0, out=sharp)
+
+
+def apply_unsharp_mask(
+    img_bgr: np.ndarray, amount: float = 0.05, radius: float = 1.0, out: np.ndarray | None = None
+) -> np.ndarray:
+    """Light unsharp mask to restore subtle texture (written to `out` if given, not img_bgr)."""
+    out = np.empty_like(img_bgr) if out is None else out
 
-def boost_saturation(img_bgr: np.ndarray, factor: float) -> np.ndarray:
-    """Increase or reduce saturation while keeping luminance stable."""
-    hsv = cv2.cvtColor((np.clip(img_bgr, 0.0, 1.0) * 255.0).astype(np.uint8), cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
-    s = np.clip(s.astype(np.float32) * factor, 0, 255).astype(np.uint8)
-    hsv = cv2.merge([h, s, v])
-    out = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR).astype(np.float32) / 255.0
+    def strip(s: Strip) -> None:
+        np.copyto(out[s.rows], _unsharp(img_bgr[s.padded], amount, radius)[s.inner])
+
+    run_strips(strip, img_bgr.shape[0], halo=gaussian_radius(radius, img_bgr.dtype))
     return out
 
 
-def apply_unsharp_mask(img_bgr: np.ndarray, amount: float = 0.05, radius: float = 1.0) -> np.ndarray:
-    """Light unsharp mask to restore subtle texture."""
-    blur = cv2.GaussianBlur(img_bgr, (0, 0), sigmaX=radius, sigmaY=radius)
-    enhanced = img_bgr + amount * (img_bgr - blur)
-    return np.clip(enhanced, 0.0, 1.0)
+def unsharp_blend(
+    img_bgr: np.ndarray,
+    mask: np.ndarray,
+    amount: float,
+    radius: float,
+    strength: float,
+    out: np.ndarray,
+    linear: bool = False,
+) -> np.ndarray:
+    """
+    blend_masked(img_bgr, apply_unsharp_mask(img_bgr), mask, strength) into
+    `out` (not img_bgr) as one chain per strip, so the sharpened image only
+    ever exists a strip at a time.
+    """
+    def strip(s: Strip) -> None:
+        sharp = _unsharp(img_bgr[s.padded], amount, radius)[s.inner]
+        _blend_rows(img_bgr[s.rows], sharp, mask[s.rows], strength, out[s.rows], True, linear)
+
+    run_strips(strip, img_bgr.shape[0], halo=gaussian_radius(radius, img_bgr.dtype))
+    return out
+
+
+def _blend_rows(base, layer, mask, strength, out, layer_writable, linear) -> np.ndarray:
+    weight = unpack(mask)
+    if strength != 1.0:
+        weight = weight * strength
+    if linear:
+        return blend_linear(base, layer, weight, out)
+    keep = np.subtract(1.0, weight)
+    out = np.multiply(base, keep[:, :, None], out=out)
+    if layer_writable:
+        layer = np.multiply(layer, weight[:, :, None], out=layer)
+    else:
+        layer = layer * weight[:, :, None]
+    out += layer
+    return out
+
+
+def blend_masked(
+    base: np.ndarray,
+    layer: np.ndarray,
+    mask: np.ndarray,
+    strength: float = 1.0,
+    out: np.ndarray | None = None,
+    layer_writable: bool = False,
+    linear: bool = False,
+) -> np.ndarray:
+    """
+    base * (1 - strength * mask) + layer * strength * mask, with a 2-D mask
+    broadcast over the colour channels instead of stacked to 3 channels.
+    `out` may be base itself; with layer_writable the layer is scaled in
+    place, so the blend allocates nothing image-sized. The mask may be in
+    any storage precision (see precision.pack); `linear` blends in one
+    cv2.blendLinear pass instead of numpy. Runs strip by strip.
+    """
+    out = np.empty_like(base) if out is None else out
+
+    def strip(s: Strip) -> None:
+        _blend_rows(base[s.rows], layer[s.rows], mask[s.rows], strength, out[s.rows], layer_writable, linear)
+
+    run_strips(strip, base.shape[0])
+    return out
+
+
+class GaussianPyramid:
+    """
+    Half-resolution levels of one image, built lazily and shared by every
+    blur taken from it. Large-sigma blurs run on the smallest level that
+    still leaves `min_sigma` pixels of blur to do, then get upsampled, so
+    the cost no longer grows with sigma and frame size. The result is an
+    approximation of the full-res blur (see blur()).
+    """
+
+    def __init__(self, img: np.ndarray, min_sigma: float = 4.0, min_side: int = 64):
+        self._levels = [img]
+        self.min_sigma = min_sigma
+        self.min_side = min_side
+
+    @property
+    def base(self) -> np.ndarray:
+        return self._levels[0]
+
+    def level(self, k: int) -> np.ndarray:
+        while len(self._levels) <= k:
+            prev = self._levels[-1]
+            size = ((prev.shape[1] + 1) // 2, (prev.shape[0] + 1) // 2)
+            self._levels.append(cv2.resize(prev, size, interpolation=cv2.INTER_AREA))
+        return self._levels[k]
+
+    @staticmethod
+    def _remaining_variance(sigma: float, k: int) -> float:
+        # Each 2x area downsample at level i adds a box blur of variance
+        # 4**i / 4 (full-res pixels); bilinear upsampling adds about 4**k / 6.
+        if k == 0:
+            return sigma * sigma
+        pre = (4 ** k - 1) / 12.0 + (4 ** k) / 6.0
+        return (sigma * sigma - pre) / (4 ** k)
+
+    def blur(self, sigma: float) -> np.ndarray:
+        """
+        Gaussian blur of the base image, close to GaussianBlur(sigma): exact
+        while no smaller level is used, otherwise within about 2/255 per
+        pixel (mean below 0.05/255, measured up to sigma 60).
+        """
+        h, w = self.base.shape[:2]
+        k = 0
+        while True:
+            var = self._remaining_variance(sigma, k + 1)
+            if var <= 0 or math.sqrt(var) < self.min_sigma or min(h, w) >> (k + 1) < self.min_side:
+                break
+            k += 1
+
+        rem = math.sqrt(self._remaining_variance(sigma, k))
+        small = cv2.GaussianBlur(self.level(k), (0, 0), sigmaX=rem, sigmaY=rem)
+        if k == 0:
+            return small
+        return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
 
 
-__all__ = ["boost_saturation", "apply_unsharp_mask"]
+__all__ = [
+    "frequency_sigma",
+    "boost_saturation",
+    "apply_unsharp_mask",
+    "unsharp_blend",
+    "blend_masked",
+    "GaussianPyramid",
+]
@@ -0,0 +1,162 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from backend.config import DECODED_CACHE_MB
+
+
+class DecodedImageCache:
+    """
+    LRU of decoded images keyed by (path, mtime, size, mode), bounded by
+    decoded bytes. A file that changes on disk gets a new key, so stale
+    pixels are never served. Cached images are shared: callers must not
+    modify them in place.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path: Path, mode: str, max_side: int | None) -> tuple:
+        st = path.stat()
+        return (str(path.resolve()), st.st_mtime_ns, st.st_size, mode, max_side)
+
+    @staticmethod
+    def _size(img: Image.Image) -> int:
+        return img.width * img.height * len(img.getbands())
+
+    def load(self, path: Path, mode: str = "RGB", max_side: int | None = None) -> Image.Image:
+        """
+        Return the decoded image for path in `mode`, decoding it on a miss.
+        With max_side, return a copy downscaled to that long edge (cached
+        separately from the full-size decode).
+        """
+        key = self._key(path, mode, max_side)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        img = self._decode(path, mode, max_side)
+        self._put(key, img)
+        return img
+
+    def load_bytes(self, data: bytes, mode: str = "RGB", max_side: int | None = None) -> Image.Image:
+        """
+        Same as load() for an uploaded file, keyed by a hash of its bytes,
+        so re-posting the same photo (e.g. every preview tweak) skips decoding.
+        """
+        key = ("bytes", hashlib.blake2b(data, digest_size=16).hexdigest(), mode, max_side)
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        with Image.open(io.BytesIO(data)) as src:
+            img = decode_image(src, mode, max_side)
+        self._put(key, img)
+        return img
+
+    @staticmethod
+    def _decode(path: Path, mode: str, max_side: int | None) -> Image.Image:
+        if path.suffix == ".npy":
+            # Array mentah dari AfterStore (format "npy")
+            img = Image.fromarray(np.load(path, mmap_mode="r", allow_pickle=False)).convert(mode)
+            return downscale(img, max_side) if max_side else img
+        with Image.open(path) as src:
+            return decode_image(src, mode, max_side)
+
+    def remember(self, path: Path, img: Image.Image, mode: str = "RGB") -> None:
+        """Register an image that was just written to path, so the next load() skips decoding it."""
+        self._put(self._key(Path(path), mode, None), img.convert(mode) if img.mode != mode else img)
+
+    def _put(self, key: tuple, img: Image.Image) -> None:
+        size = self._size(img)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = img
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def proxy_size(size: tuple[int, int], max_side: int) -> tuple[int, int]:
+    """(w, h) scaled so the long edge is at most max_side."""
+    w, h = size
+    scale = min(1.0, max_side / max(w, h))
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def downscale(img: Image.Image, max_side: int) -> Image.Image:
+    size = proxy_size(img.size, max_side)
+    if size == img.size:
+        return img
+    return img.resize(size, Image.BOX, reducing_gap=3.0)
+
+
+def decode_image(src: Image.Image, mode: str = "RGB", max_side: int | None = None) -> Image.Image:
+    """
+    Decode an opened image to `mode`, optionally straight to a proxy whose
+    long edge is max_side. JPEGs are decoded with draft() at the largest
+    1/2, 1/4 or 1/8 scale that still covers the proxy, which skips most of
+    the IDCT work.
+    """
+    if not max_side:
+        return src.convert(mode)
+    target = proxy_size(src.size, max_side)
+    if src.format == "JPEG":
+        src.draft(mode if mode in ("RGB", "L") else "RGB", target)
+    img = src.convert(mode)
+    return img.resize(target, Image.BOX, reducing_gap=3.0) if img.size != target else img
+
+
+DECODED_IMAGES = DecodedImageCache(DECODED_CACHE_MB * 1024 * 1024)
+
+
+def load_rgb(path: Path) -> Image.Image:
+    return DECODED_IMAGES.load(Path(path), "RGB")
+
+
+def load_rgba(path: Path) -> Image.Image:
+    return DECODED_IMAGES.load(Path(path), "RGBA")
+
+
+__all__ = [
+    "DecodedImageCache",
+    "DECODED_IMAGES",
+    "decode_image",
+    "downscale",
+    "load_rgb",
+    "load_rgba",
+    "proxy_size",
+]
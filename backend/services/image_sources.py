@@ -0,0 +1,133 @@
+import base64
+import io
+import threading
+from pathlib import Path
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from backend.config import (
+    API_BASE_URL,
+    CAPTURED_DIR,
+    REMOTE_IMAGE_MAX_MB,
+    REMOTE_IMAGE_POOL_SIZE,
+    REMOTE_IMAGE_TIMEOUT,
+    STATIC_DIR,
+)
+from backend.services.after_store import wait_until_written
+from backend.services.capture_ingest import CAPTURE_INDEX
+from backend.services.image_cache import DECODED_IMAGES
+
+# Host yang dianggap "server ini sendiri": API_BASE_URL plus loopback di port yang sama
+_OWN_BASE = urlparse(API_BASE_URL)
+_OWN_PORT = _OWN_BASE.port or (443 if _OWN_BASE.scheme == "https" else 80)
+_LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+class ImageSourceError(ValueError):
+    """The image reference is invalid, too large or cannot be fetched."""
+
+
+def _get_session() -> requests.Session:
+    """Shared Session so repeated fetches reuse keep-alive connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=REMOTE_IMAGE_POOL_SIZE, pool_maxsize=REMOTE_IMAGE_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def _is_own_url(parsed) -> bool:
+    if not parsed.netloc:
+        return True  # URL relatif, mis. "/static/after/x.png"
+    if parsed.netloc == _OWN_BASE.netloc:
+        return True
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    return parsed.hostname in _LOOPBACK_HOSTS and port == _OWN_PORT
+
+
+def static_path_for_url(src: str) -> Optional[Path]:
+    """
+    Map a URL served by our own /static mount to the file under STATIC_DIR.
+    Returns None for URLs that are not ours. An after file that is still
+    being written in the background is waited for. Raises FileNotFoundError
+    if the URL is ours but the file is missing or escapes STATIC_DIR.
+    """
+    parsed = urlparse(src)
+    if not _is_own_url(parsed) or not parsed.path.startswith("/static/"):
+        return None
+
+    rel = unquote(parsed.path[len("/static/"):])
+    root = STATIC_DIR.resolve()
+    path = (root / rel).resolve()
+    if not path.is_relative_to(root) or not wait_until_written(path) or not path.is_file():
+        raise FileNotFoundError(f"File static tidak ditemukan: {parsed.path}")
+
+    if path.parent == CAPTURED_DIR.resolve():
+        # Foto asli kamera: pakai working copy hasil ingest (lebih kecil, sudah tegak)
+        record = CAPTURE_INDEX.get(path.name)
+        if record is not None:
+            return record.path("work")
+    return path
+
+
+def _fetch_remote(src: str) -> bytes:
+    max_bytes = REMOTE_IMAGE_MAX_MB * 1024 * 1024
+    try:
+        with _get_session().get(src, timeout=REMOTE_IMAGE_TIMEOUT, stream=True) as resp:
+            if not resp.ok:
+                raise ImageSourceError(f"Failed to fetch image: {src}")
+            length = resp.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise ImageSourceError(f"Gambar terlalu besar (> {REMOTE_IMAGE_MAX_MB} MB): {src}")
+
+            buf = bytearray()
+            for chunk in resp.iter_content(chunk_size=64 * 1024):
+                buf += chunk
+                if len(buf) > max_bytes:
+                    raise ImageSourceError(f"Gambar terlalu besar (> {REMOTE_IMAGE_MAX_MB} MB): {src}")
+            return bytes(buf)
+    except requests.RequestException as exc:
+        raise ImageSourceError(f"Failed to fetch image: {src}") from exc
+
+
+def load_image_source(src: str, mode: str = "RGBA") -> Image.Image:
+    """
+    Load an image from a data URL, one of our own /static URLs, an external
+    http(s) URL or a local path, converted to `mode`.
+
+    Our own static files are read straight from disk through the decoded-image
+    cache (keyed by path+mtime), so no HTTP request goes back into this server.
+    Cached images are shared: callers must not modify them in place.
+    """
+    if src.startswith("data:"):
+        try:
+            _header, b64data = src.split(",", 1)
+            return Image.open(io.BytesIO(base64.b64decode(b64data))).convert(mode)
+        except Exception as exc:  # noqa: BLE001
+            raise ImageSourceError("Invalid data URL") from exc
+
+    if src.startswith(("http://", "https://", "/static/")):
+        path = static_path_for_url(src)
+        if path is not None:
+            return DECODED_IMAGES.load(path, mode)
+        return Image.open(io.BytesIO(_fetch_remote(src))).convert(mode)
+
+    # fallback: treat as local path
+    path = Path(src)
+    if not path.is_file():
+        raise FileNotFoundError(f"Image path not found: {src}")
+    return DECODED_IMAGES.load(path, mode)
+
+
+__all__ = ["ImageSourceError", "load_image_source", "static_path_for_url"]
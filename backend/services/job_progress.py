@@ -0,0 +1,35 @@
+import multiprocessing
+from typing import Optional
+
+# Stage progress reported by running jobs, in order
+PROGRESS_STAGES = ("detect", "mask", "smooth", "encode")
+
+# One queue shared by the API process and every worker process. Workers
+# receive it through the pool initializer; the API process drains it.
+_QUEUE = None
+
+
+def get_queue():
+    """Return the progress queue, creating it in the API process on first use."""
+    global _QUEUE
+    if _QUEUE is None:
+        _QUEUE = multiprocessing.get_context("spawn").Queue()
+    return _QUEUE
+
+
+def install(queue) -> None:
+    """Called in each worker process with the queue created by the API process."""
+    global _QUEUE
+    _QUEUE = queue
+
+
+def report(job_id: Optional[str], stage: str) -> None:
+    """Publish that job_id entered `stage`. No-op for jobs without an id."""
+    if job_id and _QUEUE is not None:
+        try:
+            _QUEUE.put_nowait((job_id, stage))
+        except Exception as exc:  # noqa: BLE001
+            print(f"[JOB] Gagal kirim progress {job_id}/{stage}: {exc}")
+
+
+__all__ = ["PROGRESS_STAGES", "get_queue", "install", "report"]
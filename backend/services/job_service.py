@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional, Set
+
+from backend.config import API_BASE_URL, BEAUTY_JOB_HISTORY, BEAUTY_JOB_MAX_ACTIVE
+from backend.models.presets import PresetConfig
+from backend.services import job_progress
+from backend.services.beauty_jobs import Source, beauty_job
+from backend.services.face_tracker import RelBox
+from backend.services.worker_pool import BEAUTY_POOL, JobTimeout, PoolBusy
+
+# Rough share of the work done when a job enters each stage
+STAGE_PROGRESS = {"queued": 0.0, "detect": 0.1, "mask": 0.3, "smooth": 0.5, "encode": 0.9, "done": 1.0}
+
+TERMINAL_STATUSES = ("done", "error")
+
+
+class TooManyJobs(Exception):
+    """More beauty jobs are active than BEAUTY_JOB_MAX_ACTIVE allows."""
+
+
+@dataclass
+class BeautyJob:
+    id: str
+    key: str
+    preset: str
+    status: str = "queued"  # queued | running | done | error
+    stage: str = "queued"
+    error: Optional[str] = None
+    after_url: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    jpeg: Optional[bytes] = field(default=None, repr=False)
+    version: int = 0
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def progress(self) -> float:
+        return STAGE_PROGRESS.get(self.stage, 0.0)
+
+    def to_dict(self) -> dict:
+        api = API_BASE_URL.rstrip("/")
+        return {
+            "job_id": self.id,
+            "preset": self.preset,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "after_url": self.after_url,
+            "result_url": f"{api}/api/beauty/jobs/{self.id}/result" if self.status == "done" else None,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+def job_key(source_key: str, preset: str, config: PresetConfig) -> str:
+    """Dedup key: same source image + same preset values = same job."""
+    payload = json.dumps({"src": source_key, "preset": preset, "config": asdict(config)}, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class BeautyJobManager:
+    """
+    Tracks async beauty jobs running on BEAUTY_POOL.
+
+    Must be used from the event loop; worker progress arrives on
+    job_progress's queue and is drained by a background thread that hands
+    each update back to the loop.
+    """
+
+    def __init__(self, history: int, max_active: int):
+        self.history = history
+        self.max_active = max_active
+        self._jobs: "OrderedDict[str, BeautyJob]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        # The event loop only keeps weak references to tasks; hold running jobs here
+        self._tasks: Set[asyncio.Task] = set()
+
+    # ---------- lifecycle ----------
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        if self._listener is None:
+            queue = job_progress.get_queue()
+            self._listener = threading.Thread(target=self._drain, args=(queue,), daemon=True, name="job-progress")
+            self._listener.start()
+
+    def stop(self) -> None:
+        if self._listener is not None:
+            job_progress.get_queue().put(None)
+            self._listener = None
+
+    def _drain(self, queue) -> None:
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+            job_id, stage = item
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._on_progress, job_id, stage)
+
+    # ---------- state ----------
+
+    def _touch(self, job: BeautyJob) -> None:
+        job.updated_at = time.time()
+        job.version += 1
+        job._changed.set()
+        job._changed = asyncio.Event()
+
+    def _on_progress(self, job_id: str, stage: str) -> None:
+        job = self._jobs.get(job_id)
+        if job is None or job.status in TERMINAL_STATUSES:
+            return
+        job.status = "running"
+        job.stage = stage
+        self._touch(job)
+
+    def _evict(self) -> None:
+        while len(self._jobs) > self.history:
+            oldest = next(
+                (j for j in self._jobs.values() if j.status in TERMINAL_STATUSES),
+                None,
+            )
+            if oldest is None:
+                return
+            del self._jobs[oldest.id]
+            if self._by_key.get(oldest.key) == oldest.id:
+                del self._by_key[oldest.key]
+
+    def get(self, job_id: str) -> Optional[BeautyJob]:
+        return self._jobs.get(job_id)
+
+    def active_count(self) -> int:
+        return sum(1 for j in self._jobs.values() if j.status not in TERMINAL_STATUSES)
+
+    # ---------- submit / run ----------
+
+    def submit(
+        self,
+        source: Source,
+        source_key: str,
+        preset: str,
+        config: PresetConfig,
+        face_hint: RelBox | None = None,
+    ) -> tuple[BeautyJob, bool]:
+        """
+        Start a job, or return the existing one for the same source, preset
+        and config. Returns (job, created).
+        """
+        if self._loop is None:
+            self.start(asyncio.get_running_loop())
+
+        key = job_key(source_key, preset, config)
+        existing_id = self._by_key.get(key)
+        if existing_id:
+            existing = self._jobs.get(existing_id)
+            if existing is not None and existing.status != "error":
+                return existing, False
+
+        if self.active_count() >= self.max_active:
+            raise TooManyJobs(f"Terlalu banyak job aktif ({self.max_active}), coba lagi nanti")
+
+        job = BeautyJob(id=uuid.uuid4().hex, key=key, preset=preset)
+        self._jobs[job.id] = job
+        self._by_key[key] = job.id
+        self._evict()
+
+        task = asyncio.create_task(self._run(job, source, source_key, config, face_hint))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job, True
+
+    async def _run(
+        self,
+        job: BeautyJob,
+        source: Source,
+        source_key: str,
+        config: PresetConfig,
+        face_hint: RelBox | None,
+    ) -> None:
+        try:
+            while True:
+                try:
+                    result = await BEAUTY_POOL.submit(
+                        beauty_job, source, job.preset, config, True, job.id, face_hint, affinity=source_key
+                    )
+                    break
+                except PoolBusy as exc:
+                    # Async jobs wait their turn instead of failing with 429
+                    await asyncio.sleep(exc.retry_after)
+        except JobTimeout as exc:
+            job.status, job.error = "error", str(exc)
+        except Exception as exc:  # noqa: BLE001
+            job.status, job.error = "error", f"Gagal memproses foto: {exc}"
+        else:
+            job.jpeg = result["jpeg"]
+            job.after_url = f"{API_BASE_URL.rstrip('/')}/static/after/{result['after_filename']}"
+            job.status = job.stage = "done"
+        self._touch(job)
+
+    async def wait_for_change(self, job: BeautyJob, version: int, timeout: float) -> bool:
+        """Wait until job.version moves past `version`. Returns False on timeout."""
+        if job.version != version:
+            return True
+        try:
+            await asyncio.wait_for(job._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+BEAUTY_JOBS = BeautyJobManager(BEAUTY_JOB_HISTORY, BEAUTY_JOB_MAX_ACTIVE)
+
+
+__all__ = ["BeautyJob", "BeautyJobManager", "BEAUTY_JOBS", "TooManyJobs", "job_key", "TERMINAL_STATUSES"]
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Set
+
+import requests
+
+from backend.config import LIVEVIEW_FPS, LIVEVIEW_IDLE_TIMEOUT
+from backend.services.digicam_control import get_preview_image
+from backend.services.face_tracker import FACE_TRACKER
+
+
+@dataclass(frozen=True)
+class Frame:
+    data: bytes
+    content_type: str
+    seq: int
+    at: float  # time.monotonic() when grabbed
+
+
+class LiveviewBroadcaster:
+    """
+    One background thread fetches liveview frames from digiCamControl at
+    `fps` over a keep-alive session and keeps only the latest one. Any
+    number of viewers read that frame; a slow viewer simply skips to the
+    newest frame when it is ready again, so it never queues or slows the
+    grabber. The grabber starts on demand and stops after `idle_timeout`
+    seconds without viewers.
+    """
+
+    def __init__(self, fps: float, idle_timeout: float):
+        self.interval = 1.0 / fps if fps > 0 else 0.1
+        self.idle_timeout = idle_timeout
+        self._frame: Optional[Frame] = None
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_demand = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # One wake-up event per streaming viewer; only its own viewer clears it
+        self._waiters: Set[asyncio.Event] = set()
+        self.viewers = 0
+        self.grabbed = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    # ---------- lifecycle ----------
+
+    def set_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=2.0)
+
+    def _ensure_running(self) -> None:
+        with self._cond:
+            self._last_demand = time.monotonic()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="liveview-grabber")
+            self._thread.start()
+
+    # ---------- grabber ----------
+
+    def _run(self) -> None:
+        print("[LIVEVIEW] Grabber mulai.")
+        session = requests.Session()
+        try:
+            while not self._stop.is_set():
+                idle = time.monotonic() - self._last_demand
+                if self.viewers == 0 and idle > self.idle_timeout:
+                    break
+
+                started = time.monotonic()
+                try:
+                    data, content_type = get_preview_image(session)
+                except Exception as exc:  # noqa: BLE001
+                    self.errors += 1
+                    if str(exc) != self.last_error:
+                        print(f"[LIVEVIEW] Gagal ambil frame: {exc}")
+                    self.last_error = str(exc)
+                    self._stop.wait(1.0)  # kamera/digiCamControl belum siap, jangan dibanjiri
+                    continue
+
+                self.last_error = None
+                self._publish(data, content_type)
+                FACE_TRACKER.observe(data)
+                self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            session.close()
+            print("[LIVEVIEW] Grabber berhenti (tidak ada penonton).")
+
+    def _publish(self, data: bytes, content_type: str) -> None:
+        with self._cond:
+            seq = self._frame.seq + 1 if self._frame else 1
+            self._frame = Frame(data, content_type, seq, time.monotonic())
+            self.grabbed += 1
+            self._cond.notify_all()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        # Runs on the event loop: release every waiting viewer at once
+        for waiter in self._waiters:
+            waiter.set()
+
+    # ---------- viewers ----------
+
+    def latest(self, timeout: float = 3.0) -> Optional[Frame]:
+        """
+        Current frame for one-shot (polling) requests. Waits for a fresh one
+        if the grabber was idle. Returns None if none arrives in `timeout`.
+        """
+        self._ensure_running()
+        max_age = max(2.0, 3 * self.interval)
+        with self._cond:
+            fresh = lambda: self._frame is not None and time.monotonic() - self._frame.at <= max_age  # noqa: E731
+            self._cond.wait_for(fresh, timeout)
+            return self._frame if fresh() else None
+
+    async def frames(self) -> AsyncIterator[Frame]:
+        """Yield each new frame (skipping any the caller was too slow for)."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        waiter = asyncio.Event()
+        self._waiters.add(waiter)
+        self.viewers += 1
+        last_seq = 0
+        try:
+            while True:
+                self._ensure_running()
+                # Clear before checking, so a frame published after the check still wakes us
+                waiter.clear()
+                frame = self._frame
+                if frame is not None and frame.seq > last_seq:
+                    last_seq = frame.seq
+                    yield frame
+                    continue
+                try:
+                    await asyncio.wait_for(waiter.wait(), timeout=2.0)
+                except asyncio.TimeoutError:
+                    pass  # cek ulang grabber (mis. kamera sempat error)
+        finally:
+            self.viewers -= 1
+            self._waiters.discard(waiter)
+
+    def stats(self) -> dict:
+        frame = self._frame
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "viewers": self.viewers,
+            "fps": round(1.0 / self.interval, 1),
+            "grabbed": self.grabbed,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "frame_age": round(time.monotonic() - frame.at, 2) if frame else None,
+        }
+
+
+LIVEVIEW = LiveviewBroadcaster(LIVEVIEW_FPS, LIVEVIEW_IDLE_TIMEOUT)
+
+
+__all__ = ["Frame", "LiveviewBroadcaster", "LIVEVIEW"]
@@ -1,8 +1,23 @@
 import cv2
 import numpy as np
 
+from backend.services.strips import Strip, gaussian_radius, run_strips
 
-def create_skin_mask(img_bgr: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
+# Mask blur sizes below are in pixels of a full-resolution frame. `scale`
+# (< 1 for a downscaled preview proxy) shrinks them so the proxy gets the
+# same masks as a downscaled full render.
+
+
+def _sigma(sigma: float, scale: float) -> float:
+    return max(sigma * scale, 0.5)
+
+
+def _ksize(size: int, scale: float) -> int:
+    k = max(1, int(round(size * scale)))
+    return k if k % 2 else k + 1
+
+
+def create_skin_mask(img_bgr: np.ndarray, landmarks: np.ndarray, scale: float = 1.0) -> np.ndarray:
     """
     Build a soft skin mask:
     - Includes jawline up to the forehead above the brows.
@@ -34,8 +49,10 @@ def create_skin_mask(img_bgr: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
     poly_pts = np.concatenate([jaw, forehead_points[::-1]], axis=0)
     cv2.fillConvexPoly(mask_face, poly_pts, 1.0)
 
-    mask_face = cv2.GaussianBlur(mask_face, (0, 0), sigmaX=5, sigmaY=5)
-    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    sigma = _sigma(5, scale)
+    mask_face = cv2.GaussianBlur(mask_face, (0, 0), sigmaX=sigma, sigmaY=sigma)
+    k = _ksize(5, scale)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (k, k))
     mask_face = cv2.erode(mask_face, kernel, iterations=1)
     mask_face = cv2.dilate(mask_face, kernel, iterations=1)
 
@@ -49,7 +66,8 @@ def create_skin_mask(img_bgr: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
     fill_region(list(range(42, 48)))  # right eye polygon
     fill_region(list(range(60, 68)))  # inner mouth
 
-    feature_soft = cv2.GaussianBlur(feature_mask, (0, 0), sigmaX=7, sigmaY=7)
+    sigma = _sigma(7, scale)
+    feature_soft = cv2.GaussianBlur(feature_mask, (0, 0), sigmaX=sigma, sigmaY=sigma)
 
     alpha = 0.8
 
@@ -59,7 +77,7 @@ def create_skin_mask(img_bgr: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
     return skin_mask.astype(np.float32)
 
 
-def create_under_eye_mask(img_bgr: np.ndarray, landmarks: np.ndarray) -> np.ndarray:
+def create_under_eye_mask(img_bgr: np.ndarray, landmarks: np.ndarray, scale: float = 1.0) -> np.ndarray:
     """
     Mask area beneath the eyes for the 'kerutan' preset.
     Focused on under-eye bags, not the eyeball.
@@ -87,22 +105,44 @@ def create_under_eye_mask(img_bgr: np.ndarray, landmarks: np.ndarray) -> np.ndar
     add_under_region(36)  # left eye
     add_under_region(42)  # right eye
 
-    mask = cv2.GaussianBlur(mask, (0, 0), sigmaX=10, sigmaY=10)
+    sigma = _sigma(10, scale)
+    mask = cv2.GaussianBlur(mask, (0, 0), sigmaX=sigma, sigmaY=sigma)
     return mask.astype(np.float32)
 
 
-def compute_edge_preserve_mask(img_bgr: np.ndarray) -> np.ndarray:
-    """Mask to preserve edges so smoothing does not blur detailed areas."""
-    gray = (np.clip(img_bgr, 0.0, 1.0) * 255.0).astype(np.uint8)
-    gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+def compute_edge_preserve_mask(img_bgr: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    """
+    Mask to preserve edges so smoothing does not blur detailed areas.
+    img_bgr is BGR uint8, or float32 [0, 1].
+    """
+    h = img_bgr.shape[0]
+    gray = np.empty(img_bgr.shape[:2], dtype=np.uint8)
+
+    def to_gray(s: Strip) -> None:
+        src = img_bgr[s.rows]
+        if src.dtype != np.uint8:
+            src = (np.clip(src, 0.0, 1.0) * 255.0).astype(np.uint8)
+        cv2.cvtColor(src, cv2.COLOR_BGR2GRAY, dst=gray[s.rows])
+
+    run_strips(to_gray, h)
+    # Hysteresis follows edges across the whole frame, so Canny is not split
     edges = cv2.Canny(gray, 60, 140)
-    edges = cv2.GaussianBlur(edges, (0, 0), sigmaX=1.4, sigmaY=1.4)
-    mask = 1.0 - edges.astype(np.float32) / 255.0
-    mask = cv2.GaussianBlur(mask, (0, 0), sigmaX=1.0, sigmaY=1.0)
-    return np.clip(mask, 0.25, 1.0).astype(np.float32)
+    edge_sigma, mask_sigma = _sigma(1.4, scale), _sigma(1.0, scale)
+    mask = np.empty(edges.shape, dtype=np.float32)
+
+    def soften(s: Strip) -> None:
+        local = cv2.GaussianBlur(edges[s.padded], (0, 0), sigmaX=edge_sigma, sigmaY=edge_sigma)
+        local = local.astype(np.float32)
+        local /= 255.0
+        np.subtract(1.0, local, out=local)
+        local = cv2.GaussianBlur(local, (0, 0), sigmaX=mask_sigma, sigmaY=mask_sigma)
+        np.clip(local[s.inner], 0.25, 1.0, out=mask[s.rows])
+
+    run_strips(soften, h, halo=gaussian_radius(edge_sigma, np.uint8) + gaussian_radius(mask_sigma))
+    return mask
 
 
-def create_cheek_highlight_mask(img_shape, landmarks: np.ndarray) -> np.ndarray:
+def create_cheek_highlight_mask(img_shape, landmarks: np.ndarray, scale: float = 1.0) -> np.ndarray:
     """Soft mask around cheeks to apply local glow for the 'lembab' preset."""
     h, w = img_shape[:2]
     mask = np.zeros((h, w), dtype=np.float32)
@@ -116,7 +156,7 @@ def create_cheek_highlight_mask(img_shape, landmarks: np.ndarray) -> np.ndarray:
     right_center = (0.55 * right_mouth + 0.45 * right_eye_outer).astype(np.int32)
 
     eye_width = np.linalg.norm(right_eye_outer - left_eye_outer)
-    radius = int(max(12, eye_width * 0.18))
+    radius = int(max(12 * scale, eye_width * 0.18, 1))
 
     for cx, cy in [left_center, right_center]:
         cv2.circle(mask, (int(cx), int(cy)), radius, 1.0, thickness=-1)
@@ -125,7 +165,9 @@ def create_cheek_highlight_mask(img_shape, landmarks: np.ndarray) -> np.ndarray:
     return np.clip(mask, 0.0, 1.0).astype(np.float32)
 
 
-def create_wrinkle_mask(img_shape, landmarks: np.ndarray, under_eye_mask: np.ndarray) -> np.ndarray:
+def create_wrinkle_mask(
+    img_shape, landmarks: np.ndarray, under_eye_mask: np.ndarray, scale: float = 1.0
+) -> np.ndarray:
     """
     Aggressive mask for wrinkle-prone areas:
     - Under-eye bags (reuses under_eye_mask)
@@ -149,7 +191,8 @@ def create_wrinkle_mask(img_shape, landmarks: np.ndarray, under_eye_mask: np.nda
     cv2.fillConvexPoly(mask, left_poly, 0.7)
     cv2.fillConvexPoly(mask, right_poly, 0.7)
 
-    mask = cv2.GaussianBlur(mask, (0, 0), sigmaX=8, sigmaY=8)
+    sigma = _sigma(8, scale)
+    mask = cv2.GaussianBlur(mask, (0, 0), sigmaX=sigma, sigmaY=sigma)
     return np.clip(mask, 0.0, 1.0).astype(np.float32)
 
 
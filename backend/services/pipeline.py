@@ -0,0 +1,129 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.models.presets import PresetConfig
+
+StageFn = Callable[[Dict[str, Any], PresetConfig], Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of the retouch pipeline.
+
+    `inputs` must already be in the context when the stage runs and every
+    key in `outputs` must be returned by `fn`. `enabled` decides from the
+    config whether the stage does anything at all; disabled stages are
+    skipped without touching the context.
+    """
+    name: str
+    fn: StageFn
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    enabled: Optional[Callable[[PresetConfig], bool]] = None
+
+    def is_enabled(self, config: PresetConfig) -> bool:
+        return self.enabled is None or bool(self.enabled(config))
+
+
+@dataclass
+class PipelineReport:
+    """
+    Per-stage wall time (ms) of a single pipeline run. `nested` holds the
+    report of a pipeline run inside one of the stages (e.g. the slowest
+    face region of "retouch"). `peak_rss_mb` is the process peak memory
+    during the run, when the caller measured it.
+    """
+    timings: List[Tuple[str, float]] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    aborted_at: Optional[str] = None
+    nested: Dict[str, "PipelineReport"] = field(default_factory=dict)
+    peak_rss_mb: Optional[float] = None
+
+    @property
+    def total_ms(self) -> float:
+        return sum(ms for _, ms in self.timings)
+
+    def as_dict(self) -> dict:
+        return {
+            "stages": {name: round(ms, 1) for name, ms in self.timings},
+            "skipped": list(self.skipped),
+            "aborted_at": self.aborted_at,
+            "total_ms": round(self.total_ms, 1),
+            "nested": {name: report.as_dict() for name, report in self.nested.items()},
+            "peak_rss_mb": None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+        }
+
+    def summary(self) -> str:
+        parts = [f"{name}={ms:.0f}ms" for name, ms in self.timings]
+        if self.skipped:
+            parts.append(f"skipped={','.join(self.skipped)}")
+        for name, report in self.nested.items():
+            parts.append(f"{name}[{report.summary()}]")
+        if self.peak_rss_mb is not None:
+            parts.append(f"peak_rss={self.peak_rss_mb:.0f}MB")
+        return f"total={self.total_ms:.0f}ms " + " ".join(parts)
+
+
+class StageAbort(Exception):
+    """Raised by a stage to stop the pipeline early (e.g. no face found)."""
+
+
+class Pipeline:
+    def __init__(self, stages: Iterable[Stage], initial: Iterable[str]):
+        self.stages = list(stages)
+        self.initial = tuple(initial)
+        self._validate()
+
+    def _validate(self) -> None:
+        available = set(self.initial)
+        for stage in self.stages:
+            missing = [key for key in stage.inputs if key not in available]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' needs {missing} before it runs")
+            available.update(stage.outputs)
+
+    def run(
+        self,
+        ctx: Dict[str, Any],
+        config: PresetConfig,
+        on_stage: Optional[Callable[[str], None]] = None,
+    ) -> PipelineReport:
+        """
+        Run all enabled stages in order, updating ctx in place.
+        Returns the timing report; `report.aborted_at` is set if a stage
+        raised StageAbort.
+        """
+        report = PipelineReport()
+        for stage in self.stages:
+            if not stage.is_enabled(config):
+                report.skipped.append(stage.name)
+                continue
+
+            missing = [key for key in stage.inputs if key not in ctx]
+            if missing:
+                raise RuntimeError(
+                    f"Stage '{stage.name}' is missing {missing}; an earlier stage that produces it was skipped"
+                )
+
+            if on_stage:
+                on_stage(stage.name)
+
+            start = time.perf_counter()
+            try:
+                produced = stage.fn(ctx, config)
+            except StageAbort:
+                report.timings.append((stage.name, (time.perf_counter() - start) * 1000.0))
+                report.aborted_at = stage.name
+                return report
+            report.timings.append((stage.name, (time.perf_counter() - start) * 1000.0))
+
+            for key in stage.outputs:
+                if key not in produced:
+                    raise RuntimeError(f"Stage '{stage.name}' did not produce '{key}'")
+            ctx.update(produced)
+        return report
+
+
+__all__ = ["Stage", "Pipeline", "PipelineReport", "StageAbort"]
@@ -0,0 +1,85 @@
+# Storage precision of the retouch masks and face-box layers. The result
+# image stays float32 (the OpenCV filters in between only take 8U/32F),
+# but the arrays that are kept and re-read by every blend - the face masks,
+# the edge mask, the low-frequency layers - can be stored smaller:
+#   float32  reference: the float pipeline as it is (itself close to, not
+#            bit-identical with, the old uint8 pipeline; see _stage_tone)
+#   float16  masks and layers in half precision
+#   fixed    masks in 8-bit fixed point (0..255), layers in 16-bit
+#            (0..65535), blends in one cv2.blendLinear pass
+# Check a mode against float32 with `python -m backend.services.precision_report`.
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from backend.config import BEAUTY_PRECISION
+
+_FIXED_SCALE = {np.dtype(np.uint8): 255.0, np.dtype(np.uint16): 65535.0}
+
+
+@dataclass(frozen=True)
+class Precision:
+    name: str
+    mask_dtype: np.dtype
+    layer_dtype: np.dtype
+    blend_linear: bool = False
+
+
+PRECISIONS = {
+    "float32": Precision("float32", np.dtype(np.float32), np.dtype(np.float32)),
+    "float16": Precision("float16", np.dtype(np.float16), np.dtype(np.float16)),
+    "fixed": Precision("fixed", np.dtype(np.uint8), np.dtype(np.uint16), blend_linear=True),
+}
+
+
+def get_precision(name: str | None = None) -> Precision:
+    """Precision by name; None gives BEAUTY_PRECISION."""
+    name = (name or BEAUTY_PRECISION).lower()
+    try:
+        return PRECISIONS[name]
+    except KeyError:
+        raise ValueError(f"Mode presisi tidak dikenal: {name} (pilih {', '.join(PRECISIONS)})") from None
+
+
+def pack(arr: np.ndarray, dtype: np.dtype, copy: bool = False) -> np.ndarray:
+    """
+    float32 [0, 1] to storage dtype (rounded for fixed point). Returns arr
+    itself when it already has that dtype, unless `copy` is set.
+    """
+    dtype = np.dtype(dtype)
+    if arr.dtype == dtype:
+        return arr.copy() if copy else arr
+    scale = _FIXED_SCALE.get(dtype)
+    if scale is None:
+        return arr.astype(dtype)
+    scaled = np.multiply(arr, scale, dtype=np.float32)
+    scaled += 0.5
+    np.clip(scaled, 0.0, scale, out=scaled)
+    return scaled.astype(dtype)
+
+
+def unpack(arr: np.ndarray) -> np.ndarray:
+    """Storage dtype back to float32 [0, 1]; returns arr itself (no copy) when it is float32."""
+    if arr.dtype == np.float32:
+        return arr
+    scale = _FIXED_SCALE.get(arr.dtype)
+    out = arr.astype(np.float32)
+    if scale is not None:
+        out *= 1.0 / scale
+    return out
+
+
+def blend_linear(base: np.ndarray, layer: np.ndarray, weight: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """base * (1 - weight) + layer * weight in one OpenCV pass (weight is 2-D float32)."""
+    if base.size == 0:
+        return out  # blendLinear returns None for empty input
+    keep = np.subtract(1.0, weight)
+    blended = cv2.blendLinear(
+        np.ascontiguousarray(base), np.ascontiguousarray(layer), keep, np.ascontiguousarray(weight)
+    )
+    np.copyto(out, blended)
+    return out
+
+
+__all__ = ["PRECISIONS", "Precision", "blend_linear", "get_precision", "pack", "unpack"]
@@ -0,0 +1,130 @@
+"""
+Visual diff of the reduced-precision retouch modes against float32:
+
+    python -m backend.services.precision_report backend/static/captured
+    python -m backend.services.precision_report foto/ --modes fixed --presets cerah,lembab --diff-dir /tmp/diff
+
+For each mode and preset prints the worst per-pixel difference to the
+float32 output (8-bit levels), the mean difference, the lowest PSNR, the
+share of pixels more than 2 levels off, median pipeline time and peak RSS,
+and whether the mode stays within tolerance (--max-diff / --max-off).
+With --diff-dir the differences are also written as amplified images.
+"""
+import argparse
+import statistics
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from backend.models.presets import PRESET_CONFIGS
+from backend.services.beautify import run_beautify
+from backend.services.precision import PRECISIONS
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+REFERENCE = "float32"
+_OFF_LEVELS = 2
+_DIFF_GAIN = 16
+
+
+def _psnr(diff: np.ndarray) -> float:
+    mse = float(np.mean(np.square(diff, dtype=np.float64)))
+    return float("inf") if mse == 0 else 10.0 * np.log10(255.0 ** 2 / mse)
+
+
+def _render(img: Image.Image, preset: str, precision: str) -> tuple[np.ndarray, float, float | None]:
+    out, report = run_beautify(img, PRESET_CONFIGS[preset], precision=precision)
+    return np.asarray(out.convert("RGB"), dtype=np.int16), report.total_ms, report.peak_rss_mb
+
+
+def run(
+    folder: Path,
+    modes: list[str],
+    presets: list[str],
+    max_diff: int,
+    max_off: float,
+    diff_dir: Path | None,
+) -> bool:
+    files = sorted(p for p in folder.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not files:
+        print(f"Tidak ada gambar di {folder}")
+        return True
+    if diff_dir is not None:
+        diff_dir.mkdir(parents=True, exist_ok=True)
+
+    names = [REFERENCE, *modes]
+    results = {
+        (mode, preset): {"max": 0, "mean": [], "psnr": [], "off": [], "ms": [], "rss": []}
+        for mode in names
+        for preset in presets
+    }
+    for path in files:
+        with Image.open(path) as src:
+            img = src.convert("RGB")
+
+        # Mode by mode, so every mode pays for its own (cached) analysis once
+        outputs = {}
+        for mode in names:
+            for preset in presets:
+                out, ms, rss = _render(img, preset, mode)
+                r = results[(mode, preset)]
+                r["ms"].append(ms)
+                if rss is not None:
+                    r["rss"].append(rss)
+                outputs[(mode, preset)] = out
+
+        for mode in modes:
+            for preset in presets:
+                diff = np.abs(outputs[(mode, preset)] - outputs[(REFERENCE, preset)])
+                r = results[(mode, preset)]
+                r["max"] = max(r["max"], int(diff.max()))
+                r["mean"].append(float(diff.mean()))
+                r["psnr"].append(_psnr(diff))
+                r["off"].append(float(np.mean(diff.max(axis=2) > _OFF_LEVELS)) * 100.0)
+                if diff_dir is not None:
+                    amplified = np.clip(diff * _DIFF_GAIN, 0, 255).astype(np.uint8)
+                    Image.fromarray(amplified).save(diff_dir / f"{path.stem}_{preset}_{mode}.png")
+
+    print(f"\n{len(files)} gambar, referensi {REFERENCE}, toleransi max {max_diff} level, >{_OFF_LEVELS} level <= {max_off}%")
+    print(
+        f"{'mode':<8} {'preset':<10} {'max':>4} {'mean':>7} {'PSNR dB':>8} "
+        f"{'>2 lvl %':>9} {'median ms':>10} {'peak MB':>8}  status"
+    )
+    within = True
+    for (mode, preset), r in results.items():
+        rss = f"{max(r['rss']):.0f}" if r["rss"] else "-"
+        timing = f"{statistics.median(r['ms']):>10.1f} {rss:>8}"
+        if mode == REFERENCE:
+            print(f"{mode:<8} {preset:<10} {'-':>4} {'-':>7} {'-':>8} {'-':>9} {timing}  referensi")
+            continue
+        off = max(r["off"])
+        ok = r["max"] <= max_diff and off <= max_off
+        within = within and ok
+        print(
+            f"{mode:<8} {preset:<10} {r['max']:>4} {statistics.mean(r['mean']):>7.4f} {min(r['psnr']):>8.1f} "
+            f"{off:>9.3f} {timing}  {'OK' if ok else 'DI LUAR TOLERANSI'}"
+        )
+    return within
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Selisih visual mode presisi terhadap float32")
+    parser.add_argument("folder", type=Path)
+    parser.add_argument("--modes", default=",".join(m for m in PRECISIONS if m != REFERENCE))
+    parser.add_argument("--presets", default=",".join(PRESET_CONFIGS))
+    parser.add_argument("--max-diff", type=int, default=4, help="selisih maksimum per piksel (level 8-bit)")
+    parser.add_argument("--max-off", type=float, default=0.1, help=f"maksimum %% piksel dengan selisih > {_OFF_LEVELS} level")
+    parser.add_argument("--diff-dir", type=Path, default=None, help=f"simpan selisih x{_DIFF_GAIN} sebagai PNG")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip() and m.strip() != REFERENCE]
+    presets = [p.strip() for p in args.presets.split(",") if p.strip()]
+    unknown = [m for m in modes if m not in PRECISIONS] + [p for p in presets if p not in PRESET_CONFIGS]
+    if unknown:
+        parser.error(f"tidak dikenal: {', '.join(unknown)}")
+    if not run(args.folder, modes, presets, args.max_diff, args.max_off, args.diff_dir):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from backend.config import PROCESSED_DB_PATH, PROCESSED_HOT_SIZE
+from backend.models.processed_file import ProcessedFile
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    local_path TEXT,
+    share_link TEXT,
+    download_link TEXT,
+    processed_time TEXT NOT NULL,
+    processed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS processed_files_name ON processed_files (name);
+CREATE INDEX IF NOT EXISTS processed_files_time ON processed_files (processed_at DESC);
+"""
+
+_COLUMNS = "id, name, share_link, download_link, processed_time, processed_at"
+
+
+def _row(row) -> tuple[ProcessedFile, float]:
+    return ProcessedFile(*row[:5]), row[5]
+
+
+class ProcessedFileStore:
+    """
+    Uploaded files (Drive id -> links), persisted in SQLite and indexed by
+    Drive id, local file name and upload time. The newest `hot_size`
+    entries stay in memory, so QR lookups right after an upload never touch
+    the disk, and the latest entry is a plain attribute.
+    """
+
+    def __init__(self, db_path: Path, hot_size: int):
+        self.db_path = Path(db_path)
+        self.hot_size = hot_size
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._hot: "OrderedDict[str, ProcessedFile]" = OrderedDict()
+        self._latest: Optional[ProcessedFile] = None
+        self._count = 0
+        self._last_at = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        # Caller holds self._lock
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+            self._count = db.execute("SELECT COUNT(*) FROM processed_files").fetchone()[0]
+            rows = db.execute(
+                f"SELECT {_COLUMNS} FROM processed_files ORDER BY processed_at DESC LIMIT ?", (self.hot_size,)
+            ).fetchall()
+            for row in reversed(rows):
+                self._remember(_row(row)[0])
+            if rows:
+                self._latest, self._last_at = _row(rows[0])
+        return self._db
+
+    def load(self) -> int:
+        """Open the database and fill the hot set (at startup, so the first request doesn't)."""
+        with self._lock:
+            self._conn()
+            count = self._count
+        print(f"[HISTORY] {count} file terunggah tercatat di {self.db_path}")
+        return count
+
+    def _remember(self, item: ProcessedFile) -> None:
+        self._hot[item.id] = item
+        self._hot.move_to_end(item.id)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+    def add(self, item: ProcessedFile, local_path: Optional[str] = None) -> None:
+        with self._lock:
+            db = self._conn()
+            existed = item.id in self._hot or db.execute(
+                "SELECT 1 FROM processed_files WHERE id = ?", (item.id,)
+            ).fetchone()
+            # Strictly increasing, so paging by time never skips entries with equal timestamps
+            self._last_at = max(time.time(), self._last_at + 1e-6)
+            db.execute(
+                "INSERT OR REPLACE INTO processed_files "
+                "(id, name, local_path, share_link, download_link, processed_time, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (item.id, item.name, local_path, item.share_link, item.download_link, item.processed_time, self._last_at),
+            )
+            if not existed:
+                self._count += 1
+            self._remember(item)
+            self._latest = item
+
+    def get(self, file_id: str) -> Optional[ProcessedFile]:
+        with self._lock:
+            item = self._hot.get(file_id)
+            if item is not None:
+                return item
+            row = self._conn().execute(
+                f"SELECT {_COLUMNS} FROM processed_files WHERE id = ?", (file_id,)
+            ).fetchone()
+        return _row(row)[0] if row else None
+
+    def by_name(self, name: str) -> Optional[ProcessedFile]:
+        """Newest upload of the local file `name`."""
+        with self._lock:
+            row = self._conn().execute(
+                f"SELECT {_COLUMNS} FROM processed_files WHERE name = ? ORDER BY processed_at DESC LIMIT 1",
+                (name,),
+            ).fetchone()
+        return _row(row)[0] if row else None
+
+    def latest(self) -> Optional[ProcessedFile]:
+        with self._lock:
+            self._conn()
+            return self._latest
+
+    def count(self) -> int:
+        with self._lock:
+            self._conn()
+            return self._count
+
+    def page(self, limit: int = 50, before: Optional[float] = None) -> tuple[List[ProcessedFile], Optional[float]]:
+        """
+        Newest-first history. Pass the returned cursor as `before` to get
+        the next page; the cursor is None on the last page.
+        """
+        limit = max(1, min(limit, 500))
+        with self._lock:
+            rows = self._conn().execute(
+                f"SELECT {_COLUMNS} FROM processed_files WHERE processed_at < ? "
+                "ORDER BY processed_at DESC LIMIT ?",
+                (before if before is not None else float("inf"), limit + 1),
+            ).fetchall()
+        items = [_row(r) for r in rows[:limit]]
+        cursor = items[-1][1] if len(rows) > limit else None
+        return [item for item, _ in items], cursor
+
+
+PROCESSED_FILES = ProcessedFileStore(PROCESSED_DB_PATH, PROCESSED_HOT_SIZE)
+
+
+__all__ = ["ProcessedFileStore", "PROCESSED_FILES"]
@@ -0,0 +1,188 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import qrcode
+import qrcode.image.svg
+
+from backend.config import QR_BOX_SIZE, QR_CACHE_DIR, QR_CACHE_DISK_FILES, QR_CACHE_MB, QR_PRERENDER_FORMATS
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Ukuran modul (px per kotak QR) yang boleh diminta lewat ?size=
+MIN_BOX_SIZE = 2
+MAX_BOX_SIZE = 40
+
+# Drive file ids; anything else is never used as a file name on disk
+FILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+class QrError(ValueError):
+    """Unsupported QR format or size."""
+
+
+@dataclass(frozen=True)
+class QrImage:
+    data: bytes
+    media_type: str
+    etag: str
+
+
+def render_qr(text: str, fmt: str = "png", box_size: int = QR_BOX_SIZE) -> bytes:
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=4,
+    )
+    qr.add_data(text)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+
+class QrCache:
+    """
+    QR images of Drive share links, keyed by (file id, format, size).
+    Rendered once (normally right after the upload), then served from an
+    in-memory LRU bounded by bytes, backed by files in `directory` that
+    are pruned oldest-first beyond `max_files`. A file id always maps to
+    the same link, so entries never go stale.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, max_files: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._entries: "OrderedDict[tuple, QrImage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._disk_files: Optional[int] = None  # counted on the first write
+        self.hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+
+    @staticmethod
+    def _check(fmt: str, box_size: int) -> None:
+        if fmt not in MEDIA_TYPES:
+            raise QrError(f"Format QR tidak didukung: {fmt} (pilih {', '.join(MEDIA_TYPES)})")
+        if not MIN_BOX_SIZE <= box_size <= MAX_BOX_SIZE:
+            raise QrError(f"Ukuran QR harus {MIN_BOX_SIZE}-{MAX_BOX_SIZE}")
+
+    def _path(self, file_id: str, fmt: str, box_size: int) -> Optional[Path]:
+        if not FILE_ID_RE.match(file_id):
+            return None
+        return self.directory / f"{file_id}_{box_size}.{fmt}"
+
+    def _put(self, key: tuple, image: QrImage) -> None:
+        if len(image.data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.data)
+            self._entries[key] = image
+            self._bytes += len(image.data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.data)
+
+    def get(self, file_id: str, link: str, fmt: str = "png", box_size: int = QR_BOX_SIZE) -> QrImage:
+        """QR image for a file's share link: memory, then disk, then render (and store)."""
+        self._check(fmt, box_size)
+        key = (file_id, fmt, box_size)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+
+        path = self._path(file_id, fmt, box_size)
+        data = None
+        if path is not None:
+            try:
+                data = path.read_bytes()
+                os.utime(path)  # disk LRU: recently served files are pruned last
+                self.disk_hits += 1
+            except OSError:
+                data = None
+        if data is None:
+            data = render_qr(link, fmt, box_size)
+            self.renders += 1
+            if path is not None:
+                self._write(path, data)
+
+        image = QrImage(data, MEDIA_TYPES[fmt], _etag(data))
+        self._put(key, image)
+        return image
+
+    def prerender(self, file_id: str, link: str, formats=QR_PRERENDER_FORMATS, box_size: int = QR_BOX_SIZE) -> None:
+        """Render the default QR images of a freshly uploaded file, so the first scan is a lookup."""
+        for fmt in formats:
+            try:
+                self.get(file_id, link, fmt, box_size)
+            except Exception as exc:  # noqa: BLE001
+                print(f"[QR] Gagal membuat QR {fmt} untuk {file_id}: {exc}")
+
+    def _write(self, path: Path, data: bytes) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".part")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as exc:
+            print(f"[QR] Gagal menyimpan {path.name}: {exc}")
+            return
+        with self._prune_lock:
+            if self._disk_files is None:
+                self._disk_files = len(os.listdir(self.directory))
+            else:
+                self._disk_files += 1
+            if self._disk_files > self.max_files:
+                self._prune()
+
+    def _prune(self) -> None:
+        """Delete the least recently served files down to 90% of max_files. Caller holds _prune_lock."""
+        with os.scandir(self.directory) as entries:
+            files = sorted((e.stat().st_mtime, e.path) for e in entries if e.is_file())
+        excess = len(files) - int(self.max_files * 0.9)
+        for _, path in files[: max(0, excess)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._disk_files = len(os.listdir(self.directory))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "renders": self.renders,
+            }
+
+
+QR_CACHE = QrCache(QR_CACHE_DIR, QR_CACHE_MB * 1024 * 1024, QR_CACHE_DISK_FILES)
+
+
+__all__ = ["MEDIA_TYPES", "QR_CACHE", "QrCache", "QrError", "QrImage", "render_qr"]
@@ -0,0 +1,109 @@
+import numpy as np
+from PIL import Image
+
+from backend.services.filters import frequency_sigma
+
+Box = tuple[int, int, int, int]  # (x0, y0, x1, y1), x1/y1 exclusive
+
+
+def blur_margin(frame_shape, scale: float = 1.0) -> int:
+    """
+    Padding around the face so every blur in the pipeline sees the same
+    neighbourhood it would on the full frame (3 sigma of the widest blur
+    plus the fixed-size mask blurs, shrunk by `scale` on a preview proxy).
+    """
+    return int(3 * frequency_sigma(frame_shape)) + int(round(40 * scale))
+
+
+def face_roi(landmarks: np.ndarray, frame_shape, scale: float = 1.0) -> Box:
+    """
+    Bounding box of everything the masks can touch: jaw, brows and the
+    forehead band create_skin_mask adds above them, padded by blur_margin
+    and clipped to the frame.
+    """
+    h, w = frame_shape[:2]
+    brow_y = float(landmarks[17:27, 1].mean())
+    chin_y = float(landmarks[8, 1])
+    forehead = 0.45 * max(chin_y - brow_y, 1.0)
+
+    margin = blur_margin(frame_shape, scale)
+    x0 = int(landmarks[:, 0].min()) - margin
+    x1 = int(landmarks[:, 0].max()) + margin
+    y0 = int(landmarks[:, 1].min() - forehead) - margin
+    y1 = int(landmarks[:, 1].max()) + margin
+    return max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+
+
+def pad_box(box: Box, margin: int, frame_shape) -> Box:
+    """Grow box by margin on every side, clipped to the frame."""
+    h, w = frame_shape[:2]
+    x0, y0, x1, y1 = box
+    return max(0, x0 - margin), max(0, y0 - margin), min(w, x1 + margin), min(h, y1 + margin)
+
+
+def group_boxes(boxes: list[Box]) -> list[tuple[Box, list[int]]]:
+    """
+    Merge overlapping boxes into their bounding box until none overlap.
+    Returns [(box, indices of the input boxes inside it)], in input order
+    of each group's first box.
+    """
+    groups = [(box, [i]) for i, box in enumerate(boxes)]
+    merged = True
+    while merged:
+        merged = False
+        for a in range(len(groups)):
+            for b in range(a + 1, len(groups)):
+                (ax0, ay0, ax1, ay1), a_idx = groups[a]
+                (bx0, by0, bx1, by1), b_idx = groups[b]
+                if ax0 < bx1 and bx0 < ax1 and ay0 < by1 and by0 < ay1:
+                    box = (min(ax0, bx0), min(ay0, by0), max(ax1, bx1), max(ay1, by1))
+                    groups[a] = (box, a_idx + b_idx)
+                    del groups[b]
+                    merged = True
+                    break
+            if merged:
+                break
+    return groups
+
+
+def _ramp(length: int, feather: int, open_start: bool, open_end: bool) -> np.ndarray:
+    """1-D weight that rises from 0 to 1 over `feather` px on the open sides."""
+    idx = np.arange(length, dtype=np.float32)
+    ramp = np.ones(length, dtype=np.float32)
+    if feather <= 0:
+        return ramp
+    if open_start:
+        ramp = np.minimum(ramp, (idx + 1.0) / feather)
+    if open_end:
+        ramp = np.minimum(ramp, (length - idx) / feather)
+    return np.clip(ramp, 0.0, 1.0)
+
+
+def feather_paste(original: Image.Image, tile: Image.Image, box: Box, feather: int, copy: bool = True) -> Image.Image:
+    """
+    Paste a processed tile back into a copy of the original, fading it in
+    over `feather` px on every edge that is not a frame border. With
+    copy=False the tile is pasted into `original` itself (for pasting
+    several non-overlapping tiles into one copy).
+    """
+    x0, y0, x1, y1 = box
+    W, H = original.size
+
+    alpha_y = _ramp(y1 - y0, feather, y0 > 0, y1 < H)
+    alpha_x = _ramp(x1 - x0, feather, x0 > 0, x1 < W)
+    alpha = (alpha_y[:, None] * alpha_x[None, :])[:, :, None]
+
+    before = np.asarray(original.crop(box), dtype=np.float32)
+    blended = np.asarray(tile, dtype=np.float32).copy()
+    blended -= before
+    blended *= alpha
+    blended += before
+    blended += 0.5
+    np.clip(blended, 0, 255, out=blended)
+
+    out = original.copy() if copy else original
+    out.paste(Image.fromarray(blended.astype(np.uint8)), (x0, y0))
+    return out
+
+
+__all__ = ["Box", "blur_margin", "face_roi", "feather_paste", "group_boxes", "pad_box"]
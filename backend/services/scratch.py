@@ -0,0 +1,112 @@
+# Reusable float work buffers for the retouch stages. A booth shoots the
+# same frame size all day, so the large per-request arrays (result, blend
+# temporaries) are handed back to a pool after each face region instead of
+# being allocated, page-faulted in and freed again on every request.
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import numpy as np
+
+from backend.config import SCRATCH_BUFFER_MAX_BYTES, SCRATCH_POOL_MB
+
+
+class ScratchPool:
+    """
+    Free ndarrays keyed by (shape, dtype), bounded by bytes (least
+    recently returned buffers are dropped first). Buffers are taken inside
+    a lease and all come back when the lease ends, so a buffer must not
+    outlive the `with` block it was taken in. Buffers larger than
+    `max_buffer` (or than the whole pool) are freed, not kept.
+    """
+
+    def __init__(self, max_bytes: int, max_buffer: int = SCRATCH_BUFFER_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.max_buffer = max_buffer
+        self._free: "OrderedDict[int, tuple[tuple, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.allocated = 0
+        self.dropped = 0
+
+    def _take(self, shape: tuple, dtype) -> np.ndarray:
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            for ident, (k, buf) in self._free.items():
+                if k == key:
+                    del self._free[ident]
+                    self._bytes -= buf.nbytes
+                    self.reused += 1
+                    return buf
+            self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def _give(self, buf: np.ndarray) -> None:
+        if buf.nbytes > min(self.max_bytes, self.max_buffer):
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self._free[id(buf)] = ((buf.shape, buf.dtype.str), buf)
+            self._bytes += buf.nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._free.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    @contextmanager
+    def lease(self) -> Iterator["Lease"]:
+        lease = Lease(self)
+        try:
+            yield lease
+        finally:
+            for buf in lease.buffers:
+                self._give(buf)
+            lease.buffers.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._free.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "free": len(self._free),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "reused": self.reused,
+                "allocated": self.allocated,
+                "dropped": self.dropped,
+            }
+
+
+class Lease:
+    """Buffers taken from a ScratchPool for one unit of work (contents are undefined)."""
+
+    def __init__(self, pool: ScratchPool):
+        self.pool = pool
+        self.buffers: List[np.ndarray] = []
+
+    def take(self, shape: tuple, dtype=np.float32) -> np.ndarray:
+        buf = self.pool._take(shape, dtype)
+        self.buffers.append(buf)
+        return buf
+
+    def release(self, buf: np.ndarray) -> None:
+        """Hand a buffer back before the lease ends (it must not be used afterwards)."""
+        for i, owned in enumerate(self.buffers):
+            if owned is buf:
+                del self.buffers[i]
+                self.pool._give(buf)
+                return
+
+    def owns(self, arr: np.ndarray) -> bool:
+        return any(arr is buf for buf in self.buffers)
+
+
+SCRATCH = ScratchPool(SCRATCH_POOL_MB * 1024 * 1024)
+
+
+__all__ = ["Lease", "SCRATCH", "ScratchPool"]
@@ -1,6 +1,7 @@
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
+from urllib.parse import unquote, urlparse
 
 from PIL import Image
 
@@ -33,3 +34,20 @@ def save_image_jpeg(image, directory, prefix="result", quality=92):
         image = image.convert("RGB")
     image.save(path, format="JPEG", quality=quality, subsampling=0, optimize=True, progressive=True)
     return filename
+
+
+def resolve_static_file(ref: str, directory: Path) -> Path:
+    """
+    Ubah referensi file (nama file atau URL .../static/<folder>/<nama>)
+    menjadi path di dalam directory. Hanya nama file yang dipakai, jadi
+    path traversal (../) tidak bisa keluar dari folder.
+    Raise FileNotFoundError kalau file tidak ada.
+    """
+    name = Path(unquote(urlparse(ref).path)).name if "/" in ref else ref
+    if not name or name in (".", "..") or Path(name).name != name:
+        raise FileNotFoundError(f"Nama file tidak valid: {ref}")
+
+    path = directory / name
+    if not path.is_file():
+        raise FileNotFoundError(f"File tidak ditemukan: {name}")
+    return path
@@ -0,0 +1,108 @@
+# Per-process thread pool that runs full-frame filter chains strip by strip.
+# The frame is cut into horizontal strips of STRIP_ROWS rows; each strip
+# reads its rows plus a halo as deep as the filter reaches, runs the whole
+# chain (convert, blur, blend, clip) while its rows are still in cache and
+# writes back only its own rows, so the stitched result is identical to
+# running the chain on the whole frame. numpy and OpenCV release the GIL,
+# so strips run side by side on the process's share of the cores
+# (THREAD_BUDGET, split between face regions running at the same time).
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, TypeVar
+
+import numpy as np
+
+from backend.config import STRIP_ROWS, STRIP_THREADS, THREAD_BUDGET
+from backend.services.face_threads import faces_in_flight
+
+R = TypeVar("R")
+
+_PREFIX = "strip"
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Strip:
+    """Rows [y0, y1) of the frame, read with the halo as rows [top, bottom)."""
+    y0: int
+    y1: int
+    top: int
+    bottom: int
+
+    @property
+    def rows(self) -> slice:
+        """The strip's own rows, in frame coordinates."""
+        return np.s_[self.y0:self.y1]
+
+    @property
+    def padded(self) -> slice:
+        """The strip's rows plus halo, in frame coordinates."""
+        return np.s_[self.top:self.bottom]
+
+    @property
+    def inner(self) -> slice:
+        """The strip's own rows, relative to `padded`."""
+        return np.s_[self.y0 - self.top:self.y1 - self.top]
+
+
+def gaussian_radius(sigma: float, dtype=np.float32) -> int:
+    """Rows cv2.GaussianBlur(sigma) reaches on each side (its ksize=(0, 0) rule)."""
+    ksize = int(round(sigma * (3 if np.dtype(dtype) == np.uint8 else 4) * 2 + 1)) | 1
+    return ksize // 2
+
+
+def split_rows(
+    y0: int, y1: int, halo: int = 0, limit: tuple[int, int] | None = None, rows: int | None = None
+) -> List[Strip]:
+    """Strips covering rows [y0, y1), halos clipped to the rows in `limit` (default [y0, y1))."""
+    rows = max(1, rows or STRIP_ROWS)
+    lo, hi = limit or (y0, y1)
+    count = max(1, math.ceil((y1 - y0) / rows))
+    # Even strips, so the last one is not a sliver
+    step = max(1, math.ceil((y1 - y0) / count))
+    return [
+        Strip(a, min(a + step, y1), max(lo, a - halo), min(hi, a + step + halo))
+        for a in range(y0, y1, step)
+    ]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Created on first use, so each beauty worker process gets its own
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max(1, min(STRIP_THREADS, THREAD_BUDGET)), thread_name_prefix=_PREFIX)
+        return _executor
+
+
+def _width() -> int:
+    # Face regions retouched side by side each get their share of the
+    # budget, so face threads x strip threads stays within THREAD_BUDGET
+    return max(1, min(STRIP_THREADS, THREAD_BUDGET) // max(1, faces_in_flight()))
+
+
+def map_strips(fn: Callable[[Strip], R], strips: List[Strip]) -> List[R]:
+    """
+    [fn(strip) for strip in strips] on the strip threads. fn must write
+    only the strip's own rows of any shared output. The strips are run as
+    at most _width() groups of neighbouring strips; inline for a single
+    group, or when already on a strip thread.
+    """
+    width = min(len(strips), _width())
+    if width <= 1 or threading.current_thread().name.startswith(_PREFIX + "_"):
+        return [fn(strip) for strip in strips]
+    size = math.ceil(len(strips) / width)
+    groups = [strips[i:i + size] for i in range(0, len(strips), size)]
+    done = _get_executor().map(lambda group: [fn(strip) for strip in group], groups)
+    return [result for group in done for result in group]
+
+
+def run_strips(fn: Callable[[Strip], R], height: int, halo: int = 0) -> List[R]:
+    """map_strips over the rows of a frame `height` rows tall."""
+    return map_strips(fn, split_rows(0, height, halo))
+
+
+__all__ = ["Strip", "gaussian_radius", "map_strips", "run_strips", "split_rows"]
@@ -0,0 +1,305 @@
+import hashlib
+import io
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image
+
+from backend.config import OVERLAY_CACHE_MB, STATIC_DIR, TEMPLATES_DIR
+from backend.services.compositor import Layer, Rel
+from backend.services.image_cache import load_rgba
+
+# Overlay per filter produk (overlay_mode "logic"); dipakai lewat src "logic" di template
+LOGIC_OVERLAYS = {
+    "MENCERAHKAN_KULIT": STATIC_DIR / "overlays" / "overlay_mencerahkan.png",
+    "MENGURANGI_KERIPUT": STATIC_DIR / "overlays" / "overlay_keriput.png",
+    "MELEMBABKAN_KULIT": STATIC_DIR / "overlays" / "overlay_melembabkan.png",
+}
+
+TEMPLATE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class TemplateError(ValueError):
+    """Template JSON is missing, invalid or refers to a missing asset."""
+
+
+@dataclass
+class Slot:
+    name: str  # which photo goes here, e.g. "before" / "after"
+    rel: Rel
+
+
+@dataclass
+class Overlay:
+    src: str  # asset path, or "logic" for the product overlay of the request
+    rel: Rel
+
+
+@dataclass
+class Template:
+    id: str
+    canvas: tuple[int, int]
+    slots: List[Slot]
+    overlays: List[Overlay]
+    mtime_ns: int = 0
+    raw: dict = field(default_factory=dict, repr=False)
+
+
+def _rel(data: dict) -> Rel:
+    return Rel(float(data["x_rel"]), float(data["y_rel"]), float(data["w_rel"]), float(data["h_rel"]))
+
+
+def parse_template(template_id: str, data: dict, mtime_ns: int = 0) -> Template:
+    """
+    Template JSON:
+      {"canvas": {"width": 2400, "height": 3600},
+       "camera_slots": [{"name": "before", "x_rel": .., "y_rel": .., "w_rel": .., "h_rel": ..}, ...],
+       "overlays": [{"src": "assets/frame.png" | "logic", "x_rel": .., ...}, ...]}
+    Slots without a name are filled with the photos in order ("photo1", "photo2", ...).
+    """
+    try:
+        canvas = (int(data["canvas"]["width"]), int(data["canvas"]["height"]))
+        slots = [
+            Slot(str(slot.get("name") or f"photo{i + 1}"), _rel(slot))
+            for i, slot in enumerate(data.get("camera_slots", []))
+        ]
+        overlays = [Overlay(str(ov["src"]), _rel(ov)) for ov in data.get("overlays", [])]
+    except (AttributeError, KeyError, TypeError, ValueError) as exc:
+        raise TemplateError(f"Template '{template_id}' tidak valid: {exc}") from exc
+    return Template(template_id, canvas, slots, overlays, mtime_ns, data)
+
+
+class ScaledOverlayCache:
+    """
+    Overlays already resized to the box they are drawn in, keyed by
+    (source key, size). LRU bounded by bytes; the source key includes the
+    asset's mtime, so an edited asset is picked up.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, size: tuple[int, int], load: Callable[[], Image.Image]) -> Image.Image:
+        full_key = (*key, size)
+        with self._lock:
+            img = self._entries.get(full_key)
+            if img is not None:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return img
+            self.misses += 1
+
+        src = load()
+        img = src if src.size == size else src.resize(size, Image.LANCZOS)
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
+
+        nbytes = img.width * img.height * 4
+        with self._lock:
+            if nbytes <= self.max_bytes and full_key not in self._entries:
+                self._entries[full_key] = img
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.width * evicted.height * 4
+        return img
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class TemplateRegistry:
+    """
+    Templates loaded from <directory>/<id>.json. Everything is loaded at
+    startup; get() re-reads a template only when its file changed on disk.
+    Overlay assets are served pre-scaled from a shared cache.
+    """
+
+    def __init__(self, directory: Path, overlays: ScaledOverlayCache):
+        self.directory = Path(directory)
+        self.overlays = overlays
+        self._templates: Dict[str, Template] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, template_id: str) -> Path:
+        if not TEMPLATE_ID_RE.match(template_id):
+            raise TemplateError(f"ID template tidak valid: {template_id}")
+        return self.directory / f"{template_id}.json"
+
+    def _load(self, template_id: str, path: Path) -> Template:
+        mtime_ns = path.stat().st_mtime_ns
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except ValueError as exc:
+            raise TemplateError(f"Template '{template_id}' bukan JSON yang valid: {exc}") from exc
+        template = parse_template(template_id, data, mtime_ns)
+        for overlay in template.overlays:
+            if overlay.src != "logic":
+                self.asset_path(overlay.src)  # fail early on a missing asset
+        return template
+
+    def load_all(self) -> int:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        loaded: Dict[str, Template] = {}
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                loaded[path.stem] = self._load(path.stem, path)
+            except (OSError, TemplateError) as exc:
+                print(f"[TEMPLATE] Lewati {path.name}: {exc}")
+        with self._lock:
+            self._templates = loaded
+        print(f"[TEMPLATE] {len(loaded)} template dimuat dari {self.directory}")
+        return len(loaded)
+
+    def get(self, template_id: str) -> Template:
+        """Return the template, reloading it if the JSON changed since it was loaded."""
+        if template_id.endswith(".json"):
+            template_id = template_id[: -len(".json")]
+        path = self._path(template_id)
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._templates.pop(template_id, None)
+            raise TemplateError(f"Template tidak ditemukan: {template_id}")
+
+        with self._lock:
+            template = self._templates.get(template_id)
+        if template is not None and template.mtime_ns == mtime_ns:
+            return template
+
+        template = self._load(template_id, path)
+        with self._lock:
+            self._templates[template_id] = template
+        return template
+
+    def list(self) -> List[Template]:
+        with self._lock:
+            return list(self._templates.values())
+
+    def save(self, template_id: str, data: dict, overlay_png: Optional[bytes] = None) -> Template:
+        """
+        Store a template (and optionally its uploaded overlay image, which
+        becomes the template's first overlay asset) so clients can render
+        by id instead of sending the overlay every time.
+        """
+        path = self._path(template_id)
+        if not isinstance(data, dict):
+            raise TemplateError("Layout template harus objek JSON")
+        data = dict(data)
+        asset = None
+        if overlay_png is not None:
+            try:
+                Image.open(io.BytesIO(overlay_png)).verify()
+            except Exception as exc:  # noqa: BLE001
+                raise TemplateError("Overlay bukan gambar yang valid") from exc
+            digest = hashlib.blake2b(overlay_png, digest_size=8).hexdigest()
+            asset = f"assets/{template_id}_{digest}.png"
+            overlays = list(data.get("overlays") or [])
+            if overlays and isinstance(overlays[0], dict):
+                overlays[0] = {**overlays[0], "src": asset}
+            elif not overlays:
+                overlays = [{"src": asset, "x_rel": 0, "y_rel": 0, "w_rel": 1, "h_rel": 1}]
+            data["overlays"] = overlays
+
+        # Validate everything before touching the disk, so a bad layout
+        # never replaces a working template or leaves an orphan asset
+        template = parse_template(template_id, data)
+        for overlay in template.overlays:
+            if overlay.src not in ("logic", asset):
+                self.asset_path(overlay.src)
+
+        if asset is not None:
+            asset_path = self.directory / asset
+            asset_path.parent.mkdir(parents=True, exist_ok=True)
+            if not asset_path.exists():
+                asset_path.write_bytes(overlay_png)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".part")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        tmp.replace(path)
+        return self.get(template_id)
+
+    # ---------- overlays ----------
+
+    def asset_path(self, src: str) -> Path:
+        """Overlay asset path, relative to the templates folder or to STATIC_DIR."""
+        for root in (self.directory, STATIC_DIR):
+            root = root.resolve()
+            path = (root / src).resolve()
+            if path.is_relative_to(root) and path.is_file():
+                return path
+        raise TemplateError(f"Aset overlay tidak ditemukan: {src}")
+
+    def overlay_image(self, path: Path, size: tuple[int, int]) -> Image.Image:
+        key = ("file", str(path), path.stat().st_mtime_ns)
+        return self.overlays.get(key, size, lambda: load_rgba(path))
+
+    def overlay_from_data(self, data_key: str, size: tuple[int, int], load: Callable[[], Image.Image]) -> Image.Image:
+        """Overlay sent inline by the client (legacy data URL), cached by a hash of its content."""
+        key = ("data", hashlib.blake2b(data_key.encode(), digest_size=16).hexdigest())
+        return self.overlays.get(key, size, load)
+
+    def layers(
+        self,
+        template: Template,
+        photos: Dict[str, Image.Image],
+        filter_code: Optional[str] = None,
+    ) -> List[Layer]:
+        """
+        Layers for one render: every slot filled with its photo (by slot
+        name), then every overlay at its pre-scaled size. A "logic" overlay
+        uses the product overlay for filter_code and is skipped without one.
+        """
+        layers: List[Layer] = []
+        for slot in template.slots:
+            photo = photos.get(slot.name)
+            if photo is None:
+                raise TemplateError(f"Foto untuk slot '{slot.name}' tidak dikirim")
+            layers.append(Layer("cover", photo, slot.rel.box(template.canvas)))
+
+        for overlay in template.overlays:
+            if overlay.src == "logic":
+                path = LOGIC_OVERLAYS.get(filter_code or "")
+                if path is None or not path.exists():
+                    continue
+            else:
+                path = self.asset_path(overlay.src)
+            box = overlay.rel.box(template.canvas)
+            layers.append(Layer("overlay", self.overlay_image(path, box[2:]), box))
+        return layers
+
+
+OVERLAY_CACHE = ScaledOverlayCache(OVERLAY_CACHE_MB * 1024 * 1024)
+TEMPLATES = TemplateRegistry(TEMPLATES_DIR, OVERLAY_CACHE)
+
+
+__all__ = [
+    "LOGIC_OVERLAYS",
+    "OVERLAY_CACHE",
+    "Overlay",
+    "ScaledOverlayCache",
+    "Slot",
+    "Template",
+    "TemplateError",
+    "TemplateRegistry",
+    "TEMPLATES",
+    "parse_template",
+]
@@ -0,0 +1,288 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from backend.config import (
+    LOCAL_FOLDER_PATH,
+    UPLOAD_DB_PATH,
+    UPLOAD_MAX_ATTEMPTS,
+    UPLOAD_RESCAN_HOURS,
+    UPLOAD_RETRY_BASE,
+    UPLOAD_RETRY_MAX,
+    UPLOAD_SETTLE_SECONDS,
+    UPLOAD_WORKERS,
+)
+
+# Files still being written (AfterStore/EncodedFiles write "<name>.part", then rename)
+SKIP_SUFFIXES = (".part", ".tmp")
+
+STATUSES = ("pending", "uploading", "done", "failed", "missing")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    path TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    size INTEGER,
+    drive_id TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS uploads_due ON uploads (status, next_attempt_at);
+"""
+
+
+class FileMissing(Exception):
+    """The queued file no longer exists; it is not retried."""
+
+
+def should_upload(path: str) -> bool:
+    name = os.path.basename(path)
+    return not name.startswith(".") and not name.endswith(SKIP_SUFFIXES)
+
+
+class UploadQueue:
+    """
+    Durable queue of files to upload, stored in SQLite so nothing is lost
+    on a crash or restart. `workers` threads take due entries and call
+    `uploader(path)` off the event loop; failures are retried with
+    exponential backoff (plus jitter) up to `max_attempts`.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        uploader: Callable[[str], Optional[str]],
+        workers: int = 2,
+        max_attempts: int = 8,
+        retry_base: float = 2.0,
+        retry_max: float = 300.0,
+        settle_seconds: float = 1.0,
+    ):
+        self.db_path = Path(db_path)
+        self.uploader = uploader
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.settle_seconds = settle_seconds
+        self._db: Optional[sqlite3.Connection] = None
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._inflight = 0
+        # (finished_at, bytes, seconds) of recent successful uploads, for throughput
+        self._recent: deque = deque(maxlen=500)
+
+    # ---------- lifecycle ----------
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def start(self, rescan_dir: Optional[str] = None, rescan_hours: float = 0) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            db = self._conn()
+            # Uploads interrupted by a crash/restart go back to the queue
+            recovered = db.execute(
+                "UPDATE uploads SET status = 'pending', next_attempt_at = ? WHERE status = 'uploading'",
+                (time.time(),),
+            ).rowcount
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, daemon=True, name=f"uploader-{i}")
+                thread.start()
+                self._threads.append(thread)
+
+        added = self.rescan(rescan_dir, rescan_hours) if rescan_dir else 0
+        print(
+            f"[UPLOAD] {self.workers} uploader siap; {recovered} upload terputus dilanjutkan, "
+            f"{added} file lama masuk antrian."
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    # ---------- queue ----------
+
+    def enqueue(self, path: str, delay: Optional[float] = None) -> bool:
+        """Queue a file (once). Returns False if it is already queued or uploaded."""
+        if not should_upload(path):
+            return False
+        path = os.path.abspath(path)
+        now = time.time()
+        settle = self.settle_seconds if delay is None else delay
+        with self._cond:
+            added = self._conn().execute(
+                "INSERT OR IGNORE INTO uploads (path, next_attempt_at, enqueued_at) VALUES (?, ?, ?)",
+                (path, now + settle, now),
+            ).rowcount
+            if added:
+                self._cond.notify()
+        return bool(added)
+
+    def retry_failed(self) -> int:
+        """Put every failed upload back in the queue (e.g. after re-authorizing Drive)."""
+        with self._cond:
+            count = self._conn().execute(
+                "UPDATE uploads SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'failed'",
+                (time.time(),),
+            ).rowcount
+            self._cond.notify_all()
+        return count
+
+    def rescan(self, directory: str, hours: float = 0) -> int:
+        """Queue files in directory that were never queued (only files newer than `hours`, if set)."""
+        if not os.path.isdir(directory):
+            return 0
+        cutoff = time.time() - hours * 3600 if hours > 0 else 0
+        added = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and should_upload(entry.name) and entry.stat().st_mtime >= cutoff:
+                    added += self.enqueue(entry.path, delay=0)
+        return added
+
+    def _claim(self) -> Optional[tuple[str, int]]:
+        """Mark the next due entry as uploading. Caller holds self._cond."""
+        db = self._conn()
+        row = db.execute(
+            "SELECT path, attempts FROM uploads WHERE status = 'pending' AND next_attempt_at <= ? "
+            "ORDER BY next_attempt_at LIMIT 1",
+            (time.time(),),
+        ).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE uploads SET status = 'uploading' WHERE path = ?", (row[0],))
+        return row[0], row[1]
+
+    def _next_due_in(self) -> Optional[float]:
+        row = self._conn().execute(
+            "SELECT MIN(next_attempt_at) FROM uploads WHERE status = 'pending'"
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopping:
+                    job = self._claim()
+                    if job is not None:
+                        break
+                    self._cond.wait(timeout=self._next_due_in())
+                if self._stopping:
+                    if job is not None:
+                        self._conn().execute("UPDATE uploads SET status = 'pending' WHERE path = ?", (job[0],))
+                    return
+                self._inflight += 1
+            try:
+                self._upload(*job)
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+
+    def _upload(self, path: str, attempts: int) -> None:
+        started = time.time()
+        try:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError as exc:
+                raise FileMissing(str(exc)) from exc
+            if started - st.st_mtime < self.settle_seconds:
+                # Masih ditulis: cek lagi sebentar lagi, tidak dihitung sebagai gagal
+                self._finish(path, "pending", attempts, next_at=started + self.settle_seconds)
+                return
+            drive_id = self.uploader(path)
+        except (FileMissing, FileNotFoundError) as exc:
+            print(f"   [WARNING] File {os.path.basename(path)} tidak ditemukan (mungkin dihapus/dipindahkan). Melewati.")
+            self._finish(path, "missing", attempts + 1, error=str(exc))
+        except Exception as exc:  # noqa: BLE001
+            attempts += 1
+            if attempts >= self.max_attempts:
+                print(f"   [ERROR] Gagal mengunggah {os.path.basename(path)} setelah {attempts} percobaan: {exc}")
+                self._finish(path, "failed", attempts, error=str(exc))
+            else:
+                delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+                delay *= random.uniform(0.8, 1.2)
+                print(f"   [RETRY] {os.path.basename(path)} gagal ({exc}); coba lagi dalam {delay:.0f} detik")
+                self._finish(path, "pending", attempts, next_at=time.time() + delay, error=str(exc))
+        else:
+            finished = time.time()
+            self._recent.append((finished, st.st_size, finished - started))
+            self._finish(path, "done", attempts + 1, drive_id=drive_id, size=st.st_size, finished_at=finished)
+
+    def _finish(self, path: str, status: str, attempts: int, next_at: float = 0.0, error: Optional[str] = None,
+                drive_id: Optional[str] = None, size: Optional[int] = None, finished_at: Optional[float] = None) -> None:
+        with self._cond:
+            self._conn().execute(
+                "UPDATE uploads SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, "
+                "drive_id = COALESCE(?, drive_id), size = COALESCE(?, size), finished_at = ? WHERE path = ?",
+                (status, attempts, next_at, error, drive_id, size, finished_at, path),
+            )
+            if status == "pending":
+                self._cond.notify()
+
+    # ---------- reporting ----------
+
+    def stats(self, window: float = 300.0) -> dict:
+        with self._cond:
+            counts = dict(self._conn().execute("SELECT status, COUNT(*) FROM uploads GROUP BY status").fetchall())
+            inflight = self._inflight
+        now = time.time()
+        recent = [r for r in self._recent if now - r[0] <= window]
+        total_bytes = sum(r[1] for r in recent)
+        return {
+            "workers": self.workers,
+            "depth": counts.get("pending", 0) + counts.get("uploading", 0),
+            "inflight": inflight,
+            "by_status": {status: counts.get(status, 0) for status in STATUSES},
+            "window_seconds": window,
+            "uploads_per_minute": round(len(recent) * 60 / window, 2),
+            "mb_per_second": round(total_bytes / window / (1024 * 1024), 3),
+            "avg_upload_seconds": round(sum(r[2] for r in recent) / len(recent), 2) if recent else None,
+        }
+
+
+def _drive_upload(path: str) -> Optional[str]:
+    # Import di sini supaya UploadQueue bisa dipakai (mis. dengan uploader palsu) tanpa library Google
+    from backend.services.drive_service import upload_file
+
+    return upload_file(path).id
+
+
+UPLOAD_QUEUE = UploadQueue(
+    UPLOAD_DB_PATH,
+    _drive_upload,
+    workers=UPLOAD_WORKERS,
+    max_attempts=UPLOAD_MAX_ATTEMPTS,
+    retry_base=UPLOAD_RETRY_BASE,
+    retry_max=UPLOAD_RETRY_MAX,
+    settle_seconds=UPLOAD_SETTLE_SECONDS,
+)
+
+
+def start_upload_queue() -> None:
+    UPLOAD_QUEUE.start(LOCAL_FOLDER_PATH, UPLOAD_RESCAN_HOURS)
+
+
+__all__ = ["FileMissing", "UploadQueue", "UPLOAD_QUEUE", "should_upload", "start_upload_queue"]
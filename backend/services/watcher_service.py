@@ -1,40 +1,31 @@
-import asyncio
 import os
-import time
 from typing import Optional
 
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 
 from backend.config import LOCAL_FOLDER_PATH
-from backend.services.drive_service import is_in_progress, mark_in_progress, upload_file_to_drive
+from backend.services.upload_queue import UPLOAD_QUEUE, should_upload
 
 observer: Optional[Observer] = None
 MAIN_ASYNC_LOOP = None
 
 
 class LocalChangeHandler(FileSystemEventHandler):
-    """Forward filesystem events to the main asyncio loop."""
+    """Put new files in the durable upload queue (uploads run on the queue's threads)."""
 
-    def on_created(self, event):
-        global MAIN_ASYNC_LOOP
-
-        if event.is_directory or is_in_progress(event.src_path):
-            return
-
-        file_path = event.src_path
-
-        # Debounce to ensure the file is fully written before upload
-        time.sleep(1)
-
-        if os.path.exists(file_path) and not os.path.basename(file_path).startswith("."):
+    def _queue(self, file_path: str) -> None:
+        if should_upload(file_path) and UPLOAD_QUEUE.enqueue(file_path):
             print(f"[WATCH] File baru terdeteksi: {file_path}")
-            mark_in_progress(file_path)
 
-            if MAIN_ASYNC_LOOP:
-                asyncio.run_coroutine_threadsafe(upload_file_to_drive(file_path), MAIN_ASYNC_LOOP)
-            else:
-                print("ERROR: MAIN_ASYNC_LOOP belum disiapkan. Sinkronisasi gagal.")
+    def on_created(self, event):
+        if not event.is_directory:
+            self._queue(event.src_path)
+
+    def on_moved(self, event):
+        # File hasil render ditulis sebagai "<nama>.part" lalu di-rename
+        if not event.is_directory:
+            self._queue(event.dest_path)
 
 
 def set_main_async_loop(loop):
@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional
+
+import cv2
+
+from backend.config import BEAUTY_JOB_TIMEOUT, BEAUTY_QUEUE_SIZE, BEAUTY_WORKERS, THREAD_BUDGET
+from backend.services import job_progress
+
+
+class PoolBusy(Exception):
+    """All workers are busy and the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Worker pool penuh, coba lagi dalam {retry_after} detik")
+        self.retry_after = retry_after
+
+
+class JobTimeout(Exception):
+    """A job ran longer than the configured per-job timeout."""
+
+
+class WorkerLost(Exception):
+    """The worker process died while running the job (it was restarted; retry later)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Worker berhenti saat memproses, coba lagi dalam {retry_after} detik")
+        self.retry_after = retry_after
+
+
+def _init_worker(progress_queue, workers: int) -> None:
+    # Import here so each worker loads the face detector/predictor once,
+    # at startup, instead of on its first job.
+    import backend.services.beautify  # noqa: F401
+    from backend.services.analysis_cache import ANALYSIS_CACHE
+    from backend.services.image_cache import DECODED_IMAGES
+    from backend.services.scratch import SCRATCH
+
+    # The configured cache sizes are budgets for all workers together;
+    # every worker process builds its own caches, so each gets its share
+    for cache in (ANALYSIS_CACHE, DECODED_IMAGES, SCRATCH):
+        cache.max_bytes //= max(1, workers)
+
+    # OpenCV would otherwise start a thread per core in every worker process
+    cv2.setNumThreads(THREAD_BUDGET)
+    job_progress.install(progress_queue)
+
+
+class WorkerPool:
+    """
+    Bounded pool of worker processes for CPU-bound jobs.
+
+    Each slot is a single-process executor, so jobs with the same
+    `affinity` key (e.g. the image hash) land on the same process and hit
+    its in-memory analysis cache. At most `workers + queue_size` jobs are
+    admitted; beyond that submit() raises PoolBusy. With workers=0 jobs run
+    on one background thread inside the API process (handy for dev).
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots: List[Executor] = []
+        self._pending: List[int] = []
+        # Bumped whenever a slot's executor is replaced, so jobs that were
+        # queued on the old one know to move to the new one
+        self._generations: List[int] = []
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._avg_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.queue_size
+
+    def _new_executor(self) -> Executor:
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=1, thread_name_prefix="beauty")
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(job_progress.get_queue(), self.workers),
+        )
+
+    def start(self) -> None:
+        with self._lock:
+            if self._slots:
+                return
+            count = max(self.workers, 1)
+            self._slots = [self._new_executor() for _ in range(count)]
+            self._pending = [0] * count
+            self._generations = [0] * count
+        print(f"[POOL] {count} worker {'proses' if self.workers > 0 else 'thread'} siap (antrian {self.queue_size}).")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            slots, self._slots = self._slots, []
+        for executor in slots:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _pick_slot(self, affinity: Optional[str]) -> int:
+        if affinity:
+            digest = hashlib.blake2b(affinity.encode(), digest_size=4).digest()
+            return int.from_bytes(digest, "little") % len(self._slots)
+        return min(range(len(self._slots)), key=lambda i: self._pending[i])
+
+    def _retry_after(self) -> int:
+        per_job = self._avg_seconds or 5.0
+        waves = self._inflight / max(self.workers, 1)
+        return max(1, int(per_job * waves + 0.5))
+
+    def _recycle(self, index: int) -> None:
+        """
+        Replace a slot whose process is stuck on a timed-out job (or died).
+        Jobs queued behind it are cancelled by the shutdown; submit() moves
+        them to the new executor.
+        """
+        executor = self._slots[index]
+        if isinstance(executor, ProcessPoolExecutor):
+            # ProcessPoolExecutor has no public kill; terminate the worker so
+            # the runaway job stops consuming a core.
+            for proc in list(getattr(executor, "_processes", {}).values()):
+                proc.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._slots[index] = self._new_executor()
+        self._generations[index] += 1
+
+    async def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        affinity: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Run fn(*args) on a worker and await the result. A job that was
+        still queued on a slot recycled by someone else's timeout is moved
+        to the slot's new worker; a worker that dies under the job itself
+        is restarted and the job retried once before WorkerLost is raised.
+        """
+        if not self._slots:
+            self.start()
+
+        limit = timeout or self.timeout
+        with self._lock:
+            if self._inflight >= self.capacity:
+                self._rejected += 1
+                raise PoolBusy(self._retry_after())
+            self._inflight += 1
+            index = self._pick_slot(affinity)
+            self._pending[index] += 1
+            generation = self._generations[index]
+            future = self._slots[index].submit(fn, *args)
+
+        started = time.perf_counter()
+        retried = False
+        try:
+            while True:
+                remaining = max(0.0, limit - (time.perf_counter() - started))
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+                except asyncio.TimeoutError as exc:
+                    with self._lock:
+                        self._timeouts += 1
+                        if not future.cancel():
+                            self._recycle(index)
+                    raise JobTimeout(f"Job melebihi batas waktu {limit:.0f} detik") from exc
+                except (asyncio.CancelledError, BrokenProcessPool):
+                    task = asyncio.current_task()
+                    if task is not None and getattr(task, "cancelling", lambda: 0)():
+                        raise  # the caller itself was cancelled
+                    with self._lock:
+                        if self._generations[index] == generation:
+                            if future.cancelled():
+                                raise  # cancelled by shutdown(), not by a recycle
+                            # The worker died under this job: restart it, retry once
+                            self._recycle(index)
+                            if retried:
+                                raise WorkerLost(self._retry_after()) from None
+                            retried = True
+                        generation = self._generations[index]
+                        future = self._slots[index].submit(fn, *args)
+                    print(f"[POOL] Job dipindah ke worker baru (slot {index}).")
+                    continue
+
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._completed += 1
+                    self._avg_seconds = elapsed if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * elapsed
+                return result
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                self._pending[index] = max(0, self._pending[index] - 1)
+
+    def submit_background(self, fn: Callable[..., Any], *args, affinity: Optional[str] = None) -> bool:
+        """
+        Fire-and-forget job (e.g. cache warm-up) that never waits or raises.
+        Skipped when the pool is already at capacity. Returns True if queued.
+        """
+        if not self._slots:
+            self.start()
+
+        with self._lock:
+            if self._inflight >= self.capacity:
+                return False
+            self._inflight += 1
+            index = self._pick_slot(affinity)
+            self._pending[index] += 1
+            future = self._slots[index].submit(fn, *args)
+
+        def _done(fut) -> None:
+            with self._lock:
+                self._inflight -= 1
+                self._pending[index] = max(0, self._pending[index] - 1)
+            if not fut.cancelled() and fut.exception() is not None:
+                print(f"[POOL] Background job gagal: {fut.exception()}")
+
+        future.add_done_callback(_done)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "mode": "process" if self.workers > 0 else "thread",
+                "queue_size": self.queue_size,
+                "inflight": self._inflight,
+                "pending_per_worker": list(self._pending),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "avg_job_seconds": round(self._avg_seconds, 3),
+            }
+
+
+BEAUTY_POOL = WorkerPool(BEAUTY_WORKERS, BEAUTY_QUEUE_SIZE, BEAUTY_JOB_TIMEOUT)
+
+
+__all__ = ["WorkerPool", "BEAUTY_POOL", "PoolBusy", "JobTimeout", "WorkerLost"]
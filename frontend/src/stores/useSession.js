@@ -4,6 +4,7 @@ import { reactive, computed } from 'vue'
 const state = reactive({
   selectedProduct: null,      // 'A' | 'B' | 'C'
   photoUrl: null,             // URL foto hasil capture (static/captured)
+  photoPreviewUrl: null,      // rendition kecil foto capture untuk ditampilkan di layar
   photoPath: null,            // kalau mau simpan nama file hasil capture
   resultPhotoUrl: null,  // AFTER (hasil /api/beauty)
   resultAfterUrl: null,  // URL file tersimpan di backend/static/after
@@ -21,6 +22,7 @@ const filterCode = computed(() => {
 function clearSession() {
   state.selectedProduct = null
   state.photoUrl = null     // reset juga fotonya
+  state.photoPreviewUrl = null
   state.resultPhotoUrl = null
   state.resultAfterUrl = null
   state.resultFinalUrl = null